@@ -3,10 +3,13 @@
 #include <netinet/in.h>
 #include <sys/epoll.h>
 #include <sys/socket.h>
+#include <sys/uio.h>
 #include <unistd.h>
 
+#include <algorithm>
 #include <atomic>
 #include <cassert>
+#include <climits>
 #include <chrono>
 #include <cstdint>
 #include <cstdio>
@@ -26,20 +29,35 @@
 #include <utility>
 #include <vector>
 
-namespace rbv {
-
-constexpr uint64_t FNV_prime = 1099511628211ULL;
-constexpr uint64_t FNV_offset_basis = 14695981039346656037ULL;
+#include "checksum.hpp"
 
-inline uint64_t fnv1a_hash_bytes(const void *data, size_t len) {
-    uint64_t hash = FNV_offset_basis;
-    const unsigned char *bytes = static_cast<const unsigned char *>(data);
+namespace rbv {
 
-    for (size_t i = 0; i < len; ++i) {
-        hash ^= bytes[i];
-        hash *= FNV_prime;
+/*
+    Two CRC32C lanes over the words of the bytes, run side by side: the low
+    half of the hash is the CRC of the words, the high half the CRC of the
+    words times an odd constant. A CRC of the same words with another seed,
+    or of the reversed words, is an affine function of the first one and
+    collides with it; the product is not linear in the bits of a word. Both
+    lanes are seeded with the length, the last word is zero-padded.
+*/
+CRC32C_TARGET inline uint64_t hash_bytes(const void *data, size_t len) {
+    constexpr uint64_t MIX = 0x9e3779b97f4a7c15;  // 2^64 / golden ratio
+    const auto *bytes = static_cast<const unsigned char *>(data);
+    uint64_t lo = ~uint32_t(len), hi = uint32_t(len);
+    for (; len >= 8; bytes += 8, len -= 8) {
+        uint64_t word;
+        memcpy(&word, bytes, 8);
+        lo = _mm_crc32_u64(lo, word);
+        hi = _mm_crc32_u64(hi, word * MIX);
     }
-    return hash;
+    if (len > 0) {
+        uint64_t word = 0;
+        memcpy(&word, bytes, len);
+        lo = _mm_crc32_u64(lo, word);
+        hi = _mm_crc32_u64(hi, word * MIX);
+    }
+    return hi << 32 | lo;
 }
 
 constexpr int GRANULARITY = 16;
@@ -54,50 +72,149 @@ struct hasher_t {
     uint64_t latest, reference;
     size_t cursor;
     hasher_t() { latest = reference = 0, cursor = 0; }
-    std::string serialize() {
-        std::stringstream ss;
-        ss << info.size() << " " << latest << " ";
-        for (auto &i : info) {
-            ss << i.hashv << " " << i.timestamp << " ";
-        }
-        return ss.str();
-    }
-    void deserialize(const std::string &s) {
-        std::stringstream ss(s);
-        size_t info_size;
-        ss >> info_size >> reference;
-        info.resize(info_size);
-        for (size_t i = 0; i < info_size; i++) {
-            ss >> info[i].hashv >> info[i].timestamp;
-        }
-        latest = cursor = 0;
-    }
     void combine_(uint64_t hashv) {
         latest ^= hashv + 0x9e3779b9 + (latest << 6) + (latest >> 2);
     }
-    void combine(uint64_t x) { combine_(fnv1a_hash_bytes(&x, sizeof(x))); }
+    void combine(uint64_t x) { combine_(hash_bytes(&x, sizeof(x))); }
     void combine(const std::string &s) {
-        combine_(fnv1a_hash_bytes(s.data(), s.length()));
+        combine_(hash_bytes(s.data(), s.length()));
     }
     void combine(std::string_view sv) {
-        combine_(fnv1a_hash_bytes(sv.data(), sv.length()));
+        combine_(hash_bytes(sv.data(), sv.length()));
     }
     void checkorder(std::atomic_uint64_t &order);
     void flush();
-    std::string finalize();
+    // primary: resets the hasher for the next request, see frame_writer
+    // replica: checks the hashes of the request against the frame
+    void finalize();
     void reset() { info.clear(), reference = latest = 0, cursor = 0; }
 };
 
+/*
+    Wire format from the primary to the replica: per request, a frame_t, the
+    `n_info` info_t of its hasher as they are in memory, then `payload_size`
+    bytes (e.g. the request itself). Primary and replica run on the same
+    architecture.
+*/
+struct frame_t {
+    int64_t t_start;
+    uint64_t reference;  // `latest` of the primary
+    uint32_t n_info;
+    uint32_t payload_size;
+};
+
+// Frames of up to `batch` requests (RBV_BATCH, default 1) are sent by one
+// writev(), the info_t arrays are moved out of the hasher, not copied.
+class frame_writer {
+public:
+    static constexpr size_t MAX_BATCH = IOV_MAX / 3;
+
+    explicit frame_writer(int fd) : fd(fd) {
+        const char *env = getenv("RBV_BATCH");
+        batch = env ? std::clamp<size_t>(atoi(env), 1, MAX_BATCH) : 1;
+        heads.reserve(batch), infos.resize(batch), payloads.resize(batch);
+    }
+    ~frame_writer() { flush(); }
+
+    // the request of `hasher`, which is reset for the next one
+    void append(hasher_t &hasher, int64_t t_start, const void *payload,
+                size_t payload_size) {
+        const size_t i = heads.size();
+        heads.push_back({t_start, hasher.latest, uint32_t(hasher.info.size()),
+                         uint32_t(payload_size)});
+        infos[i].clear();
+        std::swap(infos[i], hasher.info);
+        payloads[i].assign(static_cast<const char *>(payload), payload_size);
+        hasher.reset();
+        if (heads.size() == batch) flush();
+    }
+
+    void flush() {
+        if (heads.empty()) return;
+        iov.clear();
+        for (size_t i = 0; i < heads.size(); i++) {
+            iov.push_back({&heads[i], sizeof(frame_t)});
+            iov.push_back({infos[i].data(), infos[i].size() * sizeof(info_t)});
+            iov.push_back({payloads[i].data(), payloads[i].size()});
+        }
+        iovec *cursor = iov.data(), *end = iov.data() + iov.size();
+        while (cursor != end) {
+            ssize_t ret = writev(fd, cursor, end - cursor);
+            assert(ret > 0);
+            for (; cursor != end && size_t(ret) >= cursor->iov_len; cursor++) {
+                ret -= cursor->iov_len;
+            }
+            if (cursor != end) {
+                cursor->iov_base = static_cast<char *>(cursor->iov_base) + ret;
+                cursor->iov_len -= ret;
+            }
+        }
+        heads.clear();
+    }
+
+private:
+    int fd;
+    size_t batch;
+    std::vector<frame_t> heads;
+    std::vector<std::vector<info_t>> infos;
+    std::vector<std::string> payloads;
+    std::vector<iovec> iov;
+};
+
+// Reads the frames of a blocking socket, the info_t into the hasher
+class frame_reader {
+public:
+    explicit frame_reader(int fd) : fd(fd), buffer(BUFFER_SIZE) {}
+
+    // false when the primary closed the connection
+    bool read(frame_t &head, hasher_t &hasher, std::string &payload) {
+        if (!read_exact(&head, sizeof(head))) return false;
+        hasher.info.resize(head.n_info);
+        payload.resize(head.payload_size);
+        if (!read_exact(hasher.info.data(), head.n_info * sizeof(info_t)) ||
+            !read_exact(payload.data(), head.payload_size)) {
+            return false;
+        }
+        hasher.reference = head.reference;
+        hasher.latest = hasher.cursor = 0;
+        return true;
+    }
+
+private:
+    static constexpr size_t BUFFER_SIZE = 1 << 16;
+
+    int fd;
+    std::vector<char> buffer;
+    size_t begin = 0, end = 0;  // buffered bytes
+
+    bool read_exact(void *dst, size_t len) {
+        char *out = static_cast<char *>(dst);
+        while (len > 0) {
+            if (begin == end) {
+                // large arrays are read in place
+                char *target = len >= BUFFER_SIZE ? out : buffer.data();
+                ssize_t ret = ::read(fd, target, len >= BUFFER_SIZE
+                                                        ? len
+                                                        : BUFFER_SIZE);
+                if (ret <= 0) return false;
+                if (target == out) {
+                    out += ret, len -= ret;
+                    continue;
+                }
+                begin = 0, end = ret;
+            }
+            const size_t n = std::min(len, end - begin);
+            memcpy(out, buffer.data() + begin, n);
+            begin += n, out += n, len -= n;
+        }
+        return true;
+    }
+};
+
 extern thread_local hasher_t hasher;
 
 static inline uint64_t relative_addr(const void *ptr, const void *ref) {
     return (uint64_t)ptr - (uint64_t)ref;
 }
 
-static inline std::string toString20(long long x) {
-    std::stringstream ss;
-    ss << std::setw(20) << std::setfill('0') << x;
-    return ss.str();
-}
-
 }  // namespace rbv
\ No newline at end of file
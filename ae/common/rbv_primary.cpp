@@ -10,11 +10,7 @@ void hasher_t::checkorder(std::atomic_uint64_t &order) {
     latest = 0;
 }
 
-std::string hasher_t::finalize() {
-    std::string s = serialize();
-    info.clear(), reference = latest = 0, cursor = 0;
-    return s;
-}
+void hasher_t::finalize() { reset(); }
 
 void hasher_t::flush() {
     info.emplace_back(latest, 0);
@@ -28,10 +28,9 @@ void hasher_t::flush() {
     cursor++;
 }
 
-std::string hasher_t::finalize() {
+void hasher_t::finalize() {
     assert(latest == reference);
     info.clear(), reference = latest = 0, cursor = 0;
-    return "";
 }
 
 }  // namespace rbv
@@ -14,6 +14,7 @@
 #include <cerrno>
 #include <functional>
 
+#include "profile.hpp"
 #include "utils.hpp"
 
 #ifndef ENABLE_PROFILE_MEM
@@ -167,6 +168,7 @@ void print_stats(hdr_histogram* validation_latency_histogram,
                           CLASSIC);
     fclose(f);
     std::cout << "CDF file: " << filename << std::endl;
+    profile::write_hdr_log(validation_latency_histogram, filename, kCpuMhzNorm);
     std::cout << "----------------------------------------" << std::endl;
 }
 
@@ -1,6 +1,12 @@
 #include <arpa/inet.h>
+#include <fcntl.h>
+#include <hdr/hdr_histogram.h>
+#include <hdr/hdr_histogram_log.h>
 #include <netinet/in.h>
+#include <netinet/tcp.h>
+#include <sys/epoll.h>
 #include <sys/socket.h>
+#include <sys/timerfd.h>
 #include <unistd.h>
 
 #include <algorithm>
@@ -25,11 +31,14 @@ namespace monitor {
 // n_threads: number of threads executing the ops
 // task: task name of the evaluation
 // cnts: # of operations executed on each thread
-// latency: the latency for each operation by counting with rdtsc()
+// latency: per-thread histograms of the latency of the operations, in
+// nanoseconds, merged at the end and written to <hlog_prefix>-<task>.hlog
+// (scripts/ingest/hdr.py)
 // report: report on stderr for most recent throughput, with last_scnt and
 // last_rdtsc value
 struct evaluation {
     static constexpr int max_n_threads = 256;
+    static constexpr int64_t max_latency_ns = 100'000'000'000;
     evaluation(FILE *log, uint64_t num_ops, int n_threads, std::string task);
     ~evaluation();
     FILE *log;
@@ -38,39 +47,81 @@ struct evaluation {
     std::string task;
     struct alignas(64) Cnt {
         uint64_t c;
+        hdr_histogram *latency;
     };
-    std::vector<uint64_t> latency;
     Cnt cnts[max_n_threads];
+    // operations in [warm_begin, warm_end) are recorded, the first and last
+    // phases are warm-up and cool-down
+    uint64_t warm_begin, warm_end;
+    hdr_timespec start_timestamp;
     std::vector<std::pair<std::chrono::steady_clock::time_point, uint64_t>>
         records;
     std::vector<uint64_t> scnts;
+    // latency of the operation `op`, on thread `tid`
+    void record(int tid, uint64_t op, uint64_t latency_ns) {
+        if (op < warm_begin || op >= warm_end) return;
+        hdr_record_value(cnts[tid].latency,
+                         std::min<int64_t>(latency_ns, max_latency_ns));
+    }
     void report();
 };
 
+static std::string hlog_prefix = "client";
+
+static void write_hlog(hdr_histogram *histogram, const std::string &filename,
+                       hdr_timespec start, hdr_timespec end) {
+    FILE *f = fopen(filename.c_str(), "w");
+    if (f == nullptr) {
+        fprintf(stderr, "Error: failed to open %s\n", filename.c_str());
+        return;
+    }
+    hdr_log_writer writer;
+    hdr_log_writer_init(&writer);
+    // recorded values are divided by the scale to get microseconds
+    int err = hdr_log_write_header(&writer, f, "ValueScale: 1000", &start);
+    if (err == 0) err = hdr_log_write(&writer, f, &start, &end, histogram);
+    fclose(f);
+    if (err != 0) {
+        fprintf(stderr, "Error: failed to write %s: %s\n", filename.c_str(),
+                hdr_strerror(err));
+    }
+}
+
 evaluation::evaluation(FILE *log, uint64_t num_ops, int n_threads,
                        std::string task)
     : log(log), num_ops(num_ops), n_threads(n_threads), task(task) {
-    latency.resize(num_ops);
+    uint64_t n_phases = std::min(num_ops, 8LU);
+    warm_begin = num_ops / n_phases;
+    warm_end = num_ops * (n_phases - 1) / n_phases;
+    hdr_getnow(&start_timestamp);
     records.emplace_back(std::chrono::steady_clock::now(), 0);
-    for (int i = 0; i < max_n_threads; ++i) cnts[i].c = 0;
+    for (int i = 0; i < max_n_threads; ++i) {
+        cnts[i].c = 0;
+        cnts[i].latency = nullptr;
+        if (i < n_threads) {
+            int err = hdr_init(1, max_latency_ns, 3, &cnts[i].latency);
+            assert(err == 0);
+        }
+    }
 }
 
 evaluation::~evaluation() {
-    uint64_t n_phases = std::min(num_ops, 8LU);
-    uint64_t l = num_ops / n_phases, r = num_ops * (n_phases - 1) / n_phases;
-    std::sort(latency.begin() + l, latency.begin() + r);
-    uint64_t p90 = nanosecond(0, latency[l + uint64_t((r - l) * .9)]);
-    uint64_t p95 = nanosecond(0, latency[l + uint64_t((r - l) * .95)]);
-    uint64_t p99 = nanosecond(0, latency[l + uint64_t((r - l) * .99)]);
-    uint64_t avg = nanosecond(0, std::accumulate(latency.begin() + l,
-                                                 latency.begin() + r, 0ULL)) /
-                   (r - l);
+    hdr_histogram *latency = cnts[0].latency;
+    for (int i = 1; i < n_threads; ++i) {
+        hdr_add(latency, cnts[i].latency);
+        hdr_close(cnts[i].latency);
+    }
+    uint64_t p90 = hdr_value_at_percentile(latency, 90);
+    uint64_t p95 = hdr_value_at_percentile(latency, 95);
+    uint64_t p99 = hdr_value_at_percentile(latency, 99);
+    uint64_t avg = hdr_mean(latency);
     auto period = std::chrono::duration_cast<std::chrono::microseconds>(
         std::chrono::steady_clock::now() - records[0].first);
     fprintf(stderr, "Finished task %s. Time: %ld us; Throughput: %f/s.\n",
             task.c_str(), period.count(), num_ops * 1e6 / period.count());
-    l = ((uint64_t)records.size() - 1) / n_phases,
-    r = ((uint64_t)records.size() - 1) * (n_phases - 1) / n_phases;
+    uint64_t n_phases = std::min(num_ops, 8LU);
+    uint64_t l = ((uint64_t)records.size() - 1) / n_phases,
+             r = ((uint64_t)records.size() - 1) * (n_phases - 1) / n_phases;
     period = std::chrono::duration_cast<std::chrono::microseconds>(
         records[r + 1].first - records[l].first);
     // NOTE: Use put as the estimated throughput
@@ -79,6 +130,11 @@ evaluation::~evaluation() {
     fprintf(stderr, "Estimated (operation) throughput: %lu/s\n", put);
     fprintf(log, "%s put %lu avg %lu p90 %lu p95 %lu p99 %lu\n", task.c_str(),
             put, avg, p90, p95, p99);
+    hdr_timespec end_timestamp;
+    hdr_getnow(&end_timestamp);
+    write_hlog(latency, hlog_prefix + "-" + task + ".hlog", start_timestamp,
+               end_timestamp);
+    hdr_close(latency);
 }
 
 void evaluation::report() {
@@ -299,6 +355,238 @@ void prepare_zipf_index() {
             microtime_diff(start, end));
 }
 
+/*
+    Open-loop mode, with CLIENT_CONNS=<n> connections per client thread.
+
+    Each thread sends its requests at the times of a fixed schedule, Poisson
+    arrivals at the rate of the thread (CLIENT_ARRIVAL=constant: evenly
+    spaced), whether or not the previous ones were answered: requests are
+    pipelined over the connections, at most CLIENT_DEPTH (default 64)
+    pending on one, and the responses are read through epoll. The latency is
+    measured from the scheduled time of the request, not from when it was
+    sent, so that a server (or a client) falling behind the schedule is
+    accounted for the queueing delay it causes (no coordinated omission).
+*/
+namespace open_loop {
+
+static uint32_t n_conns = 0;  // 0: closed loop
+static uint32_t max_depth = 64;
+static bool constant_rate = false;
+// the schedule is kept by polling the last microseconds before a request
+static constexpr uint64_t SPIN_NS = 60000;
+
+void init() {
+    if (const char *env = getenv("CLIENT_CONNS")) n_conns = atoi(env);
+    if (const char *env = getenv("CLIENT_DEPTH")) {
+        max_depth = std::max(atoi(env), 1);
+    }
+    if (const char *env = getenv("CLIENT_ARRIVAL")) {
+        constant_rate = strcmp(env, "constant") == 0;
+    }
+}
+
+static inline uint64_t now_ns() {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(
+               std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+struct Pending {
+    uint64_t scheduled_ns;
+    uint64_t op;
+};
+
+struct Connection {
+    int fd;
+    std::vector<char> tx;  // requests not written yet, from tx_pos
+    size_t tx_pos = 0;
+    std::vector<char> rx;  // a partial response, rx_len bytes
+    size_t rx_len = 0;
+    std::vector<Pending> pending;  // ring of the requests sent, in order
+    size_t head = 0, n_pending = 0;
+    bool want_out = false;  // EPOLLOUT registered
+
+    void push(const Pending &p) {
+        pending[(head + n_pending) % pending.size()] = p;
+        n_pending++;
+    }
+    Pending pop() {
+        Pending p = pending[head];
+        head = (head + 1) % pending.size();
+        n_pending--;
+        return p;
+    }
+};
+
+/*
+    Runs the operations first_op + k * stride, k < n_ops, of thread `tid`.
+    issue(op, buf) writes the request of `op` and returns its length,
+    check(op, line, len) checks its response, one line.
+*/
+template <typename Issue, typename Check>
+void run_thread(monitor::evaluation &monitor, uint32_t tid, int group,
+                uint64_t rps, uint64_t first_op, uint64_t stride,
+                uint64_t n_ops, Issue issue, Check check) {
+    int efd = epoll_create1(0);
+    assert(efd >= 0);
+    std::vector<Connection> conns(n_conns);
+    for (uint32_t c = 0; c < n_conns; ++c) {
+        Connection &conn = conns[c];
+        conn.fd = connect_server(group);
+        int one = 1;
+        setsockopt(conn.fd, IPPROTO_TCP, TCP_NODELAY, &one, sizeof(one));
+        fcntl(conn.fd, F_SETFL, O_NONBLOCK);
+        conn.rx.resize(kBufferSize * 16);
+        conn.pending.resize(max_depth);
+        struct epoll_event ev = {.events = EPOLLIN, .data = {.u32 = c}};
+        int ret = epoll_ctl(efd, EPOLL_CTL_ADD, conn.fd, &ev);
+        assert(ret == 0);
+    }
+    // wakes up epoll_wait() before the next request is due
+    int tfd = timerfd_create(CLOCK_MONOTONIC, TFD_NONBLOCK);
+    assert(tfd >= 0);
+    struct epoll_event tev = {.events = EPOLLIN, .data = {.u32 = n_conns}};
+    epoll_ctl(efd, EPOLL_CTL_ADD, tfd, &tev);
+    auto flush = [&](uint32_t c) {
+        Connection &conn = conns[c];
+        while (conn.tx_pos < conn.tx.size()) {
+            ssize_t ret = write(conn.fd, conn.tx.data() + conn.tx_pos,
+                                conn.tx.size() - conn.tx_pos);
+            if (ret < 0) {
+                assert(errno == EAGAIN || errno == EWOULDBLOCK);
+                break;
+            }
+            conn.tx_pos += ret;
+        }
+        if (conn.tx_pos == conn.tx.size()) {
+            conn.tx.clear();
+            conn.tx_pos = 0;
+        }
+        bool want_out = !conn.tx.empty();
+        if (want_out != conn.want_out) {
+            struct epoll_event ev = {
+                .events = EPOLLIN | (want_out ? EPOLLOUT : 0u),
+                .data = {.u32 = c}};
+            epoll_ctl(efd, EPOLL_CTL_MOD, conn.fd, &ev);
+            conn.want_out = want_out;
+        }
+    };
+
+    std::mt19937 rng(1235467 + tid);
+    std::exponential_distribution<double> interval(rps / 1e9);
+    auto next_interval = [&]() -> double {
+        return constant_rate ? 1e9 / rps : interval(rng);
+    };
+    const uint64_t report_step = std::max<uint64_t>(n_ops / kNumPrints, 1);
+    const uint64_t t_start = now_ns();
+    double t_next = next_interval();
+    uint64_t sent = 0, done = 0;
+    uint32_t cursor = 0;
+    std::vector<struct epoll_event> events(n_conns + 1);
+    while (done < n_ops) {
+        uint64_t now = now_ns();
+        // send the requests that are due, over the connections in turn
+        bool blocked = false;
+        while (sent < n_ops && t_start + (uint64_t)t_next <= now) {
+            uint32_t c = cursor;
+            while (conns[c].n_pending == max_depth) {
+                c = (c + 1) % n_conns;
+                if (c == cursor) break;
+            }
+            Connection &conn = conns[c];
+            if (conn.n_pending == max_depth) {
+                blocked = true;
+                break;
+            }
+            cursor = (c + 1) % n_conns;
+            uint64_t op = first_op + sent * stride;
+            size_t size = conn.tx.size();
+            conn.tx.resize(size + kBufferSize);
+            conn.tx.resize(size + issue(op, conn.tx.data() + size));
+            conn.push({t_start + (uint64_t)t_next, op});
+            sent++;
+            t_next += next_interval();
+        }
+        for (uint32_t c = 0; c < n_conns; ++c) {
+            if (conns[c].tx.size() > conns[c].tx_pos && !conns[c].want_out) {
+                flush(c);
+            }
+        }
+
+        // wait for responses until the next request is due: sleep on the
+        // timer if it is far, timer slack included, poll if it is close
+        int timeout = 0;
+        uint64_t t_due = t_start + (uint64_t)t_next;
+        if (sent == n_ops || blocked) {
+            timeout = 1000;
+        } else if (t_due > now + SPIN_NS) {
+            struct itimerspec its = {};
+            its.it_value.tv_sec = (t_due - SPIN_NS) / 1000000000;
+            its.it_value.tv_nsec = (t_due - SPIN_NS) % 1000000000;
+            timerfd_settime(tfd, TFD_TIMER_ABSTIME, &its, nullptr);
+            timeout = -1;
+        }
+        int nfds = epoll_wait(efd, events.data(), events.size(), timeout);
+        if (nfds < 0) {
+            assert(errno == EINTR);
+            continue;
+        }
+        for (int e = 0; e < nfds; ++e) {
+            uint32_t c = events[e].data.u32;
+            if (c == n_conns) {  // the timer
+                uint64_t expirations;
+                read(tfd, &expirations, sizeof(expirations));
+                continue;
+            }
+            Connection &conn = conns[c];
+            if (events[e].events & EPOLLOUT) flush(c);
+            if (!(events[e].events & EPOLLIN)) continue;
+            while (true) {
+                // a response longer than the buffer, not a full line yet
+                if (conn.rx_len == conn.rx.size()) {
+                    conn.rx.resize(conn.rx.size() * 2);
+                }
+                ssize_t ret = read(conn.fd, conn.rx.data() + conn.rx_len,
+                                   conn.rx.size() - conn.rx_len);
+                if (ret < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) {
+                    break;
+                }
+                if (ret <= 0) {
+                    fprintf(stderr, "Error: connection %u of thread %u %s, "
+                            "%lu requests pending\n", c, tid,
+                            ret == 0 ? "closed by the server"
+                                     : strerror(errno),
+                            (unsigned long)conn.n_pending);
+                    exit(1);
+                }
+                uint64_t t_recv = now_ns();
+                conn.rx_len += ret;
+                char *line = conn.rx.data(), *end = line + conn.rx_len;
+                while (char *eol = (char *)memchr(line, '\n', end - line)) {
+                    size_t len = eol + 1 - line;
+                    assert(conn.n_pending > 0);
+                    Pending p = conn.pop();
+                    monitor.record(tid, p.op, t_recv - p.scheduled_ns);
+                    check(p.op, line, len);
+                    line += len;
+                    monitor.cnts[tid].c++;
+                    if (++done % report_step == 0 &&
+                        done / report_step % kNumThreads == tid) {
+                        monitor.report();
+                    }
+                }
+                conn.rx_len = end - line;
+                memmove(conn.rx.data(), line, conn.rx_len);
+            }
+        }
+    }
+    for (Connection &conn : conns) close(conn.fd);
+    close(tfd);
+    close(efd);
+}
+
+}  // namespace open_loop
+
 template <RetType ret_type>
 void run_set() {
     std::string task = ret_type == kCreated ? "SET" : "UPDATE";
@@ -313,6 +601,25 @@ void run_set() {
     }
     for (uint32_t i = 0; i < kNumThreads; ++i) {
         threads.emplace_back([i, &monitor, rps_per_thread]() {
+            if (open_loop::n_conns > 0) {
+                auto issue = [i](uint64_t k, char *buf) {
+                    random_string(all_vals[k].data, VAL_LEN, rngs[i].get());
+                    return prepare_setcmd(buf, all_keys[k].data,
+                                          all_vals[k].data);
+                };
+                auto check = [](uint64_t k, const char *line, size_t len) {
+                    if (len != strlen(kRetVals[ret_type]) ||
+                        memcmp(line, kRetVals[ret_type], len) != 0) {
+                        printf("Set error: key %s\n",
+                               std::string(all_keys[k].data, KEY_LEN).c_str());
+                    }
+                };
+                uint64_t n_ops = (kNumKVPairs - i + kNumThreads - 1) /
+                                 kNumThreads;
+                open_loop::run_thread(monitor, i, i % ngroups, rps_per_thread,
+                                      i, kNumThreads, n_ops, issue, check);
+                return;
+            }
             constexpr uint64_t BNS = 1e6;
             std::exponential_distribution<double> sampler(rps_per_thread / 1e9);
             std::mt19937 rng(1235467 + i);
@@ -339,7 +646,7 @@ void run_set() {
                 uint64_t timestamp = rdtsc();
                 write_all(fd, tx_buf.data(), len);
                 size_t rx_len = read(fd, rx_buf.data(), kBufferSize);
-                monitor.latency[k] = nanosecond(p, rdtsc()) + t_offset;
+                monitor.record(i, k, nanosecond(p, rdtsc()) + t_offset);
 
                 assert(rx_len > 0);
                 if (strncmp(rx_buf.data(), kRetVals[ret_type],
@@ -376,6 +683,33 @@ void run_get() {
     if (rps > 0) rps_per_thread = rps * ngroups / kNumThreads;
     for (uint32_t i = 0; i < kNumThreads; ++i) {
         threads.emplace_back([i, &monitor, rps_per_thread]() {
+            if (open_loop::n_conns > 0) {
+                auto issue = [](uint64_t op, char *buf) {
+                    auto &key = all_keys[zipf_key_indices[op]];
+                    return prepare_getcmd(buf, key.data);
+                };
+                auto check = [](uint64_t op, char *line, size_t len) {
+                    auto &key = all_keys[zipf_key_indices[op]];
+                    auto &val = all_vals[zipf_key_indices[op]];
+                    char buf[VAL_LEN];
+                    size_t val_len;
+                    if (parse_getret(line, len, buf, VAL_LEN, &val_len) != 0) {
+                        printf("Get error: key %s\n",
+                               std::string(key.data, KEY_LEN).c_str());
+                    } else if (val_len != VAL_LEN ||
+                               memcmp(val.data, buf, VAL_LEN)) {
+                        printf("Get error: key %s, val %s %s\n",
+                               std::string(key.data, KEY_LEN).c_str(),
+                               std::string(val.data, VAL_LEN).c_str(),
+                               std::string(buf, val_len).c_str());
+                        assert(false);
+                    }
+                };
+                open_loop::run_thread(monitor, i, i % ngroups, rps_per_thread,
+                                      i, kNumThreads, kNumOpsPerThread, issue,
+                                      check);
+                return;
+            }
             constexpr uint64_t BNS = 1e6;
             std::exponential_distribution<double> sampler(rps_per_thread / 1e9);
             std::mt19937 rng(1235467 + i);
@@ -402,7 +736,8 @@ void run_get() {
                 size_t len = prepare_getcmd(tx_buf.data(), key.data);
                 write_all(fd, tx_buf.data(), len);
                 size_t rx_len = read(fd, rx_buf.data(), kBufferSize);
-                monitor.latency[k * kNumThreads + i] = nanosecond(p, rdtsc()) + t_offset;
+                monitor.record(i, k * kNumThreads + i,
+                               nanosecond(p, rdtsc()) + t_offset);
                 assert(rx_len > 0);
                 int r =
                     parse_getret(rx_buf.data(), rx_len, buf, VAL_LEN, &val_len);
@@ -461,11 +796,16 @@ int main(int argc, char **argv) {
     nsets = argc >= 7 ? ngroups << atoi(argv[6]) : 3 << 24;
     ngets = argc >= 8 ? 1 << atoi(argv[7]) : 1 << 19;
     rps = argc >= 9 ? atoi(argv[8]) : 0;
+    monitor::hlog_prefix = output_file.ends_with(".log")
+                               ? output_file.substr(0, output_file.size() - 4)
+                               : output_file;
+    open_loop::init();
     logger = fopen(output_file.c_str(), "a");
     fprintf(
         logger,
-        "client setting ngroups=%d, nclients=%d, nsets=%d, ngets=%d, rps=%d\n",
-        ngroups, nclients, nsets, ngets, rps);
+        "client setting ngroups=%d, nclients=%d, nsets=%d, ngets=%d, rps=%d, "
+        "conns=%d\n",
+        ngroups, nclients, nsets, ngets, rps, open_loop::n_conns);
     init_array();
     init_rng();
     prepare_key();
@@ -26,6 +26,7 @@ hashmap_t *hm_safe = nullptr;
 std::string replica_ip;
 
 thread_local int replica_fd;
+thread_local rbv::frame_writer *replica_writer;
 
 const int kMaxQueueSize = 1000000;
 
@@ -48,7 +49,9 @@ struct fd_worker {
     bool run() {
         while ((len = reader.read_packet('\n'))) {
             if (!memcmp(reader.packet, "quit", 4)) {
-                write_all(replica_fd, "quit\n");
+                rbv::hasher.reset();
+                replica_writer->append(rbv::hasher, 0, "quit\n", 5);
+                replica_writer->flush();
                 fd_reader replica_reader(replica_fd);
                 size_t len = replica_reader.read_packet('\n');
                 assert(len > 0);
@@ -88,13 +91,12 @@ struct fd_worker {
                        strlen(kRetVals[kError]) + 1);
             }
 
-            std::string p;
-            p += rbv::toString20(t_start) + rbv::hasher.finalize() + "\n";
-            p += std::string(packet, len);
-            write_all(replica_fd, p);
+            replica_writer->append(rbv::hasher, t_start, packet, len);
 
             write_all(reader.fd, wt_buffer, strlen(wt_buffer));
         }
+        // no more requests for now, do not hold a partial batch
+        replica_writer->flush();
         return false;
     }
     ~fd_worker() { free(wt_buffer); }
@@ -107,6 +109,8 @@ void Start(int port, int replica_port) {
     assert(listen_fd >= 0);
 
     replica_fd = connect_server(replica_ip, replica_port);
+    rbv::frame_writer writer(replica_fd);
+    replica_writer = &writer;
 
     struct sockaddr_in server_addr = {
         .sin_family = AF_INET,
@@ -31,29 +31,21 @@ thread_local size_t last_t = 0;
 
 struct fd_worker {
     char *wt_buffer;
-    size_t len;
-    fd_reader reader;
-    long long t_start;
+    int fd;
+    rbv::frame_reader reader;
+    rbv::frame_t frame;
+    std::string request;
 
-    fd_worker(int _fd) : reader(_fd) {
+    fd_worker(int _fd) : fd(_fd), reader(_fd) {
         wt_buffer = (char *)malloc(kBufferSize);
-        len = 0;
-        t_start = 0;
     }
     bool run() {
-        while ((len = reader.read_packet('\n'))) {
-            if (!memcmp(reader.packet, "quit", 4)) {
-                write_all(reader.fd, "ACK\n");
+        while (reader.read(frame, rbv::hasher, request)) {
+            if (!memcmp(request.data(), "quit", 4)) {
+                write_all(fd, "ACK\n");
                 return true;
             }
-            if (!t_start) {
-                t_start = atoll(std::string(reader.packet, 20).c_str());
-                std::string s = std::string(reader.packet + 20, len - 21);
-                rbv::hasher.deserialize(s);
-                continue;
-            }
-
-            char *packet = reader.packet;
+            char *packet = request.data();
             if (packet[0] == 's') {  // set
                 Key key;
                 Val val;
@@ -87,12 +79,12 @@ struct fd_worker {
             rbv::hasher.finalize();
 #ifdef PROFILE
             long long t_end = profile::get_us_abs();
-            profile::record_validation_latency(t_end - t_start);
+            profile::record_validation_latency(t_end - frame.t_start);
             profile::record_validation_cpu_time(0, 1);
 #endif
-            t_start = 0;
         }
-        return false;
+        fprintf(stderr, "primary closed the connection\n");
+        return true;
     }
     ~fd_worker() { free(wt_buffer); }
 };
@@ -46,6 +46,8 @@ Args parse_args(int argc, char **argv) {
          "number of reducers")
         ("num-threads,t", po::value<size_t>()->default_value(16),
          "number of threads")
+        ("num-chunks,c", po::value<size_t>()->default_value(1),
+         "number of chunks of a task, validated in parallel")
         ("input-port,i", po::value<size_t>()->default_value(12221),
          "port of input loader");
     // clang-format on
@@ -65,6 +67,7 @@ Args parse_args(int argc, char **argv) {
                     .n_reducers = vm["num-reducers"].as<size_t>(),
                     .n_buckets = vm["num-buckets"].as<size_t>(),
                     .n_threads = vm["num-threads"].as<size_t>(),
+                    .n_chunks = vm["num-chunks"].as<size_t>(),
                 }};
 }
 
@@ -99,20 +102,22 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
         cursor = split_end;
     }
     auto end_split_time = rdtsc();
-    limvc(1);
+    // one validation core per chunk of a task
+    limvc(config.n_chunks);
 #ifdef PROFILE
     profile::start();
 #endif
     // map
-    auto map_results =
-        __scee_run(create_result_array, config.n_mappers * config.n_reducers);
+    auto map_results = __scee_run(
+        create_result_array,
+        config.n_mappers * config.n_chunks * config.n_reducers);
     std::vector<scee::AppThread> mapper_threads;
     mapper_threads.reserve(config.n_threads);
     for (size_t i = 0; i < config.n_threads; ++i) {
         mapper_threads.emplace_back([&, i] {
             for (size_t j = i; j < config.n_mappers; j += config.n_threads) {
-                __scee_run(word_count_map_worker, splits[j], map_results, j,
-                           config);
+                __scee_run_chunked(config.n_chunks, word_count_map_worker,
+                                   splits[j], map_results, j, config);
             }
         });
     }
@@ -125,14 +130,15 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
 #endif
 
     // reduce
-    auto reduce_results = __scee_run(create_result_array, config.n_reducers);
+    auto reduce_results = __scee_run(create_result_array,
+                                     config.n_reducers * config.n_chunks);
     std::vector<scee::AppThread> reducer_threads;
     reducer_threads.reserve(config.n_threads);
     for (size_t i = 0; i < config.n_threads; ++i) {
         reducer_threads.emplace_back([&, i] {
             for (size_t j = i; j < config.n_reducers; j += config.n_threads) {
-                __scee_run(word_count_reduce_worker, map_results,
-                           reduce_results, j, config);
+                __scee_run_chunked(config.n_chunks, word_count_reduce_worker,
+                                   map_results, reduce_results, j, config);
             }
         });
     }
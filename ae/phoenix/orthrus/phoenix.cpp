@@ -176,7 +176,19 @@ static size_t scan_words(const char *start, size_t length, Fn add_kv) {
     return cursor - start;
 }
 
-void word_count_map_worker(std::string_view input,
+// the words of chunk `chunk` of `input`, cut at the end of a word
+static std::string_view input_chunk(std::string_view input, size_t chunk,
+                                    size_t n_chunks) {
+    const char *const end = input.data() + input.size();
+    auto boundary = [&](size_t i) -> const char * {
+        if (i == n_chunks) return end;
+        return skip_word(input.data() + input.size() * i / n_chunks, end);
+    };
+    const char *start = chunk == 0 ? input.data() : boundary(chunk);
+    return std::string_view(start, boundary(chunk + 1) - start);
+}
+
+void word_count_map_worker(size_t chunk, std::string_view input,
                            scee::mut_array<result_t> results, size_t mapper_idx,
                            map_reduce_config config) {
     std::vector<hash_table> hash_tables;
@@ -184,6 +196,7 @@ void word_count_map_worker(std::string_view input,
     for (size_t i = 0; i < config.n_reducers; ++i) {
         hash_tables.emplace_back(config.n_buckets);
     }
+    input = input_chunk(input, chunk, config.n_chunks);
     scan_words(
         input.data(), input.size(),
         [&hash_tables, n_reducers = config.n_reducers](std::string_view key) {
@@ -191,9 +204,10 @@ void word_count_map_worker(std::string_view input,
             hash_table &ht = hash_tables[hash % n_reducers];
             ht.inc(key, hash);
         });
+    const size_t map_idx = mapper_idx * config.n_chunks + chunk;
     for (size_t i = 0; i < config.n_reducers; ++i) {
         auto &ht = hash_tables[i];
-        size_t idx = mapper_idx * config.n_reducers + i;
+        size_t idx = map_idx * config.n_reducers + i;
         auto kv_pairs = scee::imm_array<kv_pair>::create(
             ht.size, [&ht](kv_pair *kv_pairs) { ht.collect(kv_pairs); });
         results.store(idx, {kv_pairs, ht.size});
@@ -238,39 +252,58 @@ static result_t reduce(const kv_pair *kv_pairs, size_t size) {
     return {reduced, reduced_size};
 }
 
-void word_count_reduce_worker(scee::mut_array<result_t> map_results,
+// the keys of a reducer are split over its chunks by the rest of their hash
+inline bool in_reduce_chunk(word key, size_t chunk, map_reduce_config config) {
+    if (config.n_chunks == 1) {
+        return true;
+    }
+    size_t hash = key_hash(std::string_view(key.data.deref(), key.size));
+    return hash / config.n_reducers % config.n_chunks == chunk;
+}
+
+void word_count_reduce_worker(size_t chunk,
+                              scee::mut_array<result_t> map_results,
                               scee::mut_array<result_t> reduce_results,
                               size_t reducer_idx, map_reduce_config config) {
-    // collect all kv pairs from all mappers
-    std::vector<const result_t *> mapper_results(config.n_mappers);
+    // collect the kv pairs of the chunk from all mappers
+    const size_t n_maps = config.n_mappers * config.n_chunks;
+    std::vector<const result_t *> mapper_results(n_maps);
     size_t total_kvs = 0;
-    for (size_t i = 0; i < config.n_mappers; ++i) {
+    for (size_t i = 0; i < n_maps; ++i) {
         mapper_results[i] =
             map_results.deref(i * config.n_reducers + reducer_idx);
         total_kvs += mapper_results[i]->second;
     }
     auto *kv_pairs = new kv_pair[total_kvs];
     size_t kv_offset = 0;
-    for (size_t i = 0; i < config.n_mappers; ++i) {
+    for (size_t i = 0; i < n_maps; ++i) {
         const auto *mapper_result = mapper_results[i];
         const auto *src_kv_pairs = mapper_result->first.deref();
         size_t n_kvs = mapper_result->second;
-        std::memcpy(kv_pairs + kv_offset, src_kv_pairs,
-                    n_kvs * sizeof(kv_pair));
-        kv_offset += n_kvs;
+        if (config.n_chunks == 1) {
+            std::memcpy(kv_pairs + kv_offset, src_kv_pairs,
+                        n_kvs * sizeof(kv_pair));
+            kv_offset += n_kvs;
+            continue;
+        }
+        for (size_t k = 0; k < n_kvs; ++k) {
+            if (in_reduce_chunk(src_kv_pairs[k].key, chunk, config)) {
+                kv_pairs[kv_offset++] = src_kv_pairs[k];
+            }
+        }
     }
     // shuffle kv pairs
-    shuffle_kv_pairs(kv_pairs, total_kvs);
+    shuffle_kv_pairs(kv_pairs, kv_offset);
     // reduce kv pairs
-    auto result = reduce(kv_pairs, total_kvs);
+    auto result = reduce(kv_pairs, kv_offset);
     delete[] kv_pairs;
-    reduce_results.store(reducer_idx, result);
+    reduce_results.store(reducer_idx * config.n_chunks + chunk, result);
 }
 
 result_t sort_results(scee::mut_array<result_t> results,
                       map_reduce_config config) {
     size_t total_size = 0;
-    size_t n_reducers = config.n_reducers;
+    size_t n_reducers = config.n_reducers * config.n_chunks;
     for (size_t i = 0; i < n_reducers; ++i) {
         total_size += results.deref(i)->second;
     }
@@ -35,6 +35,8 @@ struct map_reduce_config {
     size_t n_reducers;
     size_t n_buckets;
     size_t n_threads;
+    // closures a map or reduce task is run as, validated in parallel
+    size_t n_chunks;
 };
 
 using result_t = trivial_pair<scee::imm_array<kv_pair>, size_t>;
\ No newline at end of file
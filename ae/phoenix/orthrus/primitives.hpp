@@ -63,6 +63,8 @@ inline void *alloc_immutable_bulk(size_t size) {
     if (bulk_cursor + size_ > BULK_BUFFER_SIZE) {
         bulk_buffer = alloc_obj(BULK_BUFFER_SIZE);
         bulk_cursor = 0;
+        scee::bulk_buffer_bytes.fetch_add(BULK_BUFFER_SIZE,
+                                          std::memory_order_relaxed);
     }
     assert(bulk_buffer != nullptr);
     void *ptr = add_byte_offset(bulk_buffer, bulk_cursor);
@@ -137,8 +137,7 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
                 reader.read_packet('\x01');
                 long long start_us = profile::get_us_abs() + time_diff;
                 raw::word_count_map_worker(splits[j], map_results, j, config);
-                std::string s = rbv::hasher.finalize();
-                write_all(fd, rbv::toString20(start_us) + s + "\x01");
+                rbv::frame_writer(fd).append(rbv::hasher, start_us, nullptr, 0);
                 close(fd);
             }
         });
@@ -166,8 +165,7 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
                 long long start_us = profile::get_us_abs() + time_diff;
                 raw::word_count_reduce_worker(map_results, reduce_results, j,
                                               config);
-                std::string s = rbv::hasher.finalize();
-                write_all(fd, rbv::toString20(start_us) + s + "\x02");
+                rbv::frame_writer(fd).append(rbv::hasher, start_us, nullptr, 0);
                 close(fd);
             }
         });
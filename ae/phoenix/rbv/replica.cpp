@@ -156,12 +156,13 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
                 my_usleep(rand() % 10000);
             active_threads.fetch_add(1);
             write_all(client_fd, "ACK\x01");
-            len = reader.read_packet('\x01');
-            assert(len > 0);
+            rbv::frame_t frame;
+            std::string payload;
+            bool ok = rbv::frame_reader(client_fd).read(frame, rbv::hasher,
+                                                        payload);
+            assert(ok);
             long long start_my_us = profile::get_us_abs();
-            long long start_us = atoll(std::string(reader.packet, 20).c_str());
-            std::string s = std::string(reader.packet + 20, len - 21);
-            rbv::hasher.deserialize(s);
+            long long start_us = frame.t_start;
             raw::word_count_map_worker(splits[i], map_results, i, config);
             rbv::hasher.finalize();
             long long end_us = profile::get_us_abs();
@@ -202,12 +203,13 @@ int main_fn(const char *buffer, size_t file_size, map_reduce_config config) {
                 my_usleep(rand() % 10000);
             active_threads.fetch_add(1);
             write_all(client_fd, "ACK\x02");
-            len = reader.read_packet('\x02');
-            assert(len > 0);
+            rbv::frame_t frame;
+            std::string payload;
+            bool ok = rbv::frame_reader(client_fd).read(frame, rbv::hasher,
+                                                        payload);
+            assert(ok);
             long long start_my_us = profile::get_us_abs();
-            long long start_us = atoll(std::string(reader.packet, 20).c_str());
-            std::string s = std::string(reader.packet + 20, len - 21);
-            rbv::hasher.deserialize(s);
+            long long start_us = frame.t_start;
             raw::word_count_reduce_worker(map_results, reduce_results, i,
                                           config);
             rbv::hasher.finalize();
@@ -0,0 +1,323 @@
+// Runtime configuration of validation (sampling.hpp), and its control channel:
+// with SCEE_CTL=<socket path> (1: /tmp/orthrus-ctl-<pid>.sock), commands are
+// read line by line from the clients of a Unix socket, and SIGHUP reloads
+// sampling.config. Every command is answered by one JSON line.
+//   get                                     current configuration
+//   set [method=random|window] [rate=<percentage>] [max_cores=<n>]
+//   reload                                  read sampling.config again
+// See scripts/orthrus-ctl.py.
+
+#include <fcntl.h>
+#include <poll.h>
+#include <signal.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cerrno>
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <mutex>
+#include <sstream>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "controller.hpp"
+#include "profile.hpp"
+#include "sampling.hpp"
+
+namespace scee {
+
+std::atomic<uint64_t> sampling_config = SamplingConfig{}.pack();
+
+static std::mutex sampling_config_mutex;
+static std::string sampling_config_path = "sampling.config";
+
+int sampling_method_of(const std::string &name) {
+    if (name == "random") return SAMPLING_RANDOM;
+    if (name == "window") return SAMPLING_WINDOW;
+    return 0;
+}
+
+const char *sampling_method_name(int method) {
+    switch (method) {
+        case SAMPLING_RANDOM:
+            return "random";
+        case SAMPLING_WINDOW:
+            return "window";
+        default:
+            return "unknown";
+    }
+}
+
+std::string describe_sampling_config() {
+    const SamplingConfig config = get_sampling_config();
+    char buf[256];
+    snprintf(buf, sizeof(buf),
+             "{\"method\":\"%s\",\"rate\":%.2f,\"max_cores\":%u,"
+             "\"effective_rate\":%.2f,\"controller\":%s}",
+             sampling_method_name(config.method), config.rate / 100.0,
+             config.max_cores,
+             validation_controller.rate(config.rate) / 100.0,
+             validation_controller.enabled() ? "true" : "false");
+    return buf;
+}
+
+void update_sampling_config(const std::function<void(SamplingConfig &)> &change,
+                            const char *source) {
+    std::lock_guard<std::mutex> guard(sampling_config_mutex);
+    SamplingConfig config = get_sampling_config();
+    change(config);
+    config.rate = std::min(config.rate, SAMPLING_FULL_RATE);
+    sampling_config.store(config.pack(), std::memory_order_relaxed);
+    fprintf(stderr, "sampling config (%s): %s\n", source,
+            describe_sampling_config().c_str());
+}
+
+bool load_sampling_config(const char *path, const char *source) {
+    FILE *fp = fopen(path, "r");
+    if (fp == nullptr) {
+        fprintf(stderr, "Error: failed to open %s: %s\n", path,
+                strerror(errno));
+        return false;
+    }
+    char method[16];
+    double percentage;
+    unsigned max_cores;
+    int n = fscanf(fp, "%15s %lf %u", method, &percentage, &max_cores);
+    fclose(fp);
+    if (n < 2 || sampling_method_of(method) == 0 || percentage < 0 ||
+        percentage > 100) {
+        fprintf(stderr, "Error: invalid sampling config in %s\n", path);
+        return false;
+    }
+    sampling_config_path = path;
+    update_sampling_config(
+        [&](SamplingConfig &c) {
+            c.method = sampling_method_of(method);
+            c.rate = std::lround(percentage * (SAMPLING_FULL_RATE / 100));
+            if (n == 3) c.max_cores = max_cores;
+        },
+        source);
+    return true;
+}
+
+// effective values, for the telemetry
+static const int sampling_gauges[] = {
+    profile::add_gauge("sampling.rate_bp",
+                       [] { return get_sampling_config().rate; }),
+    profile::add_gauge("sampling.max_cores",
+                       [] { return get_sampling_config().max_cores; }),
+};
+
+// "set method=window rate=5", all or nothing
+static std::string set_command(std::istringstream &args) {
+    SamplingConfig config = get_sampling_config();
+    bool has_method = false, has_rate = false, has_max_cores = false;
+    std::string arg;
+    while (args >> arg) {
+        const size_t eq = arg.find('=');
+        const std::string key = arg.substr(0, eq);
+        const std::string value =
+            eq == std::string::npos ? "" : arg.substr(eq + 1);
+        char *end = nullptr;
+        if (key == "method") {
+            config.method = sampling_method_of(value);
+            if (config.method == 0) return "unknown method " + value;
+            has_method = true;
+        } else if (key == "rate") {
+            const double percentage = strtod(value.c_str(), &end);
+            if (value.empty() || *end != '\0' || percentage < 0 ||
+                percentage > 100) {
+                return "invalid rate " + value;
+            }
+            config.rate = std::lround(percentage * (SAMPLING_FULL_RATE / 100));
+            has_rate = true;
+        } else if (key == "max_cores") {
+            const unsigned long n = strtoul(value.c_str(), &end, 10);
+            if (value.empty() || *end != '\0') {
+                return "invalid max_cores " + value;
+            }
+            config.max_cores = n;
+            has_max_cores = true;
+        } else {
+            return "unknown setting " + key;
+        }
+    }
+    if (!has_method && !has_rate && !has_max_cores) {
+        return "nothing to set";
+    }
+    update_sampling_config(
+        [&](SamplingConfig &c) {
+            if (has_method) c.method = config.method;
+            if (has_rate) c.rate = config.rate;
+            if (has_max_cores) c.max_cores = config.max_cores;
+        },
+        "control");
+    return "";
+}
+
+static std::string execute(const std::string &line) {
+    std::istringstream args(line);
+    std::string command, error;
+    args >> command;
+    if (command == "get") {
+    } else if (command == "set") {
+        error = set_command(args);
+    } else if (command == "reload") {
+        if (!load_sampling_config(sampling_config_path.c_str(), "control")) {
+            error = "failed to load " + sampling_config_path;
+        }
+    } else {
+        error = "unknown command " + command;
+    }
+    if (!error.empty()) {
+        // the error may quote the command
+        std::replace_if(
+            error.begin(), error.end(),
+            [](char c) { return c == '"' || c == '\\' || c < ' '; }, '?');
+        return "{\"ok\":false,\"error\":\"" + error + "\"}\n";
+    }
+    return "{\"ok\":true,\"config\":" + describe_sampling_config() + "}\n";
+}
+
+static int sighup_pipe = -1;
+
+static void on_sighup(int) {
+    const int saved_errno = errno;
+    write(sighup_pipe, "", 1);
+    errno = saved_errno;
+}
+
+class Control {
+public:
+    Control() {
+        const char *env = getenv("SCEE_CTL");
+        if (env == nullptr || env[0] == '\0' || strcmp(env, "0") == 0) return;
+        if (strcmp(env, "1") == 0) {
+            path = "/tmp/orthrus-ctl-" + std::to_string(getpid()) + ".sock";
+        } else {
+            path = env;
+        }
+        if (!listen_socket() || pipe2(wakeup, O_CLOEXEC) != 0 ||
+            pipe2(sighup, O_CLOEXEC | O_NONBLOCK) != 0) {
+            return;
+        }
+        sighup_pipe = sighup[1];
+        struct sigaction action {};
+        action.sa_handler = on_sighup;
+        action.sa_flags = SA_RESTART;
+        sigemptyset(&action.sa_mask);
+        sigaction(SIGHUP, &action, nullptr);
+        thread = std::thread(&Control::run, this);
+        fprintf(stderr, "Control: %s, SIGHUP reloads sampling config\n",
+                path.c_str());
+    }
+
+    ~Control() {
+        if (!thread.joinable()) return;
+        signal(SIGHUP, SIG_DFL);
+        write(wakeup[1], "", 1);
+        thread.join();
+        for (Client &client : clients) close(client.fd);
+        for (int fd : {listen_fd, wakeup[0], wakeup[1], sighup[0], sighup[1]}) {
+            close(fd);
+        }
+        unlink(path.c_str());
+    }
+
+private:
+    struct Client {
+        int fd;
+        std::string buffer;  // an incomplete command
+    };
+
+    std::string path;
+    int listen_fd = -1;
+    int wakeup[2] = {-1, -1};
+    int sighup[2] = {-1, -1};
+    std::vector<Client> clients;
+    std::thread thread;
+
+    bool listen_socket() {
+        sockaddr_un addr{};
+        addr.sun_family = AF_UNIX;
+        if (path.size() >= sizeof(addr.sun_path)) {
+            fprintf(stderr, "Error: control socket path too long: %s\n",
+                    path.c_str());
+            return false;
+        }
+        strcpy(addr.sun_path, path.c_str());
+        unlink(path.c_str());
+        listen_fd = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+        if (listen_fd < 0 ||
+            bind(listen_fd, (sockaddr *)&addr, sizeof(addr)) != 0 ||
+            listen(listen_fd, 8) != 0) {
+            fprintf(stderr, "Error: control socket %s: %s\n", path.c_str(),
+                    strerror(errno));
+            if (listen_fd >= 0) close(listen_fd);
+            listen_fd = -1;
+            return false;
+        }
+        return true;
+    }
+
+    // false if the client is gone; clients are non-blocking, one that does
+    // not read its replies is dropped instead of blocking the thread
+    bool serve(Client &client) {
+        char buf[1024];
+        ssize_t n = read(client.fd, buf, sizeof(buf));
+        if (n < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) return true;
+        if (n <= 0) return false;
+        client.buffer.append(buf, n);
+        size_t end;
+        while ((end = client.buffer.find('\n')) != std::string::npos) {
+            const std::string reply = execute(client.buffer.substr(0, end));
+            client.buffer.erase(0, end + 1);
+            if (send(client.fd, reply.data(), reply.size(), MSG_NOSIGNAL) !=
+                (ssize_t)reply.size()) {
+                return false;
+            }
+        }
+        return client.buffer.size() < sizeof(buf);
+    }
+
+    void run() {
+        while (true) {
+            std::vector<pollfd> fds = {{wakeup[0], POLLIN, 0},
+                                       {sighup[0], POLLIN, 0},
+                                       {listen_fd, POLLIN, 0}};
+            for (const Client &client : clients) {
+                fds.push_back({client.fd, POLLIN, 0});
+            }
+            if (poll(fds.data(), fds.size(), -1) < 0) continue;
+            if (fds[0].revents) break;
+            if (fds[1].revents) {
+                char buf[16];
+                while (read(sighup[0], buf, sizeof(buf)) > 0) {
+                }
+                load_sampling_config(sampling_config_path.c_str(), "SIGHUP");
+            }
+            for (size_t i = 0; i < clients.size(); i++) {
+                if (fds[3 + i].revents && !serve(clients[i])) {
+                    close(clients[i].fd);
+                    clients[i].fd = -1;
+                }
+            }
+            std::erase_if(clients, [](const Client &c) { return c.fd < 0; });
+            if (fds[2].revents & POLLIN) {
+                int fd = accept4(listen_fd, nullptr, nullptr,
+                                 SOCK_CLOEXEC | SOCK_NONBLOCK);
+                if (fd >= 0) clients.push_back({fd, ""});
+            }
+        }
+    }
+};
+
+static Control control;
+
+}  // namespace scee
@@ -3,14 +3,110 @@
 #include <immintrin.h>
 #include <x86intrin.h>
 
+#include <array>
+
+#include "compiler.hpp"
 #include "memtypes.hpp"
+#include "utils.hpp"
 
 namespace scee {
 
-static __attribute__((target("sse4.2"))) uint32_t
-calculate_crc32(const void* data, std::size_t length) {
+/*
+    CRC32C (Castagnoli) of the versioned objects.
+
+    One chain of _mm_crc32_u64 is bound by the latency of the instruction (3
+    cycles, 1 per cycle throughput). Large buffers are cut in blocks of
+    three streams, run interleaved and combined by shifting the CRC of the
+    first streams over the next ones (a carry-less multiplication by x^(8n)
+    modulo the polynomial, then a reduction by _mm_crc32_u64). The result is
+    the same CRC as the one of a single chain.
+
+    The CRC is linear, so that the checksum of an object of which a slice
+    changed is derived from the old checksum and the old and new slice, see
+    crc32c_update(), and the checksum of a concatenation from the checksums
+    of its parts, see crc32c_combine().
+*/
+
+#define CRC32C_TARGET __attribute__((target("sse4.2,pclmul")))
+
+namespace crc32c {
+
+constexpr uint32_t POLY = 0x82f63b78;  // reflected
+
+// a * b modulo POLY, reflected (x^0 is the highest bit)
+constexpr uint32_t multmodp(uint32_t a, uint32_t b) {
+    uint32_t m = 1U << 31;
+    uint32_t p = 0;
+    while (true) {
+        if (a & m) {
+            p ^= b;
+            if ((a & (m - 1)) == 0) break;
+        }
+        m >>= 1;
+        b = b & 1 ? (b >> 1) ^ POLY : b >> 1;
+    }
+    return p;
+}
+
+/*
+    SHIFT[k] = x^(8 * 2^k - 33) modulo POLY, for k >= 3: shifting a CRC over
+    2^k bytes is a multiplication by x^(8 * 2^k), and shift() multiplies by
+    x^33 more, see below.
+*/
+constexpr auto SHIFT = [] {
+    std::array<uint32_t, 64> shift{};
+    uint32_t x8pow = 1U << 23;  // x^8, then x^(8 * 2^k)
+    for (size_t k = 0; k < 3; k++) x8pow = multmodp(x8pow, x8pow);
+    shift[3] = 1;  // x^31
+    for (size_t k = 4; k < shift.size(); k++) {
+        shift[k] = multmodp(shift[k - 1], x8pow);
+        x8pow = multmodp(x8pow, x8pow);
+    }
+    return shift;
+}();
+
+// crc * SHIFT[k]: the 64-bit carry-less product is the one of the
+// polynomials times x, the reduction multiplies it by x^32
+CRC32C_TARGET FORCE_INLINE uint32_t shift(uint32_t crc, size_t k) {
+    const __m128i product = _mm_clmulepi64_si128(
+        _mm_cvtsi32_si128(crc), _mm_cvtsi32_si128(SHIFT[k]), 0);
+    return _mm_crc32_u64(0, _mm_cvtsi128_si64(product));
+}
+
+// blocks of 3 * 2^K bytes while they fit, as three interleaved streams
+template <size_t K>
+CRC32C_TARGET FORCE_INLINE uint32_t
+interleaved(uint32_t crc, const uint64_t *&buffer64, std::size_t &length) {
+    constexpr size_t BLOCK = size_t(1) << K;
+    constexpr size_t WORDS = BLOCK / 8;
+    while (length >= 3 * BLOCK) {
+        uint64_t crc0 = crc, crc1 = 0, crc2 = 0;
+        for (size_t i = 0; i < WORDS; i++) {
+            crc0 = _mm_crc32_u64(crc0, buffer64[i]);
+            crc1 = _mm_crc32_u64(crc1, buffer64[i + WORDS]);
+            crc2 = _mm_crc32_u64(crc2, buffer64[i + 2 * WORDS]);
+        }
+        crc = shift(crc0, K) ^ crc1;
+        crc = shift(crc, K) ^ crc2;
+        buffer64 += 3 * WORDS;
+        length -= 3 * BLOCK;
+    }
+    return crc;
+}
+
+// blocks of 3 * 8 KiB, then of 3 * 256 B, the rest in one stream
+constexpr size_t LONG_SHIFT = 13;
+constexpr size_t SHORT_SHIFT = 8;
+constexpr size_t INTERLEAVE_THRESHOLD = 3 << SHORT_SHIFT;
+
+/*
+    The body of calculate_crc32() and of its copies for fault injection
+    (context/run.hpp, context/validation.hpp), inlined in each of them.
+*/
+CRC32C_TARGET FORCE_INLINE uint32_t compute(const void *data,
+                                            std::size_t length) {
     std::uint32_t crc = ~0U;
-    const auto* buffer = static_cast<const unsigned char*>(data);
+    const auto *buffer = static_cast<const unsigned char *>(data);
 
     while (length > 0 && reinterpret_cast<std::uintptr_t>(buffer) % 8 != 0) {
         crc = _mm_crc32_u8(crc, *buffer);
@@ -18,24 +114,28 @@ calculate_crc32(const void* data, std::size_t length) {
         length--;
     }
 
-    const auto* buffer64 = reinterpret_cast<const std::uint64_t*>(buffer);
+    const auto *buffer64 = reinterpret_cast<const std::uint64_t *>(buffer);
+    if (unlikely(length >= INTERLEAVE_THRESHOLD)) {
+        crc = interleaved<LONG_SHIFT>(crc, buffer64, length);
+        crc = interleaved<SHORT_SHIFT>(crc, buffer64, length);
+    }
     while (length >= 8) {
         crc = _mm_crc32_u64(crc, *buffer64);
         buffer64++;
         length -= 8;
     }
 
-    buffer = reinterpret_cast<const unsigned char*>(buffer64);
+    buffer = reinterpret_cast<const unsigned char *>(buffer64);
 
     if (length >= 4) {
-        auto value32 = *reinterpret_cast<const std::uint32_t*>(buffer);
+        auto value32 = *reinterpret_cast<const std::uint32_t *>(buffer);
         crc = _mm_crc32_u32(crc, value32);
         buffer += 4;
         length -= 4;
     }
 
     if (length >= 2) {
-        auto value16 = *reinterpret_cast<const std::uint16_t*>(buffer);
+        auto value16 = *reinterpret_cast<const std::uint16_t *>(buffer);
         crc = _mm_crc32_u16(crc, value16);
         buffer += 2;
         length -= 2;
@@ -48,8 +148,53 @@ calculate_crc32(const void* data, std::size_t length) {
     return ~crc;
 }
 
-inline checksum_t compute_checksum(const void* ptr, size_t size) {
+}  // namespace crc32c
+
+static CRC32C_TARGET uint32_t calculate_crc32(const void *data,
+                                              std::size_t length) {
+    return crc32c::compute(data, length);
+}
+
+// `crc` followed by `length` zero bytes, without the initial and final xor
+static CRC32C_TARGET uint32_t crc32c_shift(uint32_t crc, std::size_t length) {
+    for (; length % 8 != 0; length--) crc = _mm_crc32_u8(crc, 0);
+    for (size_t k = 3; length != 0; k++, length >>= 1) {
+        if (length & 8) crc = crc32c::shift(crc, k);
+    }
+    return crc;
+}
+
+// the CRC of A followed by B, from the CRC of A and the CRC of B
+inline uint32_t crc32c_combine(uint32_t crc_a, uint32_t crc_b,
+                               std::size_t length_b) {
+    return crc32c_shift(crc_a, length_b) ^ crc_b;
+}
+
+/*
+    The CRC of a buffer of `length` bytes, of CRC `crc`, once the `n` bytes at
+    `offset` changed from `old_bytes` to `new_bytes`. For buffers of the
+    same length the initial and final xor cancel out, so the CRCs differ by
+    the CRC of the changed slice, shifted over the bytes after it.
+*/
+inline uint32_t crc32c_update(uint32_t crc, std::size_t length,
+                              std::size_t offset, const void *old_bytes,
+                              const void *new_bytes, std::size_t n) {
+    const uint32_t delta =
+        calculate_crc32(old_bytes, n) ^ calculate_crc32(new_bytes, n);
+    return crc ^ crc32c_shift(delta, length - offset - n);
+}
+
+inline checksum_t compute_checksum(const void *ptr, size_t size) {
     return calculate_crc32(ptr, size);
 }
 
+// the checksum of a copy of an object of checksum `checksum`, of which the
+// `n` bytes at `offset` are replaced by `val`
+inline checksum_t update_checksum(checksum_t checksum, const void *obj,
+                                  size_t size, size_t offset, const void *val,
+                                  size_t n) {
+    return crc32c_update(checksum, size, offset, add_byte_offset(obj, offset),
+                         val, n);
+}
+
 }  // namespace scee
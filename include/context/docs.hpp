@@ -17,7 +17,8 @@ void *alloc_obj(size_t size);
 template <typename T>
 void alloc_obj_n(T **ptrs, size_t n, const T *default_v);
 
-// free an object by calling free_immutable() or by pushing to free_log.
+// free an object by calling free_immutable() or by retiring it to
+// thread_gc_instance (free_log.hpp).
 void free_obj(void *ptr);
 
 template <typename T>
@@ -70,6 +71,17 @@ void shadow_destroy(const T *shadow, size_t n);
  */
 void store_obj(void *dst, const void *src, size_t size);
 
+/* store a copy of the immutable object src, of which the `n` bytes at `offset`
+ * are replaced by `val`. The checksum of dst is derived from the one of src
+ * and the replaced bytes, instead of hashing the whole object.
+ * raw: copy, then write the slice
+ * run: same as raw
+ * validate: compare the size, then derive the checksum and compare
+ */
+template <typename T>
+void store_obj_slice(T *dst, const T *src, size_t offset, const void *val,
+                     size_t n);
+
 /* load a pointer from a ptr_t instance.
  * raw: read the value directly
  * run: record the address to load and the loaded value, OPTIONALLY validate the
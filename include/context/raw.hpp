@@ -73,6 +73,17 @@ inline void store_obj(T *dst, const T *src) {
     *(checksum_t *)add_byte_offset(dst, size) = compute_checksum(src, size);
 }
 
+template <typename T>
+inline void store_obj_slice(T *dst, const T *src, size_t offset,
+                            const void *val, size_t n) {
+    size_t size = get_size(src);
+    memcpy(dst, src, size);
+    memcpy(add_byte_offset(dst, offset), val, n);
+    checksum_t checksum = *(const checksum_t *)add_byte_offset(src, size);
+    *(checksum_t *)add_byte_offset(dst, size) =
+        update_checksum(checksum, src, size, offset, val, n);
+}
+
 inline const void *load_ptr(const void *ptr) { return *((const void **)ptr); }
 
 inline void store_ptr(const void *ptr, const void *val) {
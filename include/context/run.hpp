@@ -12,51 +12,23 @@ namespace app {
 using namespace ::scee;
 
 // duplicated implementation for fault injection
-static __attribute__((target("sse4.2"))) uint32_t
+static CRC32C_TARGET uint32_t
 calculate_crc32_app(const void *data, std::size_t length) {
-    std::uint32_t crc = ~0U;
-    const auto *buffer = static_cast<const unsigned char *>(data);
-
-    while (length > 0 && reinterpret_cast<std::uintptr_t>(buffer) % 8 != 0) {
-        crc = _mm_crc32_u8(crc, *buffer);
-        buffer++;
-        length--;
-    }
-
-    const auto *buffer64 = reinterpret_cast<const std::uint64_t *>(buffer);
-    while (length >= 8) {
-        crc = _mm_crc32_u64(crc, *buffer64);
-        buffer64++;
-        length -= 8;
-    }
-
-    buffer = reinterpret_cast<const unsigned char *>(buffer64);
-
-    if (length >= 4) {
-        auto value32 = *reinterpret_cast<const std::uint32_t *>(buffer);
-        crc = _mm_crc32_u32(crc, value32);
-        buffer += 4;
-        length -= 4;
-    }
-
-    if (length >= 2) {
-        auto value16 = *reinterpret_cast<const std::uint16_t *>(buffer);
-        crc = _mm_crc32_u16(crc, value16);
-        buffer += 2;
-        length -= 2;
-    }
-
-    if (length > 0) {
-        crc = _mm_crc32_u8(crc, *buffer);
-    }
-
-    return ~crc;
+    return crc32c::compute(data, length);
 }
 
 static checksum_t compute_checksum_app(const void *ptr, size_t size) {
     return calculate_crc32_app(ptr, size);
 }
 
+static checksum_t update_checksum_app(checksum_t checksum, const void *obj,
+                                      size_t size, size_t offset,
+                                      const void *val, size_t n) {
+    checksum_t delta = calculate_crc32_app(add_byte_offset(obj, offset), n) ^
+                       calculate_crc32_app(val, n);
+    return checksum ^ crc32c_shift(delta, size - offset - n);
+}
+
 inline void *alloc_obj(size_t size) {
     append_log_typed(size);
     void *ptr = alloc_immutable(size);
@@ -81,7 +53,7 @@ inline void alloc_obj_n(T **ptrs, size_t n, const T *default_v) {
     memcpy(ptrs, backup, sizeof(T *) * n);
 }
 
-inline void free_obj(void *ptr) { thread_gc_instance.free_log.push(ptr); }
+inline void free_obj(void *ptr) { thread_gc_instance.retire(ptr); }
 
 inline void *alloc_ptr() {
     void *ptr = alloc_mutable(sizeof(void *));
@@ -136,6 +108,17 @@ inline void store_obj(T *dst, const T *src) {
     *(checksum_t *)add_byte_offset(dst, size) = compute_checksum_app(src, size);
 }
 
+template <typename T>
+inline void store_obj_slice(T *dst, const T *src, size_t offset,
+                            const void *val, size_t n) {
+    size_t size = get_size(src);
+    memcpy(dst, src, size);
+    memcpy(add_byte_offset(dst, offset), val, n);
+    checksum_t checksum = *(const checksum_t *)add_byte_offset(src, size);
+    *(checksum_t *)add_byte_offset(dst, size) =
+        update_checksum_app(checksum, src, size, offset, val, n);
+}
+
 inline const void *load_ptr(const void *ptr) {
     // append_log_typed(ptr);
     const void *stored = *((const void **)ptr);
@@ -12,51 +12,23 @@ namespace validator {
 using namespace ::scee;
 
 // duplicated implementation for fault injection
-static __attribute__((target("sse4.2"))) uint32_t
+static CRC32C_TARGET uint32_t
 calculate_crc32_val(const void *data, std::size_t length) {
-    std::uint32_t crc = ~0U;
-    const auto *buffer = static_cast<const unsigned char *>(data);
-
-    while (length > 0 && reinterpret_cast<std::uintptr_t>(buffer) % 8 != 0) {
-        crc = _mm_crc32_u8(crc, *buffer);
-        buffer++;
-        length--;
-    }
-
-    const auto *buffer64 = reinterpret_cast<const std::uint64_t *>(buffer);
-    while (length >= 8) {
-        crc = _mm_crc32_u64(crc, *buffer64);
-        buffer64++;
-        length -= 8;
-    }
-
-    buffer = reinterpret_cast<const unsigned char *>(buffer64);
-
-    if (length >= 4) {
-        auto value32 = *reinterpret_cast<const std::uint32_t *>(buffer);
-        crc = _mm_crc32_u32(crc, value32);
-        buffer += 4;
-        length -= 4;
-    }
-
-    if (length >= 2) {
-        auto value16 = *reinterpret_cast<const std::uint16_t *>(buffer);
-        crc = _mm_crc32_u16(crc, value16);
-        buffer += 2;
-        length -= 2;
-    }
-
-    if (length > 0) {
-        crc = _mm_crc32_u8(crc, *buffer);
-    }
-
-    return ~crc;
+    return crc32c::compute(data, length);
 }
 
 static checksum_t compute_checksum_val(const void *ptr, size_t size) {
     return calculate_crc32_val(ptr, size);
 }
 
+static checksum_t update_checksum_val(checksum_t checksum, const void *obj,
+                                      size_t size, size_t offset,
+                                      const void *val, size_t n) {
+    checksum_t delta = calculate_crc32_val(add_byte_offset(obj, offset), n) ^
+                       calculate_crc32_val(val, n);
+    return checksum ^ crc32c_shift(delta, size - offset - n);
+}
+
 inline void *alloc_obj(size_t size) {
     log_reader.cmp_log_typed(size);
     void *ptr;
@@ -160,6 +132,19 @@ inline void store_obj(T *dst, const T *src) {
     validator_assert(computed == stored);
 }
 
+template <typename T>
+inline void store_obj_slice(T *dst, const T *src, size_t offset,
+                            const void *val, size_t n) {
+    size_t size = get_size(src);
+    validator_assert(size == get_size(dst));
+    validator_assert(offset + n <= size);
+    checksum_t checksum = *(const checksum_t *)add_byte_offset(src, size);
+    checksum_t computed =
+        update_checksum_val(checksum, src, size, offset, val, n);
+    checksum_t stored = *(checksum_t *)add_byte_offset(dst, size);
+    validator_assert(computed == stored);
+}
+
 inline const void *load_ptr(const void *ptr) {
     // log_reader.cmp_log_typed(ptr);
     const void *stored;
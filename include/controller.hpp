@@ -0,0 +1,74 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
+
+#include "sampling.hpp"
+
+namespace scee {
+
+/*
+    Closed-loop control of the sampling rate of validation, instead of the
+    static rate of sampling.config.
+
+    With SCEE_VALIDATION_CORES=<cores>, the rate is set every PERIOD_US so
+    that validation takes about that many cores: the cycles per validation
+    and the arrival rate of logs, measured by the validator threads, give
+    the rate the budget affords. With SCEE_VALIDATION_LAG_US=<us>, the rate
+    is also decreased multiplicatively while the oldest log of a batch
+    waited longer than that, and increased additively otherwise.
+
+    The rate stays between SCEE_VALIDATION_MIN_RATE (percent, default 1) and
+    the configured rate (sampling.config, or set at runtime). Its decisions
+    are published as telemetry gauges (profile.hpp): controller.rate_bp,
+    controller.validation_mcores and controller.lag_us. The update runs on
+    the validator thread that ends the period, there is no controller
+    thread.
+*/
+class ValidationController {
+public:
+    static constexpr int64_t PERIOD_US = 10000;
+    static constexpr uint32_t FULL_RATE = SAMPLING_FULL_RATE;
+
+    ValidationController();
+
+    bool enabled() const { return target_cycles_per_us > 0 || target_lag_us; }
+
+    // current sampling rate, the configured rate `max_rate` at most
+    uint32_t rate(uint32_t max_rate) const {
+        if (!enabled()) return max_rate;
+        return std::min(current.load(std::memory_order_relaxed), max_rate);
+    }
+
+    // a batch of `count` logs, `validated` of them in `cycles`, the first
+    // one enqueued `lag_us` ago
+    void record(uint64_t cycles, uint64_t count, uint64_t validated,
+                uint64_t lag_us);
+
+private:
+    double target_cycles_per_us = 0;
+    uint64_t target_lag_us = 0;
+    uint32_t min_rate = FULL_RATE / 100;
+
+    std::atomic<uint32_t> current = FULL_RATE;
+    // of the current period
+    std::atomic<uint64_t> period_cycles = 0, period_logs = 0,
+                          period_validated = 0, period_lag_us = 0;
+    std::atomic<int64_t> period_start_us = 0;
+    std::atomic_flag updating = ATOMIC_FLAG_INIT;
+
+    // estimates, updated under `updating`
+    double cycles_per_validation = 0;
+    double logs_per_us = 0;
+    double lag_rate = FULL_RATE;
+
+    // of the last period, for the gauges
+    std::atomic<uint64_t> last_mcores = 0, last_lag_us = 0;
+
+    void update(int64_t now_us);
+};
+
+extern ValidationController validation_controller;
+
+}  // namespace scee
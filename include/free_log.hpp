@@ -1,157 +1,256 @@
 #pragma once
 
-#include <x86intrin.h>
-
+#include <algorithm>
 #include <atomic>
 #include <cstddef>
 #include <cstdint>
 #include <cstdio>
 #include <cstdlib>
+#include <utility>
+#include <vector>
 
 #include "compiler.hpp"
 #include "memmgr.hpp"
 #include "spin_lock.hpp"
 #include "utils.hpp"
 
+/*
+    Reclamation of the objects freed by application threads, which closures
+    pending validation may still read.
+
+    Closures are tracked by epochs: a closure is in the global epoch when it
+    starts, and every thread counts the closures it started and that were
+    validated, per parity of their epoch. The epoch advances from E to E + 1
+    once no closure of E - 1 is pending, so pending closures are of the
+    current or the previous epoch, and an object freed in epoch E is
+    collected once the epoch is E + 2.
+
+    A long closure only holds back the epoch, the freed objects wait in the
+    FreeLog of their thread, which grows in chunks instead of stalling the
+    thread.
+*/
+
 namespace scee {
 
 struct FreeLogEntry {
     void *ptr;
-    uint64_t timestamp;
+    uint64_t epoch;  // of the free
 };
 
-struct FreeLog;
-void thread_gc(FreeLog *log);
+// Pushed by the application thread, collected by it or by a validator, under
+// ThreadGC::spin_lock. Entries are in chunks linked as a queue.
+struct FreeLog {
+    static constexpr size_t CHUNK_SIZE = 1024;
 
-constexpr uint64_t GC_TICK_CYCLES = 0x100000;
+    struct Chunk {
+        FreeLogEntry entries[CHUNK_SIZE];
+        std::atomic<size_t> size = 0;  // published by push()
+        std::atomic<Chunk *> next = nullptr;
+    };
 
-inline uint64_t current_gc_tsc() { return _rdtsc() / GC_TICK_CYCLES; }
+    Chunk *head;  // collector side
+    size_t front = 0;
+    Chunk *tail;  // pusher side
+    // single writers, for size()
+    std::atomic<size_t> pushed = 0;
+    std::atomic<size_t> popped = 0;
 
-struct alignas(CACHELINE_SIZE) FreeLog {
-    // how many object should be pending for validation and free in one thread
-    // NOTE(kuriko): enlarged to avoid double-free
-    static constexpr size_t MAX_SIZE = 4096;
+    FreeLog() { head = tail = new Chunk; }
 
-    FreeLogEntry entries[MAX_SIZE];
-    size_t front;
-    size_t back;
+    ~FreeLog() {
+        while (head != nullptr) {
+            delete std::exchange(head, head->next.load());
+        }
+    }
 
-    FreeLog() {
-        front = 0;
-        back = 0;
+    // returns true if a new chunk was started
+    bool push(void *ptr, uint64_t epoch) {
+        const size_t n = tail->size.load(std::memory_order_relaxed);
+        pushed.store(pushed.load(std::memory_order_relaxed) + 1,
+                     std::memory_order_relaxed);
+        if (likely(n < CHUNK_SIZE)) {
+            tail->entries[n] = {ptr, epoch};
+            tail->size.store(n + 1, std::memory_order_release);
+            return false;
+        }
+        Chunk *chunk = new Chunk;
+        chunk->entries[0] = {ptr, epoch};
+        chunk->size.store(1, std::memory_order_relaxed);
+        tail->next.store(chunk, std::memory_order_release);
+        tail = chunk;
+        return true;
     }
 
-    void push(void *ptr) {
-    retry:
-        entries[back] = {ptr, current_gc_tsc()};
-        back = (back + 1) % MAX_SIZE;
-        if (unlikely(full())) {
-            thread_gc(this);
-            goto retry;
+    // nullptr if empty
+    const FreeLogEntry *peek() {
+        if (front == CHUNK_SIZE) {
+            Chunk *next = head->next.load(std::memory_order_acquire);
+            if (next == nullptr) return nullptr;
+            // the pusher moved to `next`
+            delete head;
+            head = next;
+            front = 0;
+        }
+        if (front == head->size.load(std::memory_order_acquire)) {
+            return nullptr;
         }
+        return head->entries + front;
     }
 
-    void pop() { front = (front + 1) % MAX_SIZE; }
+    void pop() {
+        front++;
+        popped.store(popped.load(std::memory_order_relaxed) + 1,
+                     std::memory_order_relaxed);
+    }
 
-    const FreeLogEntry *peek() const { return entries + front; }
+    bool empty() const { return size() == 0; }
 
-    bool empty() const { return front == back; }
+    size_t size() const {
+        return pushed.load(std::memory_order_relaxed) -
+               popped.load(std::memory_order_relaxed);
+    }
 
-    bool full() const { return (back + 1) % MAX_SIZE == front; }
+};
+
+struct ThreadGC {
+    FreeLog free_log;
+    SpinLock spin_lock;
+    // closures of the thread, per parity of their epoch
+    alignas(CACHELINE_SIZE) std::atomic<uint64_t> started[2] = {};
+    alignas(CACHELINE_SIZE) std::atomic<uint64_t> validated[2] = {};
+    // registry of epoch_manager
+    ThreadGC *prev = nullptr;
+    ThreadGC *next = nullptr;
+    bool registered = false;
+    // bytes retired and not added to EpochManager::pending_bytes() yet
+    int64_t unflushed_bytes = 0;
 
-    size_t size() const { return (back - front + MAX_SIZE) % MAX_SIZE; }
+    // the thread frees `ptr`, an immutable object
+    void retire(void *ptr);
+
+    // the thread exits, after its closures were validated
+    ~ThreadGC();
 };
 
-struct ClosureStartLog {
-    static constexpr size_t MAX_SIZE = 256;
-    static constexpr size_t MAX_TSC_INTERVAL = GC_TICK_CYCLES * MAX_SIZE;
+void thread_gc(ThreadGC *gc);
 
-    std::atomic_size_t closure_count[MAX_SIZE];
-    SpinLock spin_lock;
-    uint64_t earliest_tsc;
+class EpochManager {
+public:
+    // objects freed by a thread are collected after this many are pending
+    static constexpr size_t GC_THRESHOLD = 64;
+    // a thread adds the bytes it retires to pending_bytes() by this many
+    static constexpr int64_t FLUSH_BYTES = 64 << 10;
 
-    ClosureStartLog() {
-        for (auto &i : closure_count) {
-            i = 0;
-        }
-        earliest_tsc = 0;
-    }
+    uint64_t current() const { return global_epoch.load(); }
 
-    // return the tsc of the closure start
-    uint64_t new_closure() {
-        uint64_t tsc = current_gc_tsc();
-        if (unlikely(tsc >= earliest_tsc + MAX_TSC_INTERVAL)) {
-            poll_earliest_tsc();
-            if (unlikely(tsc >= earliest_tsc + MAX_TSC_INTERVAL)) {
-                // still can not allocate a new slot
-                std::abort();
-            }
+    // the epoch of a closure started by the thread of `gc`
+    uint64_t enter(ThreadGC *gc) {
+        if (unlikely(!gc->registered)) register_thread(gc);
+        while (true) {
+            const uint64_t epoch =
+                global_epoch.load(std::memory_order_relaxed);
+            std::atomic<uint64_t> &started = gc->started[epoch & 1];
+            // ordered before the load of the epoch, see try_advance()
+            started.store(started.load(std::memory_order_relaxed) + 1);
+            if (likely(global_epoch.load() == epoch)) return epoch;
+            started.store(started.load(std::memory_order_relaxed) - 1,
+                          std::memory_order_relaxed);
         }
-        closure_count[tsc % MAX_SIZE].fetch_add(1, std::memory_order_relaxed);
-        return tsc;
     }
 
-    void validated_closure(uint64_t tsc, FreeLog *log);
+    // a closure of the thread of `gc`, started in `epoch`, was validated
+    void validated_closure(ThreadGC *gc, uint64_t epoch);
 
-    uint64_t poll_earliest_tsc_impl() {
-        // uint64_t etsc;
-        if (unlikely(earliest_tsc == 0)) {
-            return current_gc_tsc();
-        }
-        uint64_t current_tsc = current_gc_tsc();
-        for (uint64_t tsc = earliest_tsc; tsc < current_tsc; tsc++) {
-            auto &count = closure_count[tsc % MAX_SIZE];
-            if (count.load(std::memory_order_relaxed) != 0) {
-                return tsc;
-            }
-        }
-        return current_tsc;
+    // advances the epoch if no closure of the previous one is pending
+    bool try_advance();
+
+    void register_thread(ThreadGC *gc);
+    // its objects not collected yet are collected by any thread later
+    void unregister_thread(ThreadGC *gc);
+
+    bool has_orphans() const {
+        return n_orphans.load(std::memory_order_relaxed) > 0;
     }
+    void collect_orphans();
 
-    uint64_t poll_earliest_tsc() {
-        if (!spin_lock.TryLock()) {
-            return earliest_tsc;
+    // bytes of the objects retired and not collected yet, of all threads
+    // (up to FLUSH_BYTES per thread late), for the memory profile. They are
+    // counted from the first call on, frees do not look the sizes up before
+    size_t pending_bytes() {
+        if (unlikely(!counts_bytes())) {
+            count_bytes.store(true, std::memory_order_relaxed);
         }
-        uint64_t tsc = poll_earliest_tsc_impl();
-        earliest_tsc = tsc;
-        spin_lock.Unlock();
-        return tsc;
+        return std::max<int64_t>(
+            pending_free_bytes.load(std::memory_order_relaxed), 0);
+    }
+    bool counts_bytes() const {
+        return count_bytes.load(std::memory_order_relaxed);
+    }
+    void add_pending_bytes(int64_t bytes) {
+        pending_free_bytes.fetch_add(bytes, std::memory_order_relaxed);
     }
-};  // namespace scee
 
-struct ThreadGC {
-    FreeLog free_log;
-    SpinLock spin_lock;
+private:
+    std::atomic<uint64_t> global_epoch = 0;
+
+    SpinLock registry_lock;
+    ThreadGC *threads = nullptr;
+
+    // freed objects of exited threads
+    SpinLock orphan_lock;
+    std::vector<FreeLogEntry> orphans;
+    std::atomic<size_t> n_orphans = 0;
+
+    std::atomic<bool> count_bytes = false;
+    std::atomic<int64_t> pending_free_bytes = 0;
 };
 
 extern thread_local ThreadGC thread_gc_instance;
 extern thread_local ThreadGC *app_thread_gc_instance;
-extern ClosureStartLog closure_start_log;
+extern EpochManager epoch_manager;
+// set while a validator validates a batch of logs, it collects once after
+extern thread_local bool batch_thread_gc;
 
-inline void ClosureStartLog::validated_closure(uint64_t tsc, FreeLog *log) {
-    closure_count[tsc % MAX_SIZE].fetch_sub(1, std::memory_order_relaxed);
-    if (tsc == earliest_tsc || app_thread_gc_instance->free_log.size() > 64) {
-        thread_gc(log);
+inline void ThreadGC::retire(void *ptr) {
+    if (unlikely(epoch_manager.counts_bytes())) {
+        unflushed_bytes += slab_allocator.usable_size(ptr);
+        if (unlikely(unflushed_bytes >= EpochManager::FLUSH_BYTES)) {
+            epoch_manager.add_pending_bytes(std::exchange(unflushed_bytes, 0));
+        }
+    }
+    if (unlikely(free_log.push(ptr, epoch_manager.current()))) {
+        thread_gc(this);
     }
 }
 
-inline void thread_gc(FreeLog *log) {
-    auto *gc_instance = app_thread_gc_instance;
-    if (gc_instance == nullptr) {
-        gc_instance = &thread_gc_instance;
+inline void EpochManager::validated_closure(ThreadGC *gc, uint64_t epoch) {
+    // the validation is done reading the objects, see try_advance(); the
+    // chunks of a closure of the thread are validated concurrently
+    gc->validated[epoch & 1].fetch_add(1, std::memory_order_release);
+    if (batch_thread_gc) return;
+    if (gc->free_log.size() > GC_THRESHOLD) {
+        thread_gc(gc);
     }
-    if (!gc_instance->spin_lock.TryLock()) return;
-    uint64_t earliest_tsc = closure_start_log.poll_earliest_tsc();
-    while (!log->empty()) {
-        const auto *entry = log->peek();
-        if (entry->timestamp < earliest_tsc) {
-            free_immutable(entry->ptr);
-            log->pop();
-        } else {
-            break;
-        }
+}
+
+// collects the objects freed by the thread of `gc` that are safe to free
+inline void thread_gc(ThreadGC *gc) {
+    if (!gc->spin_lock.TryLock()) return;
+    epoch_manager.try_advance();
+    const uint64_t epoch = epoch_manager.current();
+    const bool count_bytes = epoch_manager.counts_bytes();
+    int64_t freed_bytes = 0;
+    while (const FreeLogEntry *entry = gc->free_log.peek()) {
+        if (entry->epoch + 2 > epoch) break;
+        if (count_bytes) freed_bytes += slab_allocator.usable_size(entry->ptr);
+        free_immutable(entry->ptr);
+        gc->free_log.pop();
+    }
+    gc->spin_lock.Unlock();
+    if (freed_bytes != 0) epoch_manager.add_pending_bytes(-freed_bytes);
+    if (unlikely(epoch_manager.has_orphans())) {
+        epoch_manager.collect_orphans();
     }
-    gc_instance->spin_lock.Unlock();
 }
 
 }  // namespace scee
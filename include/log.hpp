@@ -8,6 +8,7 @@
 #include <cstdlib>
 #include <cstring>
 #include <iostream>
+#include <limits>
 #include <queue>
 #include <stack>
 #include <type_traits>
@@ -15,6 +16,7 @@
 #include "assertion.hpp"
 #include "compiler.hpp"
 #include "free_log.hpp"
+#include "log_buffer_pool.hpp"
 #include "memmgr.hpp"
 #include "profile.hpp"
 #include "queue.hpp"
@@ -28,18 +30,20 @@
     | padding to 64 bytes            |
     | uint64_t in_use                |
     | uint64_t nr_reclaimed          |
+    | uint32_t node                  |
+    | padding to 64 bytes            |
+    | uint64_t base_epoch            |
+    | uint64_t base_us               |
     | padding to 64 bytes            |
     |--------------------------------|
-    | log 1 | uint32_t length        |
-    |       | uint32_t reclaimed     |
-    |       | uint64_t gc_tsc        |
-    |       |                        |
-    |       | (aligned with 8 bytes) |
+    | log 1 | uint16_t length        |
+    |       | uint16_t epoch delta   |
+    |       | uint32_t start_us delta|
     |       | DATA ...               |
-    |       |                        |
-    |       | uint32_t length        |
-    |       | uint32_t 0x0000DEAD    |
-    | padding to 64 bytes            |
+    |       | (aligned with 8 bytes) |
+    |       | uint16_t length        |
+    |       | uint16_t 0xDEAD        |
+    | padding to 8 bytes             |
     |--------------------------------|
     | log 2 | ...                    |
     |--------------------------------|
@@ -47,11 +51,12 @@
     |--------------------------------|
     | log n | ...                    |
     |--------------------------------|
-    | padding | uint32_t length      |
-    |         | uint32_t 0x1         |
-    |         | ...                  |
-    |--------------------------------|
 
+    Logs are packed, several small logs share a cache line. The times of a
+    log are deltas to the base of its buffer, set when the buffer is
+    allocated; a thread that comes back to its buffer after too long for a
+    delta to fit closes it with an empty log (length 0), which is reclaimed
+    without validation, and continues in a new buffer.
 */
 
 namespace scee {
@@ -60,27 +65,32 @@ constexpr bool CHECK_OVERFLOW_ON_APPEND = false;
 constexpr bool CHECK_OVERFLOW_ON_COMMIT = false;
 constexpr size_t MIN_LOG_BUFFER_SIZE = (1 << 15);
 constexpr size_t MAX_LOG_BUFFER_SIZE = MIN_LOG_BUFFER_SIZE * 16;
+constexpr size_t LOG_ALIGNMENT = 8;
 
 struct LogBufferHead {
     uint64_t nr_logs;
     std::byte padding1[CACHELINE_SIZE - 8];
     uint64_t in_use;
     std::atomic<uint64_t> nr_reclaimed;
-    std::byte padding2[CACHELINE_SIZE - 16];
+    uint32_t node;  // NUMA node of the memory, log_buffer_pool.hpp
+    std::byte padding2[CACHELINE_SIZE - 20];
+    // read-only once the buffer is allocated
+    uint64_t base_epoch;
+    uint64_t base_us;
+    std::byte padding3[CACHELINE_SIZE - 16];
 };
 
 struct LogHead {
-    uint32_t length;
-    uint32_t reclaimed;
-    uint64_t gc_tsc;
-    uint64_t start_us;
+    uint16_t length;  // 0: an empty log, closing the buffer
+    uint16_t epoch_delta;
+    uint32_t start_us_delta;
 };
 
 struct LogTail {
-    uint32_t length;
-    uint32_t magic;
+    uint16_t length;
+    uint16_t magic;
 
-    constexpr static uint32_t MAGIC = 0x0000DEAD;
+    constexpr static uint16_t MAGIC = 0xDEAD;
 };
 
 struct Log {
@@ -88,7 +98,18 @@ struct Log {
     LogHead *head;
 };
 
-static_assert(sizeof(LogBufferHead) == CACHELINE_SIZE * 2);
+static_assert(sizeof(LogBufferHead) == CACHELINE_SIZE * 3);
+static_assert(sizeof(LogHead) == LOG_ALIGNMENT);
+// a buffer has room for a log of MIN_LOG_BUFFER_SIZE bytes at most, see
+// is_buffer_exhausted(); its length fits the heads and tails
+static_assert(MIN_LOG_BUFFER_SIZE <=
+              std::numeric_limits<decltype(LogHead::length)>::max());
+static_assert(MIN_LOG_BUFFER_SIZE <=
+              std::numeric_limits<decltype(LogTail::length)>::max());
+
+inline size_t align_log_size(size_t size) {
+    return (size + LOG_ALIGNMENT - 1) & ~(LOG_ALIGNMENT - 1);
+}
 
 inline LogBufferHead *get_log_buffer_head(void *log) {
     static_assert(is_power_of_2(MAX_LOG_BUFFER_SIZE));
@@ -97,38 +118,49 @@ inline LogBufferHead *get_log_buffer_head(void *log) {
     return reinterpret_cast<LogBufferHead *>(addr);
 }
 
+// the epoch of the closure, free_log.hpp
+inline uint64_t get_log_epoch(LogHead *log) {
+    return get_log_buffer_head(log)->base_epoch + log->epoch_delta;
+}
+
+inline uint64_t get_log_start_us(LogHead *log) {
+    return get_log_buffer_head(log)->base_us + log->start_us_delta;
+}
+
+// false if the times do not fit the deltas of the buffer of `log`
+inline bool set_log_times(LogHead *log, uint64_t epoch, uint64_t start_us) {
+    const LogBufferHead *buffer = get_log_buffer_head(log);
+    const uint64_t epoch_delta = epoch - buffer->base_epoch;
+    const uint64_t start_us_delta = start_us - buffer->base_us;
+    if (unlikely(epoch_delta > UINT16_MAX || start_us_delta > UINT32_MAX)) {
+        return false;
+    }
+    log->epoch_delta = epoch_delta;
+    log->start_us_delta = start_us_delta;
+    return true;
+}
+
 inline bool is_buffer_exhausted(LogHead *log) {
     auto *buffer = get_log_buffer_head(log);
-    void *cursor = add_byte_offset(log, align_size_to_cacheline(log->length));
+    void *cursor = add_byte_offset(log, align_log_size(log->length));
     return ptr_distance(buffer, cursor) >
            MAX_LOG_BUFFER_SIZE - MIN_LOG_BUFFER_SIZE;
 }
 
-struct GlobalLogBufferAllocator {
-    static SpinLock spin_lock;
-    static std::queue<void *> free_buffers;
-};
-
-// allocate a new, free log buffer
+// allocate a new, free log buffer, see log_buffer_pool.hpp
 // each buffer has a size of MAX_LOG_BUFFER_SIZE
 inline void *allocate_log_buffer() {
-    void *buffer;
-    GlobalLogBufferAllocator::spin_lock.Lock();
-    if (GlobalLogBufferAllocator::free_buffers.empty()) {
-        // fprintf(stderr, "new buffer\n");
-        buffer = std::aligned_alloc(MAX_LOG_BUFFER_SIZE, MAX_LOG_BUFFER_SIZE);
-    } else {
-        buffer = GlobalLogBufferAllocator::free_buffers.front();
-        GlobalLogBufferAllocator::free_buffers.pop();
-    }
-    GlobalLogBufferAllocator::spin_lock.Unlock();
-    return buffer;
+    const LogBufferRef ref = allocate_log_buffer_ref();
+    static_cast<LogBufferHead *>(ref.buffer)->node = ref.node;
+    return ref.buffer;
 }
 
 // reclaim a log
 inline void reclaim_log(LogHead *log) {
-    closure_start_log.validated_closure(log->gc_tsc,
-                                        &app_thread_gc_instance->free_log);
+    if (likely(log->length != 0)) {
+        epoch_manager.validated_closure(app_thread_gc_instance,
+                                        get_log_epoch(log));
+    }
     LogBufferHead *buffer = get_log_buffer_head(log);
     buffer->nr_reclaimed.fetch_add(1, std::memory_order_relaxed);
     // check `in_use` first to avoid false sharing
@@ -136,46 +168,46 @@ inline void reclaim_log(LogHead *log) {
     // cacheline of `nr_logs` is MODIFIED in mutator thread
     if (unlikely(buffer->in_use == 0)) {
         if (buffer->nr_reclaimed == buffer->nr_logs) {
-            GlobalLogBufferAllocator::spin_lock.Lock();
-            GlobalLogBufferAllocator::free_buffers.push(buffer);
-            GlobalLogBufferAllocator::spin_lock.Unlock();
+            free_log_buffer_ref({buffer, buffer->node});
         }
     }
 }
 
 class ThreadLogAllocator {
 public:
-    LogHead *allocate() {
-        if (unlikely(buffers.empty())) {
-            auto *buffer = static_cast<LogBufferHead *>(allocate_log_buffer());
-            buffer->nr_logs = 0;
-            buffer->in_use = 1;
-            buffer->nr_reclaimed.store(0, std::memory_order_relaxed);
-            void *next_log_addr =
-                add_byte_offset(buffer, sizeof(LogBufferHead));
-            static_assert(MAX_LOG_BUFFER_SIZE >=
-                          sizeof(LogHead) + MIN_LOG_BUFFER_SIZE);
-            return static_cast<LogHead *>(next_log_addr);
+    ~ThreadLogAllocator() { flush_stats(); }
+
+    // a log started in `epoch`, at `start_us`
+    LogHead *allocate(uint64_t epoch, uint64_t start_us) {
+        while (likely(!buffers.empty())) {
+            auto *log = static_cast<LogHead *>(buffers.top());
+            buffers.pop();
+            if (likely(set_log_times(log, epoch, start_us))) {
+                return log;
+            }
+            close_buffer(log);
         }
 
-        auto *log = buffers.top();
-        buffers.pop();
-        return static_cast<LogHead *>(log);
+        auto *buffer = static_cast<LogBufferHead *>(allocate_log_buffer());
+        buffer->nr_logs = 0;
+        buffer->in_use = 1;
+        buffer->nr_reclaimed.store(0, std::memory_order_relaxed);
+        buffer->base_epoch = epoch;
+        buffer->base_us = start_us;
+        void *next_log_addr = add_byte_offset(buffer, sizeof(LogBufferHead));
+        static_assert(MAX_LOG_BUFFER_SIZE >=
+                      sizeof(LogBufferHead) + MIN_LOG_BUFFER_SIZE);
+        auto *log = static_cast<LogHead *>(next_log_addr);
+        set_log_times(log, epoch, start_us);
+        return log;
     }
 
     void commit(LogHead *log) {
-        if constexpr (CHECK_OVERFLOW_ON_COMMIT) {
-            if (unlikely(log->length > MIN_LOG_BUFFER_SIZE)) {
-                fprintf(stderr, "Error: log length %u exceeded the limit %lu\n",
-                        log->length, MIN_LOG_BUFFER_SIZE);
-                std::abort();
-            }
-        }
-
         auto *buffer = get_log_buffer_head(log);
         buffer->nr_logs++;
-        void *next_log_addr =
-            add_byte_offset(log, align_size_to_cacheline(log->length));
+        const size_t size = align_log_size(log->length);
+        void *next_log_addr = add_byte_offset(log, size);
+        account(size, log->length - sizeof(LogHead) - sizeof(LogTail));
 
         // check if there are enough space to reuse this buffer
         if (likely(ptr_distance(buffer, next_log_addr) <=
@@ -195,6 +227,35 @@ public:
     // pointers to the first unused memory in the thread-local log buffers
     // each buffer has a size no less than MIN_LOG_BUFFER_SIZE
     std::stack<void *> buffers;
+
+private:
+    static constexpr uint64_t STATS_BATCH = 1024;  // logs
+    uint64_t stats_logs = 0, stats_bytes = 0, stats_uncompacted_bytes = 0;
+
+    // the last log of a buffer, reclaimed without validation
+    void close_buffer(LogHead *log) {
+        // the times did not fit, see set_log_times()
+        *log = {.length = 0, .epoch_delta = 0, .start_us_delta = 0};
+        auto *buffer = get_log_buffer_head(log);
+        buffer->nr_logs++;
+        buffer->in_use = 0;
+        log_enqueue(log);
+    }
+
+    // `size` bytes in the buffer for `data_size` bytes of closure data
+    void account(size_t size, size_t data_size) {
+        stats_logs++;
+        stats_bytes += size;
+        // 24 bytes of head and 8 of tail, aligned to cache lines
+        stats_uncompacted_bytes += align_size_to_cacheline(data_size + 32);
+        if (unlikely(stats_logs == STATS_BATCH)) flush_stats();
+    }
+
+    void flush_stats() {
+        profile::record_log_bytes(stats_logs, stats_bytes,
+                                  stats_uncompacted_bytes);
+        stats_logs = stats_bytes = stats_uncompacted_bytes = 0;
+    }
 };
 
 struct ThreadLogManager {
@@ -226,10 +287,8 @@ inline void new_log() {
     //     manager->caller_logs.push(manager->current_log);
     // }
     // allocate a new log
-    LogHead *log = manager->allocator.allocate();
-    log->reclaimed = 0;
-    log->gc_tsc = closure_start_log.new_closure();
-    log->start_us = profile::get_us_abs();
+    const uint64_t epoch = epoch_manager.enter(&thread_gc_instance);
+    LogHead *log = manager->allocator.allocate(epoch, profile::get_us_abs());
     manager->current_log.head = log;
     manager->current_log.cursor = add_byte_offset(log, sizeof(LogHead));
 }
@@ -286,8 +345,21 @@ inline void commit_log() {
     auto *log_tail = static_cast<LogTail *>(log.cursor);
     log.cursor = add_byte_offset(log.cursor, sizeof(LogTail));
     uint32_t log_length = ptr_distance(log.head, log.cursor);
+    // truncated, the length would send the validator into the next log
+    if (unlikely(log_length > UINT16_MAX)) {
+        fprintf(stderr, "Error: log length %u does not fit 16 bits\n",
+                log_length);
+        std::abort();
+    }
+    if constexpr (CHECK_OVERFLOW_ON_COMMIT) {
+        if (unlikely(log_length > MIN_LOG_BUFFER_SIZE)) {
+            fprintf(stderr, "Error: log length %u exceeded the limit %lu\n",
+                    log_length, MIN_LOG_BUFFER_SIZE);
+            std::abort();
+        }
+    }
     log.head->length = log_length;
-    *log_tail = {.length = log_length, .magic = LogTail::MAGIC};
+    *log_tail = {.length = uint16_t(log_length), .magic = LogTail::MAGIC};
     manager->allocator.commit(log.head);
     if (log_length > logsize) {
         std::cerr << "log size: " << log_length << std::endl;
@@ -321,8 +393,10 @@ public:
     }
 
     void close() {
+        // the tail is not padded
         LogTail tail;
-        fetch_log_typed(&tail);
+        memcpy(&tail, cursor, sizeof(tail));
+        cursor = add_byte_offset(cursor, sizeof(tail));
         if (tail.magic != LogTail::MAGIC) {
             fprintf(stderr, "Error: log tail magic number mismatch\n");
             std::abort();
@@ -331,7 +405,8 @@ public:
             fprintf(stderr, "Error: log length mismatch\n");
             std::abort();
         }
-        uint64_t validation_latency = profile::get_us_abs() - log->start_us;
+        uint64_t validation_latency =
+            profile::get_us_abs() - get_log_start_us(log);
         profile::record_validation_latency(validation_latency);
         reclaim_log(log);
     }
@@ -0,0 +1,117 @@
+#pragma once
+
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+#include "compiler.hpp"
+#include "spin_lock.hpp"
+#include "utils.hpp"
+
+namespace scee {
+
+/*
+    Allocator of log buffers (log.hpp), in three tiers:
+    - per-thread magazines of MAGAZINE_SIZE buffers: an application thread
+      allocates from its magazine, a validator frees into a magazine of the
+      node of the buffer, no lock;
+    - per-NUMA-node depots, that magazines are refilled from and flushed to,
+      one lock per MAGAZINE_SIZE buffers;
+    - a global pool, with the buffers the depots have no room for, and the
+      arenas new buffers are carved from.
+
+    Arenas are mmap'ed per node, with transparent hugepages and a preferred
+    policy for the node, and the buffers of an arena are handed out to the
+    threads of its node. Caching is bounded: beyond GLOBAL_BUFFERS cached
+    buffers, the memory of a freed buffer is returned to the kernel
+    (MADV_DONTNEED), the buffer is kept for reuse.
+*/
+
+constexpr size_t MAX_NUMA_NODES = 8;
+
+struct LogBufferRef {
+    void *buffer;
+    uint32_t node;
+};
+
+class LogBufferPool {
+public:
+    static constexpr size_t MAGAZINE_SIZE = 8;
+    static constexpr size_t DEPOT_BUFFERS = 4 * MAGAZINE_SIZE;
+    static constexpr size_t GLOBAL_BUFFERS = 8 * MAGAZINE_SIZE;
+    static constexpr size_t ARENA_SIZE = size_t(64) << 20;
+
+    struct Magazine {
+        size_t size = 0;
+        LogBufferRef refs[MAGAZINE_SIZE];
+    };
+
+    LogBufferPool();
+
+    // fills the empty `magazine` and takes a buffer from it
+    LogBufferRef refill(Magazine &magazine);
+    // empties the full `magazine` of buffers of `node`
+    void flush(Magazine &magazine, uint32_t node);
+
+    // buffers handed out to application threads, and not freed yet
+    void count_live(int64_t n) {
+        live_buffers.fetch_add(n, std::memory_order_relaxed);
+    }
+
+private:
+    struct alignas(CACHELINE_SIZE) Depot {
+        SpinLock spin_lock;
+        size_t size = 0;
+        void *buffers[DEPOT_BUFFERS];
+    };
+
+    struct Arena {
+        std::byte *cursor = nullptr;
+        std::byte *end = nullptr;
+    };
+
+    Depot depots[MAX_NUMA_NODES];
+
+    // global pool
+    SpinLock spin_lock;
+    std::vector<LogBufferRef> cached;
+    std::vector<LogBufferRef> trimmed;  // without memory
+    Arena arenas[MAX_NUMA_NODES];
+    std::atomic<size_t> mapped_bytes = 0;
+    size_t carved_buffers = 0;
+    std::atomic<int64_t> live_buffers = 0;
+
+    LogBufferRef carve(uint32_t node);
+};
+
+// of the calling thread, returned to the pool when it exits
+struct LogBufferCache {
+    LogBufferPool::Magazine allocated;
+    LogBufferPool::Magazine freed[MAX_NUMA_NODES];
+
+    ~LogBufferCache();
+};
+
+extern LogBufferPool log_buffer_pool;
+extern thread_local LogBufferCache log_buffer_cache;
+
+inline LogBufferRef allocate_log_buffer_ref() {
+    LogBufferPool::Magazine &magazine = log_buffer_cache.allocated;
+    log_buffer_pool.count_live(1);
+    if (likely(magazine.size > 0)) {
+        return magazine.refs[--magazine.size];
+    }
+    return log_buffer_pool.refill(magazine);
+}
+
+inline void free_log_buffer_ref(LogBufferRef ref) {
+    log_buffer_pool.count_live(-1);
+    LogBufferPool::Magazine &magazine = log_buffer_cache.freed[ref.node];
+    if (unlikely(magazine.size == LogBufferPool::MAGAZINE_SIZE)) {
+        log_buffer_pool.flush(magazine, ref.node);
+    }
+    magazine.refs[magazine.size++] = ref;
+}
+
+}  // namespace scee
@@ -1,11 +1,13 @@
 #pragma once
 
+#include <atomic>
 #include <cstddef>
 #include <cstdint>
 #include <cstdlib>
 
 #include "compiler.hpp"
 #include "memtypes.hpp"
+#include "slab.hpp"
 #include "utils.hpp"
 
 namespace scee {
@@ -41,26 +43,23 @@ struct obj_header {
 
 // size is the actual size of the object, memory manager will add obj_prefix
 inline void *alloc_immutable(size_t size) {
-    void *ptr = malloc(size + sizeof(checksum_t) + 4);
+    void *ptr = slab_allocate(size + sizeof(checksum_t) + 4);
     return ptr;
 }
 // ptr correspond to the start of the object
 inline void free_immutable(void *ptr) {
     // fprintf(stderr, "real free: %p\n", ptr);
-    free(ptr);
+    slab_free(ptr);
 }
 
 // size is the actual size allocated, usually a small memory piece
+// (ptr_t has a size class of its own, see slab.hpp)
 inline void *alloc_mutable(size_t size) {
-    // OPTIONAL: optimize this for fixed size allocation (like ptr_t)
     // IMPORTANT: when using concurrently, ensure ptr_t assignment is atomic
-    return malloc(size);
+    return slab_allocate(size);
 }
 // ptr correspond to the start of the whole memory piece
-inline void free_mutable(void *ptr) {
-    // OPTIONAL: optimize this for fixed size allocation (like ptr_t)
-    free(ptr);
-}
+inline void free_mutable(void *ptr) { slab_free(ptr); }
 
 template <typename T>
 inline size_t get_size(const T *obj) {
@@ -74,6 +73,8 @@ inline size_t get_size(const T *obj) {
 constexpr size_t BULK_BUFFER_SIZE = 65536;
 extern thread_local void *bulk_buffer;
 extern thread_local size_t bulk_cursor;
+// allocated bulk buffers, in bytes; they are not freed as a whole
+extern std::atomic<uint64_t> bulk_buffer_bytes;
 inline void reset_bulk_buffer() {
     bulk_buffer = nullptr;
     bulk_cursor = BULK_BUFFER_SIZE;
@@ -1,6 +1,11 @@
 #pragma once
 
 #include <cstdint>
+#include <functional>
+#include <string>
+#include <vector>
+
+struct hdr_histogram;
 
 namespace profile {
 uint64_t thread_us();
@@ -10,5 +15,29 @@ void stop();
 void record_validation_latency(uint64_t latency_us);
 void record_validation_cpu_time(uint64_t cpu_time_cycles,
                                 uint64_t validation_count);
+// logs reclaimed without validation (sampling, validation core limit)
+void record_validation_skipped(uint64_t count);
+// committed logs, their size in log buffers, and the size they would have
+// taken with 24-byte heads and cache-line aligned logs (before log packing)
+void record_log_bytes(uint64_t logs, uint64_t bytes, uint64_t uncompacted);
 void print_stats();
+// with PROFILE_HDR_LOG=1, write the encoded histogram next to the CDF file,
+// <name>.hlog, so that runs can be merged (scripts/ingest/hdr.py)
+void write_hdr_log(hdr_histogram* histogram, const std::string& cdf_filename,
+                   double value_scale = 1);
+
+// with PROFILE_TELEMETRY=<socket path> (1: /tmp/orthrus-telemetry-<pid>.sock),
+// a JSON snapshot of the validation counters, the latency percentiles of the
+// last interval and the gauges is sent to every client of the Unix socket
+// each PROFILE_TELEMETRY_INTERVAL_MS (1000), see scripts/orthrus-top.py
+int add_gauge(const std::string& name, std::function<uint64_t()> read);
+void remove_gauge(int id);
+// the gauges whose name starts with `prefix`, in registration order, to be
+// read repeatedly without the lock of the gauges (their owners must outlive
+// the copies)
+struct GaugeHandle {
+    std::string name;
+    std::function<uint64_t()> read;
+};
+std::vector<GaugeHandle> find_gauges(const std::string& prefix);
 }  // namespace profile
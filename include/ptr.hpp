@@ -47,6 +47,9 @@ private:
  * initialized with given value
  * 5. ptr->destroy(): destroys and reclaims this ptr_t instance ONLY.
  * 6. ptr->create_fixed(const T &): creates a fixed pointer with given value.
+ * 7. ptr->store_slice(offset, const void *, n): like store(), with a copy of
+ * the current version of which `n` bytes at `offset` are replaced, and a
+ * checksum updated incrementally, for large objects
  *
  * The load of any mutable object, like ptr_t, cannot be protected by SCEE logs.
  * There are two ways to corrupt future reads:
@@ -82,6 +85,18 @@ public:
         return addr;
     }
 
+    FORCE_INLINE const T *store_slice(size_t offset, const void *val,
+                                      size_t n) {
+        static_assert(!std::is_base_of_v<obj_header, T>);
+        const T *old = (const T *)load_ptr(this);
+        size_t size = get_size(old);
+        T *addr = (T *)alloc_obj(size);
+        store_obj_slice(addr, old, offset, val, n);
+        store_ptr(this, addr);
+        destroy_obj(const_cast<T *>(old));
+        return addr;
+    }
+
     FORCE_INLINE void reref(const T *ptr) { store_ptr(this, ptr); }
 
     FORCE_INLINE static ptr_t<T> *create() {
@@ -1,29 +1,132 @@
 #pragma once
 
+#include <atomic>
 #include <boost/lockfree/spsc_queue.hpp>
 #include <cstddef>
+#include <cstdint>
+#include <deque>
 
 #include "compiler.hpp"
+#include "spin_lock.hpp"
 
 namespace scee {
 
-constexpr size_t LOG_QUEUE_CAPACITY = 2048;
+/*
+    The logs of an application thread, popped by the validators
+    (validator_pool.hpp). The queue holds SCEE_LOG_QUEUE_CAPACITY logs
+    (default 2048), and SCEE_LOG_QUEUE_OVERFLOW selects what log_enqueue()
+    does when it is full:
 
-using LogQueue =
-    boost::lockfree::spsc_queue<void *,
-                                boost::lockfree::capacity<LOG_QUEUE_CAPACITY>>;
+    - "spin" (default): waits until a validator pops a log, the application
+      thread stalls as long as its validation lags;
+    - "block": waits at most SCEE_LOG_QUEUE_WAIT_US (default 100), then
+      sheds the log;
+    - "spill": appends the log to a secondary ring of the queue, which grows
+      as needed. Logs go there until it is drained, after the queue, so
+      that they stay in order;
+    - "shed": reclaims the log without validation, counted per closure type
+      (gauges log_queue_overflow.shed.<type>);
+    - "help": hands the log to the validators, which take it before the
+      queues, and wakes a parked one. At most as many logs as all the
+      queues hold are handed off, beyond that the log is handled as with
+      "block".
+
+    "spin" and "spill" validate every log, "block" and "shed" bound the
+    stall of the application thread, "help" takes validators from the other
+    queues. Full queues, the time spent waiting and the logs spilled, shed
+    and handed off are counted (gauges log_queue_overflow.*).
+*/
+
+constexpr size_t LOG_QUEUE_CAPACITY = 2048;  // default
+
+// HELP falls back to BLOCK when the validators are behind, see above
+enum class LogQueueOverflow { SPIN, BLOCK, SPILL, SHED, HELP };
+
+struct LogQueueConfig {
+    size_t capacity = LOG_QUEUE_CAPACITY;
+    LogQueueOverflow overflow = LogQueueOverflow::SPIN;
+    uint64_t wait_us = 100;  // of "block"
+};
+
+// read from the environment once
+const LogQueueConfig &get_log_queue_config();
+
+class LogQueue {
+public:
+    LogQueue() : ring(get_log_queue_config().capacity) {}
+
+    // application thread, false if the ring is full or logs were spilled
+    bool push(void *log) {
+        return likely(spilled.load(std::memory_order_relaxed) == 0) &&
+               ring.push(log);
+    }
+
+    // application thread, after the ring, see "spill" above
+    void spill(void *log) {
+        spill_lock.Lock();
+        spill_ring.push_back(log);
+        spilled.store(spill_ring.size(), std::memory_order_release);
+        spill_lock.Unlock();
+    }
+
+    // validator, the oldest logs first
+    size_t pop(void **logs, size_t n) {
+        size_t count = ring.pop(logs, n);
+        if (unlikely(count < n && spilled.load(std::memory_order_acquire))) {
+            spill_lock.Lock();
+            for (; count < n && !spill_ring.empty(); count++) {
+                logs[count] = spill_ring.front();
+                spill_ring.pop_front();
+            }
+            spilled.store(spill_ring.size(), std::memory_order_release);
+            spill_lock.Unlock();
+        }
+        return count;
+    }
+
+    bool empty() {
+        return ring.empty() && spilled.load(std::memory_order_acquire) == 0;
+    }
+
+    size_t size() {
+        return ring.read_available() +
+               spilled.load(std::memory_order_relaxed);
+    }
+
+    size_t spilled_size() const {
+        return spilled.load(std::memory_order_relaxed);
+    }
+
+private:
+    boost::lockfree::spsc_queue<void *> ring;
+    SpinLock spill_lock;
+    std::deque<void *> spill_ring;  // protected by spill_lock
+    std::atomic<size_t> spilled = 0;
+};
 
 extern thread_local LogQueue log_queue;
 
+// validator_pool.hpp
+extern std::atomic<int> parked_validators;
+void wake_validator();
+
+// the queue of the thread is full, applies the overflow policy
+void log_queue_overflow(void *log);
+
 inline void log_enqueue(void *log) {
-    while (!log_queue.push(log)) {
-        cpu_relax();
+    if (unlikely(!log_queue.push(log))) {
+        log_queue_overflow(log);
+    }
+    // pairs with the parking validator: it either sees this log, or is seen
+    std::atomic_thread_fence(std::memory_order_seq_cst);
+    if (unlikely(parked_validators.load(std::memory_order_relaxed) > 0)) {
+        wake_validator();
     }
 }
 
 inline void *log_dequeue(LogQueue *q) {
     void *log;
-    if (!q->pop(log)) {
+    if (q->pop(&log, 1) == 0) {
         return nullptr;
     }
     return log;
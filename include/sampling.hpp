@@ -0,0 +1,180 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <functional>
+#include <string>
+#include <vector>
+
+namespace scee {
+
+// sampling methods of sampling.config,
+// "<method> <percentage> [max validation cores]"
+constexpr int SAMPLING_RANDOM = 1;  // "random": each log independently
+constexpr int SAMPLING_WINDOW = 2;  // "window": see WindowSampler
+
+constexpr uint32_t SAMPLING_FULL_RATE = 10000;  // rates are in basis points
+
+struct SamplingConfig {
+    int method = SAMPLING_RANDOM;
+    uint32_t rate = SAMPLING_FULL_RATE;
+    // validator threads validating at the same time, 0: no limit; the logs
+    // of the others are reclaimed without validation
+    uint32_t max_cores = 0;
+
+    constexpr uint64_t pack() const {
+        return uint64_t(method & 0xff) | uint64_t(rate & 0xffff) << 8 |
+               uint64_t(max_cores) << 32;
+    }
+    static constexpr SamplingConfig unpack(uint64_t word) {
+        return {int(word & 0xff), uint32_t(word >> 8 & 0xffff),
+                uint32_t(word >> 32)};
+    }
+};
+
+// Read by every validation and changed at runtime (control.cpp), packed in
+// one word so that a validator always sees a consistent configuration.
+extern std::atomic<uint64_t> sampling_config;
+
+inline SamplingConfig get_sampling_config() {
+    return SamplingConfig::unpack(
+        sampling_config.load(std::memory_order_relaxed));
+}
+
+// applies `change` to the configuration and logs the result, `source` names
+// the origin of the change
+void update_sampling_config(const std::function<void(SamplingConfig &)> &change,
+                            const char *source);
+// reads "<method> <percentage> [max validation cores]", false on error
+bool load_sampling_config(const char *path, const char *source);
+// JSON object of the configuration and of the effective sampling rate
+std::string describe_sampling_config();
+
+int sampling_method_of(const std::string &name);  // 0 if unknown
+const char *sampling_method_name(int method);
+
+/*
+    Window sampling: of every WINDOW_SIZE logs, validate `rate` basis points
+    of them, spread over the closure types round-robin, i.e. the budget is
+    water-filled over the types. A rare closure type is then validated as
+    often as it runs while frequent ones are sampled, which detects more
+    errors per validation than random sampling (`round_robin` in
+    scripts/detection-rate.py models this policy).
+
+    Decisions are online, so the level of a window (at most `level`
+    validations per type, `extra` types get one more) is water-filled over
+    the type counts of the previous window. A type not seen before is under
+    the level, and once the rest of the window fits in the budget left,
+    every log is validated. One sampler per validator thread.
+*/
+class WindowSampler {
+public:
+    static constexpr size_t WINDOW_SIZE = 1000;
+
+    bool sample(const void *type, int rate);
+
+private:
+    struct Slot {
+        const void *type = nullptr;
+        uint32_t seen = 0;       // logs in the current window
+        uint32_t validated = 0;  // validated logs in the current window
+    };
+
+    std::vector<Slot> slots = std::vector<Slot>(64);
+    std::vector<uint32_t> counts;  // scratch of next_window()
+    size_t n_types = 0;
+    size_t seen = 0, validated = 0;
+    uint32_t level = UINT32_MAX;
+    size_t extra = 0;
+
+    Slot &find(const void *type);
+    void grow();
+    void next_window(size_t budget);
+};
+
+inline WindowSampler::Slot &WindowSampler::find(const void *type) {
+    const size_t mask = slots.size() - 1;
+    size_t i = (reinterpret_cast<uintptr_t>(type) * 0x9E3779B97F4A7C15ull) >>
+               32 & mask;
+    while (slots[i].type != type) {
+        if (slots[i].type == nullptr) {
+            if (2 * (n_types + 1) > slots.size()) {
+                grow();
+                return find(type);
+            }
+            slots[i].type = type;
+            n_types++;
+            break;
+        }
+        i = (i + 1) & mask;
+    }
+    return slots[i];
+}
+
+inline void WindowSampler::grow() {
+    std::vector<Slot> old(slots.size() * 2);
+    old.swap(slots);
+    n_types = 0;
+    for (const Slot &slot : old) {
+        if (slot.type != nullptr) {
+            Slot &moved = find(slot.type);
+            moved.seen = slot.seen;
+            moved.validated = slot.validated;
+        }
+    }
+}
+
+inline void WindowSampler::next_window(size_t budget) {
+    counts.clear();
+    for (Slot &slot : slots) {
+        if (slot.seen > 0) counts.push_back(slot.seen);
+        slot.seen = slot.validated = 0;
+    }
+    seen = validated = 0;
+    // largest level L with sum(min(count, L)) <= budget
+    std::sort(counts.begin(), counts.end());
+    level = UINT32_MAX;
+    extra = 0;
+    size_t left = budget;
+    for (size_t i = 0; i < counts.size(); i++) {
+        const size_t n_above = counts.size() - i;
+        if (counts[i] * n_above > left) {
+            level = left / n_above;
+            extra = left % n_above;
+            break;
+        }
+        left -= counts[i];
+    }
+}
+
+inline bool WindowSampler::sample(const void *type, int rate) {
+    const size_t budget =
+        (WINDOW_SIZE * rate + SAMPLING_FULL_RATE - 1) / SAMPLING_FULL_RATE;
+    Slot &slot = find(type);
+    slot.seen++;
+    seen++;
+    bool take = false;
+    if (validated < budget) {
+        if (slot.validated < level) {
+            take = true;
+        } else if (slot.validated == level && extra > 0) {
+            extra--;
+            take = true;
+        } else {
+            // the remaining logs of the window, this one included, fit
+            take = WINDOW_SIZE - seen < budget - validated;
+        }
+    }
+    if (take) {
+        slot.validated++;
+        validated++;
+    }
+    if (seen == WINDOW_SIZE) {
+        next_window(budget);
+    }
+    return take;
+}
+
+}  // namespace scee
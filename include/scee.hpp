@@ -13,6 +13,8 @@ namespace scee {
 
 struct Validable {
     virtual void validate(LogReader *) const = 0;
+    // a chunk of a closure, see run_chunked()
+    virtual bool is_chunk() const { return false; }
 };
 
 template <typename Ret, typename... Args>
@@ -97,10 +99,44 @@ Ret run2_profile(uint64_t &cycles, Ret (*app_fn)(Args...),
     }
 }
 
-void validate_one(LogHead *log);
+template <typename... Args>
+struct ChunkClosure : public Closure<void, size_t, Args...> {
+    using Closure<void, size_t, Args...>::Closure;
 
-extern size_t max_validation_core;
-#define limvc(n) scee::max_validation_core = n;
+    bool is_chunk() const override { return true; }
+};
+
+/*
+    A closure over a large input, run as `n` chunks: fn(i, args...) for i in
+    [0, n), each logged as a closure of its own. The chunks must not read
+    what the other chunks of the closure write, so that their logs are
+    validated in any order, in parallel by the idle validators (see
+    validator_pool.hpp). The closure is correct once all of its chunks are; a
+    chunk that fails aborts as any closure does. A closure of one chunk is
+    logged as any closure, in the queue of the thread.
+*/
+template <typename... Args>
+void run_chunked(size_t n, void (*app_fn)(size_t, Args...),
+                 void (*val_fn)(size_t, Args...), Args... args) {
+    if (n == 1) {
+        run2(app_fn, val_fn, size_t(0), Args(args)...);
+        return;
+    }
+    for (size_t i = 0; i < n; i++) {
+        new_log();
+        const auto *func = append_log_typed(
+            ChunkClosure<Args...>(val_fn, size_t(i), Args(args)...));
+        func->run_with_fn(app_fn);
+        commit_log();
+    }
+}
+
+// returns false if the log is reclaimed without validation
+bool validate_one(LogHead *log);
+
+// at most n validator threads validate at the same time (sampling.hpp)
+void set_max_validation_core(size_t n);
+#define limvc(n) scee::set_max_validation_core(n);
 
 }  // namespace scee
 
@@ -108,6 +144,12 @@ extern size_t max_validation_core;
 
 #ifdef DISABLE_SCEE
 #define __scee_run(fn, args...) (raw::fn(args))
+#define __scee_run_chunked(n, fn, args...)                         \
+    do {                                                           \
+        for (size_t __i = 0; __i < (n); __i++) raw::fn(__i, args); \
+    } while (0)
 #else
 #define __scee_run(fn, args...) (scee::run2(app::fn, validator::fn, args))
+#define __scee_run_chunked(n, fn, args...) \
+    (scee::run_chunked(n, app::fn, validator::fn, args))
 #endif
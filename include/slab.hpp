@@ -0,0 +1,169 @@
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <cstdlib>
+
+#include "compiler.hpp"
+#include "spin_lock.hpp"
+#include "utils.hpp"
+
+namespace scee {
+
+/*
+    Size-class allocator of the versioned objects and pointers (memmgr.hpp),
+    instead of malloc. Objects of up to MAX_SIZE bytes are carved from
+    SLAB_SIZE slabs of one size class, with a class of 8 bytes for ptr_t;
+    larger objects are left to malloc.
+
+    Every thread caches free objects of each class in a list, threaded
+    through the objects. Deferred frees (FreeLog) are collected by another
+    thread than the one that allocated them, a validator mostly: they go to
+    the cache of the freeing thread, and beyond its limit are moved, a batch
+    at a time, to the central list of the class, which threads refill their
+    cache from. A thread carves objects from a slab of its own once the
+    central list is empty too, so threads do not share slabs until objects
+    are freed.
+
+    Slabs are carved from one reserved region (REGION_SIZE, mapped on first
+    use), so that the class of an object is found from its address, and
+    pointers out of it are malloc'ed ones. Memory of freed objects is kept
+    for reuse, not returned to the kernel.
+*/
+class SlabAllocator {
+public:
+    static constexpr size_t SLAB_SHIFT = 16;
+    static constexpr size_t SLAB_SIZE = size_t(1) << SLAB_SHIFT;
+    static constexpr size_t REGION_SIZE = size_t(64) << 30;
+    static constexpr size_t MAX_SIZE = 1024;
+    static constexpr size_t N_CLASSES = 21;
+    static constexpr size_t CLASS_SIZES[N_CLASSES] = {
+        8,  // ptr_t
+        16,  32,  48,  64,  80,  96,  112, 128, 160, 192, 224,
+        256, 320, 384, 448, 512, 640, 768, 896, 1024,
+    };
+
+    // objects moved between a thread cache and the central list at once
+    static constexpr uint32_t batch_size(size_t cls) {
+        return std::clamp<size_t>(8192 / CLASS_SIZES[cls], 8, 128);
+    }
+
+    // the smallest class of at least `size` bytes, size <= MAX_SIZE
+    static size_t size_class(size_t size) {
+        return CLASS_OF[(size + 7) / 8];
+    }
+
+    // the class of an object of the region, false if it is malloc'ed
+    bool find_class(const void *ptr, size_t &cls) const {
+        const uintptr_t offset = reinterpret_cast<uintptr_t>(ptr) -
+                                 region.load(std::memory_order_relaxed);
+        if (offset >= REGION_SIZE) return false;
+        cls = slab_classes[offset >> SLAB_SHIFT];
+        return true;
+    }
+
+    void *allocate_slow(size_t cls);
+    void free_slow(void *ptr, size_t cls);
+    // usable bytes of an object, of the region or malloc'ed
+    size_t usable_size(const void *ptr) const;
+
+    // returns the objects cached by the calling thread, when it exits
+    void flush_cache();
+
+    // bytes of the slabs carved, for the memory profile
+    size_t carved_bytes() const {
+        return carved_slabs.load(std::memory_order_relaxed) * SLAB_SIZE;
+    }
+
+private:
+    static constexpr auto CLASS_OF = [] {
+        std::array<uint8_t, MAX_SIZE / 8 + 1> class_of{};
+        for (size_t i = 0, cls = 0; i < class_of.size(); i++) {
+            while (CLASS_SIZES[cls] < i * 8) cls++;
+            class_of[i] = cls;
+        }
+        return class_of;
+    }();
+
+    struct alignas(CACHELINE_SIZE) Central {
+        SpinLock spin_lock;
+        void *head = nullptr;
+        size_t size = 0;
+        // the rest of a slab of an exited thread, carved before new slabs
+        std::byte *spare_cursor = nullptr;
+        std::byte *spare_end = nullptr;
+    };
+
+    Central centrals[N_CLASSES];
+
+    // the start of the region, reserved by the first slab carved; before,
+    // no user address is at an offset below REGION_SIZE
+    static constexpr uintptr_t NO_REGION = -REGION_SIZE;
+    SpinLock region_lock;
+    std::atomic<uintptr_t> region = NO_REGION;
+    bool region_failed = false;
+    std::atomic<size_t> carved_slabs = 0;
+    uint8_t slab_classes[REGION_SIZE >> SLAB_SHIFT] = {};
+
+    // the memory of a new slab of `cls`, nullptr if the region is full
+    std::byte *carve(size_t cls);
+    void push_central(size_t cls, void *head, void *tail, uint32_t n);
+};
+
+/*
+    Of the calling thread, trivially destructible so that objects can still
+    be freed while it exits: flush_cache() returns the cached objects, then
+    sets the limits to 0, and its frees go to the central lists.
+*/
+struct SlabCache {
+    enum State : uint8_t { UNUSED, ACTIVE, EXITED };
+
+    struct List {
+        void *head = nullptr;
+        uint32_t size = 0;
+        uint32_t limit = 0;  // 0 until the first free, see free_slow()
+    };
+
+    List lists[SlabAllocator::N_CLASSES];
+    // the slab being carved for each class
+    std::byte *cursors[SlabAllocator::N_CLASSES] = {};
+    std::byte *ends[SlabAllocator::N_CLASSES] = {};
+    State state = UNUSED;
+};
+
+extern SlabAllocator slab_allocator;
+extern thread_local SlabCache slab_cache;
+
+inline void *slab_allocate(size_t size) {
+    if (unlikely(size > SlabAllocator::MAX_SIZE)) return malloc(size);
+    const size_t cls = SlabAllocator::size_class(size);
+    SlabCache::List &list = slab_cache.lists[cls];
+    if (likely(list.head != nullptr)) {
+        void *ptr = list.head;
+        list.head = *static_cast<void **>(ptr);
+        list.size--;
+        return ptr;
+    }
+    return slab_allocator.allocate_slow(cls);
+}
+
+inline void slab_free(void *ptr) {
+    size_t cls;
+    if (unlikely(!slab_allocator.find_class(ptr, cls))) {
+        free(ptr);
+        return;
+    }
+    SlabCache::List &list = slab_cache.lists[cls];
+    if (unlikely(list.size >= list.limit)) {
+        slab_allocator.free_slow(ptr, cls);
+        return;
+    }
+    *static_cast<void **>(ptr) = list.head;
+    list.head = ptr;
+    list.size++;
+}
+
+}  // namespace scee
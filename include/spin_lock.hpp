@@ -4,7 +4,7 @@
 
 class SpinLock {
 public:
-    SpinLock() : lock_(false) {}
+    constexpr SpinLock() : lock_(false) {}
     void Lock() {
         while (lock_.test_and_set(std::memory_order_acquire)) {
         }
@@ -5,6 +5,7 @@
 #include <tuple>
 #include <utility>
 
+#include "sampling.hpp"
 #include "utils.hpp"
 
 /*
@@ -69,7 +70,7 @@ inline Thread &Thread::operator=(Thread &&other) noexcept {
     return *this;
 }
 
-extern int core_id, sampling_rate, sampling_method;
+extern int core_id;
 
 template <typename F, typename... Args>
 inline Thread::Thread(F &&f, Args &&...args)
@@ -92,18 +93,9 @@ inline AppThread::AppThread(F &&f, Args &&...args) {
 template <typename F, typename... Args>
 auto main_thread(F &&f, Args &&...args) {
 #ifdef SAMPLING
-    FILE *fp = fopen("sampling.config", "r");
-    char method[10];
-    int percentage;
-    fscanf(fp, "%s %d", method, &percentage);
-    fclose(fp);
-    sampling_method = strcmp(method, "random") == 0 ? 1 : 0;
-    sampling_rate = percentage;
-    fprintf(stderr, "sampling method: %s, sampling rate: %d\n", method,
-            percentage);
-#else
-    sampling_method = 1;
-    sampling_rate = 100;
+    if (!load_sampling_config("sampling.config", "startup")) {
+        std::abort();
+    }
 #endif
     AppThread::register_queue();
     auto ret = f(std::forward<Args>(args)...);
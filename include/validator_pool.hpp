@@ -0,0 +1,116 @@
+#pragma once
+
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <deque>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include "free_log.hpp"
+#include "log.hpp"
+#include "queue.hpp"
+#include "spin_lock.hpp"
+
+namespace scee {
+
+/*
+    Validator threads shared by all application threads, instead of one
+    busy-polling validator per application thread.
+
+    Every application thread registers its log queue in a slot. A validator
+    scans the slots from where it stopped, takes the first non-empty queue no
+    other validator holds, validates at most BATCH_SIZE of its logs, and
+    moves on to the next slot, so a busy queue is spread over the idle
+    validators but cannot starve the others. The logs of one queue are still
+    validated in order, by one validator at a time, except the chunks of
+    closures run by run_chunked() (scee.hpp): the validator of the batch
+    hands them off to a queue shared by all validators, which take them
+    before scanning the slots, so that the chunks of a long closure are
+    validated in parallel. An application thread hands off its logs there
+    too when its queue is full, with the "help" overflow policy (queue.hpp).
+
+    A validator that found no work for SPIN_US parks on a futex (through
+    std::atomic::wait) until log_enqueue() wakes it. At most SCEE_VALIDATORS
+    validators are started (default: one per registered application thread,
+    as before), they are started when application threads register and park
+    when idle.
+*/
+class ValidatorPool {
+public:
+    static constexpr size_t MAX_QUEUES = 1024;
+    static constexpr size_t BATCH_SIZE = 256;
+    static constexpr size_t PREFETCH_DISTANCE = 4;  // logs ahead
+    static constexpr uint64_t SPIN_US = 50;
+
+    ValidatorPool();
+    ~ValidatorPool();
+
+    // the queue of the calling application thread, returns its slot
+    size_t register_queue(LogQueue *queue, ThreadGC *thread_gc);
+    // waits until the queue is drained
+    void unregister_queue(size_t slot);
+
+    void wake();
+
+    // `log` of the queue of `slot`, validated by the first validator free;
+    // false if as many logs as all the queues hold are handed off already
+    bool try_hand_off(size_t slot, LogHead *log);
+
+private:
+    struct alignas(CACHELINE_SIZE) Slot {
+        std::atomic<bool> busy = false;  // held by a validator
+        // logs of the queue handed off and not validated yet
+        std::atomic<size_t> pending_handoffs = 0;
+        // protected by `busy`, nullptr if free
+        LogQueue *queue = nullptr;
+        ThreadGC *thread_gc = nullptr;
+
+        bool try_lock() {
+            return !busy.load(std::memory_order_relaxed) &&
+                   !busy.exchange(true, std::memory_order_acquire);
+        }
+        void unlock() { busy.store(false, std::memory_order_release); }
+    };
+
+    Slot slots[MAX_QUEUES];
+    std::atomic<size_t> n_slots = 0;  // high-water mark of used slots
+
+    std::mutex mutex;  // registration
+    std::vector<size_t> free_slots;
+    size_t n_queues = 0;
+    size_t max_validators = 0;  // 0: one per queue
+    std::vector<std::thread> validators;
+
+    struct Handoff {
+        LogHead *log;
+        Slot *slot;
+    };
+
+    SpinLock handoff_lock;
+    std::deque<Handoff> handoffs;  // protected by handoff_lock
+    std::atomic<size_t> n_handoffs = 0;
+
+    std::atomic<uint32_t> wakeups = 0;  // futex word, see wake()
+    std::atomic<bool> stop = false;
+
+    void run(size_t id);
+    // validates a batch of some queue, scanning from `cursor`
+    bool validate_some(size_t &cursor);
+    void validate_batch(Slot &slot);
+    void hand_off(Slot &slot, LogHead *log);
+    // validates one handed off log, false if there is none
+    bool validate_handoff();
+
+    // the head and the start of the closure of a log
+    static void prefetch_log(const void *log) {
+        __builtin_prefetch(log);
+        __builtin_prefetch(static_cast<const std::byte *>(log) +
+                           CACHELINE_SIZE);
+    }
+};
+
+extern ValidatorPool validator_pool;
+
+}  // namespace scee
@@ -1,16 +1,22 @@
 #include "profile-mem.hpp"
 
+#include <fcntl.h>
 #include <unistd.h>
 
 #include <atomic>
 #include <chrono>
+#include <cerrno>
 #include <cstdint>
+#include <cstdio>
 #include <cstdlib>
 #include <cstring>
 #include <ctime>
 #include <iostream>
+#include <string>
 #include <thread>
+#include <vector>
 
+#include "profile.hpp"
 #include "utils.hpp"
 
 namespace profile::mem {
@@ -20,6 +26,14 @@ namespace profile::mem {
 #endif
 
 bool profile_mem_enabled = false;
+std::atomic<bool> profile_mem_stopped = false;
+
+// monotonic clock shared by all processes on the host, in microseconds
+static long long monotonic_us() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1000000LL + ts.tv_nsec / 1000;
+}
 
 const char* MEM_PROFILE_FILENAME = "memory_status.log";
 void init_mem(const char* filename = "memory_status.log") {
@@ -34,35 +48,121 @@ void start() {
 #endif
 }
 
-void stop() {}
+// samples after stop() belong to the teardown phase
+void stop() { profile_mem_stopped = true; }
+
+/*
+    The memory log is a sequence of binary records (native little-endian),
+    after the 8-byte magic "ORTHMEM1": a RecordHead, then `size` bytes of
+    - RECORD_MARK: the name of the mark, "start" or "stop"
+    - RECORD_COMPONENTS: the names of the components of the next samples,
+      each terminated by '\0'
+    - RECORD_SAMPLE: the RSS, then each component, uint64_t in bytes
+    Components are the profile gauges named "mem.*", registered by the
+    runtime (e.g. the log buffers), so that the memory overhead of Orthrus
+    can be attributed. See scripts/ingest/memory.py.
+*/
+constexpr char MEM_LOG_MAGIC[8] = {'O', 'R', 'T', 'H', 'M', 'E', 'M', '1'};
+
+enum RecordType : uint32_t {
+    RECORD_MARK = 1,
+    RECORD_COMPONENTS = 2,
+    RECORD_SAMPLE = 3,
+};
+
+struct RecordHead {
+    uint32_t type;
+    uint32_t size;
+    int64_t time_us;  // monotonic_us()
+};
 
 struct MemoryProfile {
     bool is_running = false;
     std::thread t_monitor;
 
+    FILE* fout = nullptr;
+    int statm_fd = -1;
+    uint64_t page_size = 4096;
+    std::vector<profile::GaugeHandle> gauges;  // the components
+    std::vector<uint64_t> sample;             // RSS, then the components
+
+    void write_record(RecordType type, const void* data, size_t size,
+                      long long time_us) {
+        const RecordHead head = {type, uint32_t(size), time_us};
+        fwrite(&head, sizeof(head), 1, fout);
+        fwrite(data, 1, size, fout);
+    }
+
+    void mark(const char* name) {
+        write_record(RECORD_MARK, name, strlen(name), monotonic_us());
+    }
+
+    // resident pages, the second field of /proc/self/statm, without
+    // reopening it or allocating
+    uint64_t rss_bytes() {
+        char buf[128];
+        ssize_t n = pread(statm_fd, buf, sizeof(buf) - 1, 0);
+        if (n <= 0) return 0;
+        buf[n] = '\0';
+        const char* p = strchr(buf, ' ');
+        return p ? strtoull(p + 1, nullptr, 10) * page_size : 0;
+    }
+
+    // the gauges are registered by the runtime before main(), resolved once
+    // so that sampling neither allocates nor takes the lock of the gauges
+    void find_components() {
+        gauges = profile::find_gauges("mem.");
+        std::string names;
+        for (const profile::GaugeHandle& gauge : gauges) {
+            names.append(gauge.name).push_back('\0');
+        }
+        write_record(RECORD_COMPONENTS, names.data(), names.size(),
+                     monotonic_us());
+        sample.resize(1 + gauges.size());
+    }
+
+    void take_sample() {
+        const long long now = monotonic_us();
+        sample[0] = rss_bytes();
+        for (size_t i = 0; i < gauges.size(); i++) {
+            sample[1 + i] = gauges[i].read();
+        }
+        write_record(RECORD_SAMPLE, sample.data(),
+                     sample.size() * sizeof(uint64_t), now);
+    }
+
     void run() {
         while (is_running && !profile_mem_enabled) {
             my_usleep(500);
         }
         if (!is_running) return;
 
-        FILE* fout = fopen(MEM_PROFILE_FILENAME, "w");
+        fout = fopen(MEM_PROFILE_FILENAME, "wb");
+        statm_fd = open("/proc/self/statm", O_RDONLY | O_CLOEXEC);
+        if (fout == nullptr || statm_fd < 0) {
+            fprintf(stderr, "MemoryProfile: failed to open %s: %s\n",
+                    fout == nullptr ? MEM_PROFILE_FILENAME : "/proc/self/statm",
+                    strerror(errno));
+            if (fout != nullptr) fclose(fout);
+            return;
+        }
+        setvbuf(fout, nullptr, _IOFBF, 1 << 20);
+        page_size = sysconf(_SC_PAGESIZE);
         fprintf(stderr, "MemoryProfile Starts\n");
 
+        fwrite(MEM_LOG_MAGIC, sizeof(MEM_LOG_MAGIC), 1, fout);
+        find_components();
+        mark("start");
+        bool stopped = false;
         while (is_running) {
-            FILE* f = fopen("/proc/self/status", "r");
-            if (!f) {
-                fprintf(stderr, "fopen failed\n");
-            }
-            char line[255];
-            while (f && fgets(line, sizeof(line), f)) {
-                if (!strncmp(line, "VmRSS", 5)) {
-                    fprintf(fout, "%s", line);
-                }
+            if (!stopped && profile_mem_stopped) {
+                mark("stop");
+                stopped = true;
             }
-            fclose(f);
+            take_sample();
             my_usleep(1000);
         }
+        close(statm_fd);
         fflush(fout);
         fclose(fout);
     }
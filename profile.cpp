@@ -1,16 +1,28 @@
 #include "profile.hpp"
 
+#include <fcntl.h>
 #include <hdr/hdr_histogram.h>
+#include <hdr/hdr_histogram_log.h>
+#include <hdr/hdr_interval_recorder.h>
+#include <poll.h>
+#include <sys/socket.h>
+#include <sys/un.h>
 #include <unistd.h>
 
+#include <algorithm>
 #include <atomic>
+#include <cerrno>
 #include <chrono>
+#include <cinttypes>
 #include <cstdint>
 #include <cstdlib>
 #include <cstring>
 #include <ctime>
 #include <iostream>
+#include <mutex>
+#include <string>
 #include <thread>
+#include <vector>
 
 #include "utils.hpp"
 
@@ -25,14 +37,24 @@ bool profile_enabled = false;
 hdr_histogram* validation_latency_histogram;
 std::atomic<uint64_t> validation_cpu_time_cycles = 0;
 std::atomic<uint64_t> validation_count = 0;
+std::atomic<uint64_t> validation_skipped = 0;
+std::atomic<uint64_t> log_count = 0, log_bytes = 0, log_uncompacted_bytes = 0;
+
+// latencies of the current telemetry interval
+std::atomic<bool> telemetry_enabled = false;
+hdr_interval_recorder telemetry_latency;
 
 const char* g_cdf_filename = "validation-latency-scee.cdf";
+hdr_timespec g_start_timestamp;
+bool g_started = false;
 
 void start(const char* cdf_filename) {
     fprintf(stderr, "Profile.cpp: ENABLE_PROFILE: %d\n", ENABLE_PROFILE);
 #if (ENABLE_PROFILE)
     profile_enabled = true;
     g_cdf_filename = cdf_filename;
+    hdr_getnow(&g_start_timestamp);
+    g_started = true;
 #endif
 }
 
@@ -77,16 +99,214 @@ long long get_us_abs() {
 }
 
 void record_validation_latency(uint64_t latency_us) {
-    if (!profile_enabled) return;
-    hdr_record_value_atomic(validation_latency_histogram, latency_us);
+    if (profile_enabled) {
+        hdr_record_value_atomic(validation_latency_histogram, latency_us);
+    }
+    if (telemetry_enabled.load(std::memory_order_relaxed)) {
+        hdr_interval_recorder_record_value_atomic(&telemetry_latency,
+                                                  latency_us);
+    }
 }
 
 void record_validation_cpu_time(uint64_t cpu_time_cycles, uint64_t count) {
-    if (!profile_enabled) return;
+    if (!profile_enabled && !telemetry_enabled.load(std::memory_order_relaxed))
+        return;
     validation_cpu_time_cycles += cpu_time_cycles;
     validation_count += count;
 }
 
+void record_validation_skipped(uint64_t count) {
+    if (!profile_enabled && !telemetry_enabled.load(std::memory_order_relaxed))
+        return;
+    validation_skipped += count;
+}
+
+void record_log_bytes(uint64_t logs, uint64_t bytes, uint64_t uncompacted) {
+    if (!profile_enabled && !telemetry_enabled.load(std::memory_order_relaxed))
+        return;
+    log_count += logs;
+    log_bytes += bytes;
+    log_uncompacted_bytes += uncompacted;
+}
+
+struct Gauge {
+    int id;
+    std::string name;
+    std::function<uint64_t()> read;
+};
+
+std::mutex gauges_mutex;
+std::vector<Gauge> gauges;
+int next_gauge_id = 0;
+
+int add_gauge(const std::string& name, std::function<uint64_t()> read) {
+    std::lock_guard<std::mutex> guard(gauges_mutex);
+    gauges.push_back({next_gauge_id, name, std::move(read)});
+    return next_gauge_id++;
+}
+
+void remove_gauge(int id) {
+    std::lock_guard<std::mutex> guard(gauges_mutex);
+    std::erase_if(gauges, [id](const Gauge& g) { return g.id == id; });
+}
+
+std::vector<GaugeHandle> find_gauges(const std::string& prefix) {
+    std::lock_guard<std::mutex> guard(gauges_mutex);
+    std::vector<GaugeHandle> found;
+    for (const Gauge& gauge : gauges) {
+        if (gauge.name.compare(0, prefix.size(), prefix) == 0) {
+            found.push_back({gauge.name, gauge.read});
+        }
+    }
+    return found;
+}
+
+// Sends a snapshot (one JSON line) to every client of the socket each
+// interval. Clients connect at any time, a client that does not keep up is
+// dropped.
+class Telemetry {
+public:
+    Telemetry() {
+        const char* env = getenv("PROFILE_TELEMETRY");
+        if (env == nullptr || env[0] == '\0' || strcmp(env, "0") == 0) return;
+        if (strcmp(env, "1") == 0) {
+            path = "/tmp/orthrus-telemetry-" + std::to_string(getpid()) +
+                   ".sock";
+        } else {
+            path = env;
+        }
+        const char* interval = getenv("PROFILE_TELEMETRY_INTERVAL_MS");
+        interval_ms = interval ? std::max(atol(interval), 10L) : 1000;
+        if (hdr_interval_recorder_init_all(&telemetry_latency, 1, 10'000'000,
+                                           3) != 0) {
+            std::cerr << "Error: failed to initialize telemetry histogram"
+                      << std::endl;
+            return;
+        }
+        if (!listen_socket() || pipe2(wakeup, O_CLOEXEC) != 0) return;
+        telemetry_enabled = true;
+        thread = std::thread(&Telemetry::run, this);
+        fprintf(stderr, "Telemetry: %s, every %ld ms\n", path.c_str(),
+                interval_ms);
+    }
+
+    ~Telemetry() {
+        if (!thread.joinable()) return;
+        // the recorder is kept, threads may still record until exit
+        telemetry_enabled = false;
+        write(wakeup[1], "", 1);
+        thread.join();
+        for (int fd : clients) close(fd);
+        close(listen_fd);
+        close(wakeup[0]);
+        close(wakeup[1]);
+        unlink(path.c_str());
+    }
+
+private:
+    std::string path;
+    long interval_ms = 1000;
+    int listen_fd = -1;
+    int wakeup[2] = {-1, -1};
+    std::vector<int> clients;
+    std::thread thread;
+
+    bool listen_socket() {
+        sockaddr_un addr{};
+        addr.sun_family = AF_UNIX;
+        if (path.size() >= sizeof(addr.sun_path)) {
+            std::cerr << "Error: telemetry socket path too long: " << path
+                      << std::endl;
+            return false;
+        }
+        strcpy(addr.sun_path, path.c_str());
+        unlink(path.c_str());
+        listen_fd = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+        if (listen_fd < 0 ||
+            bind(listen_fd, (sockaddr*)&addr, sizeof(addr)) != 0 ||
+            listen(listen_fd, 8) != 0) {
+            std::cerr << "Error: telemetry socket " << path << ": "
+                      << strerror(errno) << std::endl;
+            if (listen_fd >= 0) close(listen_fd);
+            listen_fd = -1;
+            return false;
+        }
+        return true;
+    }
+
+    std::string snapshot(long long interval_us) {
+        hdr_histogram* h = hdr_interval_recorder_sample(&telemetry_latency);
+        char buf[768];
+        int n = snprintf(
+            buf, sizeof(buf),
+            "{\"pid\":%d,\"time_us\":%lld,\"interval_us\":%lld,"
+            "\"cpu_mhz\":%" PRIu64 ",\"validations\":%" PRIu64
+            ",\"validation_cycles\":%" PRIu64 ",\"skipped\":%" PRIu64
+            ",\"logs\":%" PRIu64 ",\"log_bytes\":%" PRIu64
+            ",\"log_uncompacted_bytes\":%" PRIu64
+            ",\"latency_us\":{\"count\":%" PRId64
+            ",\"mean\":%.2f,\"p50\":%" PRId64 ",\"p90\":%" PRId64
+            ",\"p99\":%" PRId64 ",\"p999\":%" PRId64 ",\"max\":%" PRId64
+            "},\"gauges\":{",
+            getpid(), get_us_abs(), interval_us, kCpuMhzNorm,
+            validation_count.load(), validation_cpu_time_cycles.load(),
+            validation_skipped.load(), log_count.load(), log_bytes.load(),
+            log_uncompacted_bytes.load(), h->total_count, hdr_mean(h),
+            hdr_value_at_percentile(h, 50), hdr_value_at_percentile(h, 90),
+            hdr_value_at_percentile(h, 99), hdr_value_at_percentile(h, 99.9),
+            hdr_max(h));
+        std::string line(buf, std::min<size_t>(n, sizeof(buf) - 1));
+        {
+            std::lock_guard<std::mutex> guard(gauges_mutex);
+            for (size_t i = 0; i < gauges.size(); i++) {
+                line += i == 0 ? "\"" : ",\"";
+                line += gauges[i].name + "\":";
+                line += std::to_string(gauges[i].read());
+            }
+        }
+        line += "}}\n";
+        return line;
+    }
+
+    void run() {
+        using clock = std::chrono::steady_clock;
+        using std::chrono::duration_cast;
+        const auto interval = std::chrono::milliseconds(interval_ms);
+        auto last = clock::now();
+        auto next = last + interval;
+        while (true) {
+            auto timeout = duration_cast<std::chrono::milliseconds>(
+                next - clock::now());
+            pollfd fds[2] = {{listen_fd, POLLIN, 0}, {wakeup[0], POLLIN, 0}};
+            poll(fds, 2, std::max<long>(timeout.count(), 0));
+            if (fds[1].revents) break;
+            if (fds[0].revents & POLLIN) {
+                int fd = accept4(listen_fd, nullptr, nullptr,
+                                 SOCK_NONBLOCK | SOCK_CLOEXEC);
+                if (fd >= 0) clients.push_back(fd);
+            }
+            auto now = clock::now();
+            if (now < next) continue;
+            long long interval_us =
+                duration_cast<std::chrono::microseconds>(now - last).count();
+            last = now;
+            next += interval;
+            if (next < now) next = now + interval;
+            // sampled even without clients, so that it covers one interval
+            std::string line = snapshot(interval_us);
+            std::erase_if(clients, [&](int fd) {
+                ssize_t sent =
+                    send(fd, line.data(), line.size(), MSG_NOSIGNAL);
+                if (sent == (ssize_t)line.size()) return false;
+                close(fd);
+                return true;
+            });
+        }
+    }
+};
+
+Telemetry telemetry;
+
 static std::string get_current_time() {
     time_t now = time(nullptr);
     struct tm* localTime = localtime(&now);
@@ -104,12 +324,61 @@ static std::string get_current_time() {
     return result;
 }
 
+static bool hdr_log_enabled() {
+    const char* env = getenv("PROFILE_HDR_LOG");
+    return env != nullptr && env[0] != '\0' && strcmp(env, "0") != 0;
+}
+
+void write_hdr_log(hdr_histogram* histogram, const std::string& cdf_filename,
+                   double value_scale) {
+    if (!hdr_log_enabled()) return;
+    std::string filename = cdf_filename;
+    if (filename.ends_with(".cdf")) {
+        filename.resize(filename.size() - 4);
+    }
+    filename += ".hlog";
+
+    hdr_timespec end_timestamp;
+    hdr_getnow(&end_timestamp);
+    hdr_timespec start_timestamp =
+        g_started ? g_start_timestamp : end_timestamp;
+
+    FILE* f = fopen(filename.c_str(), "w");
+    if (f == nullptr) {
+        std::cerr << "Error: failed to open " << filename << std::endl;
+        return;
+    }
+    hdr_log_writer writer;
+    hdr_log_writer_init(&writer);
+    // recorded values are divided by the scale to get microseconds
+    std::string prefix = "ValueScale: " + std::to_string(value_scale);
+    int err =
+        hdr_log_write_header(&writer, f, prefix.c_str(), &start_timestamp);
+    if (err == 0) {
+        err = hdr_log_write(&writer, f, &start_timestamp, &end_timestamp,
+                            histogram);
+    }
+    fclose(f);
+    if (err != 0) {
+        std::cerr << "Error: failed to write " << filename << ": "
+                  << hdr_strerror(err) << std::endl;
+        return;
+    }
+    std::cout << "HDR log file: " << filename << std::endl;
+}
+
 void print_stats() {
     if (validation_count == 0) return;
     std::cout << "----------------------------------------" << std::endl;
     std::cout << "Validation CPU Time (us): "
               << validation_cpu_time_cycles / kCpuMhzNorm << std::endl;
     std::cout << "Validation Count: " << validation_count << std::endl;
+    if (log_count > 0) {
+        std::cout << "Log Bytes: " << log_bytes << " ("
+                  << log_bytes / log_count << " per log, "
+                  << log_uncompacted_bytes / log_count << " unpacked)"
+                  << std::endl;
+    }
     std::cout << "----------------------------------------" << std::endl;
     std::cout << "Validation Latency (us)" << std::endl;
     std::cout << "mean:   " << hdr_mean(validation_latency_histogram)
@@ -131,6 +400,7 @@ void print_stats() {
     hdr_percentiles_print(validation_latency_histogram, f, 10, 1, CLASSIC);
     fclose(f);
     std::cout << "CDF file: " << filename << std::endl;
+    write_hdr_log(validation_latency_histogram, filename);
     std::cout << "----------------------------------------" << std::endl;
 }
 }  // namespace profile
@@ -1,11 +1,31 @@
 #include "scee.hpp"
 
+#include <malloc.h>
+#include <sys/mman.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+
+#include <cxxabi.h>
+
+#include <algorithm>
+#include <cerrno>
+#include <cstring>
+#include <cstdlib>
+#include <string>
+#include <typeinfo>
+#include <unordered_map>
+#include <utility>
+
 #include "compiler.hpp"
+#include "controller.hpp"
 #include "free_log.hpp"
 #include "log.hpp"
 #include "profile.hpp"
 #include "queue.hpp"
+#include "sampling.hpp"
+#include "spin_lock.hpp"
 #include "thread.hpp"
+#include "validator_pool.hpp"
 
 // #define DISABLE_VALIDATION
 
@@ -17,26 +37,520 @@ thread_local LogQueue log_queue;
 // free_log.hpp
 thread_local ThreadGC thread_gc_instance;
 thread_local ThreadGC *app_thread_gc_instance = nullptr;
-ClosureStartLog closure_start_log;
+thread_local bool batch_thread_gc = false;
+EpochManager epoch_manager;
+
+ThreadGC::~ThreadGC() {
+    epoch_manager.add_pending_bytes(unflushed_bytes);
+    if (registered) epoch_manager.unregister_thread(this);
+}
+
+// Closures of the previous epoch are counted: validated first, then
+// started, so that a closure started concurrently is seen. Either it is, or
+// the thread sees the new epoch after announcing, and starts again.
+bool EpochManager::try_advance() {
+    if (!registry_lock.TryLock()) return false;
+    const uint64_t epoch = global_epoch.load(std::memory_order_relaxed);
+    const size_t parity = (epoch - 1) & 1;
+    for (ThreadGC *gc = threads; gc != nullptr; gc = gc->next) {
+        const uint64_t validated =
+            gc->validated[parity].load(std::memory_order_acquire);
+        if (gc->started[parity].load() != validated) {
+            registry_lock.Unlock();
+            return false;
+        }
+    }
+    global_epoch.store(epoch + 1);
+    registry_lock.Unlock();
+    return true;
+}
+
+void EpochManager::register_thread(ThreadGC *gc) {
+    registry_lock.Lock();
+    gc->prev = nullptr;
+    gc->next = threads;
+    if (threads != nullptr) threads->prev = gc;
+    threads = gc;
+    gc->registered = true;
+    registry_lock.Unlock();
+}
+
+void EpochManager::unregister_thread(ThreadGC *gc) {
+    registry_lock.Lock();
+    if (gc->prev != nullptr) {
+        gc->prev->next = gc->next;
+    } else {
+        threads = gc->next;
+    }
+    if (gc->next != nullptr) gc->next->prev = gc->prev;
+    gc->registered = false;
+    registry_lock.Unlock();
+
+    gc->spin_lock.Lock();
+    orphan_lock.Lock();
+    while (const FreeLogEntry *entry = gc->free_log.peek()) {
+        orphans.push_back(*entry);
+        gc->free_log.pop();
+    }
+    n_orphans.store(orphans.size(), std::memory_order_relaxed);
+    orphan_lock.Unlock();
+    gc->spin_lock.Unlock();
+}
+
+void EpochManager::collect_orphans() {
+    if (!orphan_lock.TryLock()) return;
+    const uint64_t epoch = current();
+    const bool count = counts_bytes();
+    int64_t freed_bytes = 0;
+    std::erase_if(orphans, [&](const FreeLogEntry &entry) {
+        if (entry.epoch + 2 > epoch) return false;
+        if (count) freed_bytes += slab_allocator.usable_size(entry.ptr);
+        free_immutable(entry.ptr);
+        return true;
+    });
+    n_orphans.store(orphans.size(), std::memory_order_relaxed);
+    add_pending_bytes(-freed_bytes);
+    orphan_lock.Unlock();
+}
 
 // log.hpp
-SpinLock GlobalLogBufferAllocator::spin_lock;
-std::queue<void *> GlobalLogBufferAllocator::free_buffers;
 thread_local ThreadLogManager thread_log_manager;
 thread_local LogReader log_reader;
 
+// log_buffer_pool.hpp
+LogBufferPool log_buffer_pool;
+thread_local LogBufferCache log_buffer_cache;
+
+static uint32_t current_numa_node() {
+    unsigned cpu = 0, node = 0;
+    if (syscall(SYS_getcpu, &cpu, &node, nullptr) != 0) return 0;
+    return node % MAX_NUMA_NODES;
+}
+
+LogBufferPool::LogBufferPool() {
+    profile::add_gauge("log_buffers.mapped_mib",
+                       [this] { return mapped_bytes.load() >> 20; });
+    // bytes, for the memory profile (profile-mem.cpp)
+    profile::add_gauge("mem.log_buffers_live", [this] {
+        return std::max<int64_t>(live_buffers.load(), 0) * MAX_LOG_BUFFER_SIZE;
+    });
+    profile::add_gauge("mem.log_buffers_cached", [this] {
+        spin_lock.Lock();
+        // in magazines, depots and the global pool, with memory
+        const int64_t n = carved_buffers - trimmed.size() - live_buffers.load();
+        spin_lock.Unlock();
+        return std::max<int64_t>(n, 0) * MAX_LOG_BUFFER_SIZE;
+    });
+    profile::add_gauge("log_buffers.cached", [this] {
+        spin_lock.Lock();
+        size_t n = cached.size();
+        spin_lock.Unlock();
+        return n;
+    });
+}
+
+LogBufferRef LogBufferPool::refill(Magazine &magazine) {
+    const uint32_t node = current_numa_node();
+    Depot &depot = depots[node];
+    depot.spin_lock.Lock();
+    while (depot.size > 0 && magazine.size < MAGAZINE_SIZE) {
+        magazine.refs[magazine.size++] = {depot.buffers[--depot.size], node};
+    }
+    depot.spin_lock.Unlock();
+    if (magazine.size == 0) {
+        spin_lock.Lock();
+        // buffers of this node first, then of any node
+        for (size_t i = 0; i < cached.size();) {
+            if (magazine.size == MAGAZINE_SIZE) break;
+            if (cached[i].node == node) {
+                magazine.refs[magazine.size++] = cached[i];
+                cached[i] = cached.back();
+                cached.pop_back();
+            } else {
+                i++;
+            }
+        }
+        while (!cached.empty() && magazine.size < MAGAZINE_SIZE / 2) {
+            magazine.refs[magazine.size++] = cached.back();
+            cached.pop_back();
+        }
+        if (magazine.size == 0 && !trimmed.empty()) {
+            magazine.refs[magazine.size++] = trimmed.back();
+            trimmed.pop_back();
+        }
+        if (magazine.size == 0) {
+            magazine.refs[magazine.size++] = carve(node);
+        }
+        spin_lock.Unlock();
+    }
+    return magazine.refs[--magazine.size];
+}
+
+void LogBufferPool::flush(Magazine &magazine, uint32_t node) {
+    Depot &depot = depots[node];
+    depot.spin_lock.Lock();
+    while (magazine.size > 0 && depot.size < DEPOT_BUFFERS) {
+        depot.buffers[depot.size++] = magazine.refs[--magazine.size].buffer;
+    }
+    depot.spin_lock.Unlock();
+    if (magazine.size == 0) return;
+    spin_lock.Lock();
+    while (magazine.size > 0 && cached.size() < GLOBAL_BUFFERS) {
+        cached.push_back(magazine.refs[--magazine.size]);
+    }
+    spin_lock.Unlock();
+    if (magazine.size == 0) return;
+    // over the bounds of the caches
+    for (size_t i = 0; i < magazine.size; i++) {
+        madvise(magazine.refs[i].buffer, MAX_LOG_BUFFER_SIZE, MADV_DONTNEED);
+    }
+    spin_lock.Lock();
+    while (magazine.size > 0) {
+        trimmed.push_back(magazine.refs[--magazine.size]);
+    }
+    spin_lock.Unlock();
+}
+
+// under `spin_lock`
+LogBufferRef LogBufferPool::carve(uint32_t node) {
+    Arena &arena = arenas[node];
+    if (arena.cursor == arena.end) {
+        // aligned to the buffer size, and to hugepages
+        constexpr size_t ALIGN = std::max<size_t>(MAX_LOG_BUFFER_SIZE, 2 << 20);
+        const size_t length = ARENA_SIZE + ALIGN;
+        void *addr = mmap(nullptr, length, PROT_READ | PROT_WRITE,
+                          MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+        if (addr == MAP_FAILED) {
+            fprintf(stderr, "Error: failed to map a log buffer arena: %s\n",
+                    strerror(errno));
+            std::abort();
+        }
+        const uintptr_t start = reinterpret_cast<uintptr_t>(addr);
+        const uintptr_t aligned = (start + ALIGN - 1) & ~(ALIGN - 1);
+        if (aligned > start) munmap(addr, aligned - start);
+        if (start + length > aligned + ARENA_SIZE) {
+            munmap(reinterpret_cast<void *>(aligned + ARENA_SIZE),
+                   start + length - aligned - ARENA_SIZE);
+        }
+        arena.cursor = reinterpret_cast<std::byte *>(aligned);
+        arena.end = arena.cursor + ARENA_SIZE;
+        madvise(arena.cursor, ARENA_SIZE, MADV_HUGEPAGE);
+        // MPOL_PREFERRED, the node of the threads the arena is carved for;
+        // fails without NUMA, pages are then placed on first touch
+        constexpr int MPOL_PREFERRED = 1;
+        const unsigned long nodemask = 1ul << node;
+        syscall(SYS_mbind, arena.cursor, ARENA_SIZE, MPOL_PREFERRED, &nodemask,
+                sizeof(nodemask) * 8, 0);
+        mapped_bytes += ARENA_SIZE;
+    }
+    void *buffer = arena.cursor;
+    arena.cursor += MAX_LOG_BUFFER_SIZE;
+    carved_buffers++;
+    return {buffer, node};
+}
+
+LogBufferCache::~LogBufferCache() {
+    // not handed out, not live
+    for (size_t i = 0; i < allocated.size; i++) {
+        const LogBufferRef ref = allocated.refs[i];
+        LogBufferPool::Magazine &magazine = freed[ref.node];
+        if (magazine.size == LogBufferPool::MAGAZINE_SIZE) {
+            log_buffer_pool.flush(magazine, ref.node);
+        }
+        magazine.refs[magazine.size++] = ref;
+    }
+    allocated.size = 0;
+    for (uint32_t node = 0; node < MAX_NUMA_NODES; node++) {
+        if (freed[node].size > 0) log_buffer_pool.flush(freed[node], node);
+    }
+}
+
+// slab.hpp
+constinit SlabAllocator slab_allocator;
+constinit thread_local SlabCache slab_cache;
+
+namespace {
+// registered by the first use of slab_cache in a thread
+struct SlabCacheFlush {
+    ~SlabCacheFlush() { slab_allocator.flush_cache(); }
+};
+thread_local SlabCacheFlush slab_cache_flush;
+}  // namespace
+
+static const int slab_gauge = profile::add_gauge(
+    "mem.slabs", [] { return slab_allocator.carved_bytes(); });
+
+static void activate_slab_cache() {
+    (void)&slab_cache_flush;
+    for (size_t cls = 0; cls < SlabAllocator::N_CLASSES; cls++) {
+        slab_cache.lists[cls].limit = 2 * SlabAllocator::batch_size(cls);
+    }
+    slab_cache.state = SlabCache::ACTIVE;
+}
+
+// the first `n` objects of a list, returns the last
+static void *list_tail(void *head, uint32_t &n) {
+    void *tail = head;
+    uint32_t i = 1;
+    while (i < n && *static_cast<void **>(tail) != nullptr) {
+        tail = *static_cast<void **>(tail);
+        i++;
+    }
+    n = i;
+    return tail;
+}
+
+void *SlabAllocator::allocate_slow(size_t cls) {
+    SlabCache &cache = slab_cache;
+    const size_t size = CLASS_SIZES[cls];
+    if (unlikely(cache.state == SlabCache::EXITED)) return malloc(size);
+    if (cache.state == SlabCache::UNUSED) activate_slab_cache();
+    SlabCache::List &list = cache.lists[cls];
+    if (cache.cursors[cls] == cache.ends[cls]) {
+        Central &central = centrals[cls];
+        central.spin_lock.Lock();
+        if (central.head != nullptr) {
+            uint32_t n = batch_size(cls);
+            void *tail = list_tail(central.head, n);
+            list.head = central.head;
+            list.size = n;
+            central.head = *static_cast<void **>(tail);
+            central.size -= n;
+            *static_cast<void **>(tail) = nullptr;
+        } else if (central.spare_cursor != nullptr) {
+            cache.cursors[cls] = central.spare_cursor;
+            cache.ends[cls] = central.spare_end;
+            central.spare_cursor = central.spare_end = nullptr;
+        }
+        central.spin_lock.Unlock();
+        if (list.head != nullptr) {
+            void *ptr = list.head;
+            list.head = *static_cast<void **>(ptr);
+            list.size--;
+            return ptr;
+        }
+        if (cache.cursors[cls] == cache.ends[cls]) {
+            std::byte *slab = carve(cls);
+            if (slab == nullptr) return malloc(size);
+            cache.cursors[cls] = slab;
+            cache.ends[cls] = slab + SLAB_SIZE / size * size;
+        }
+    }
+    void *ptr = cache.cursors[cls];
+    cache.cursors[cls] += size;
+    return ptr;
+}
+
+void SlabAllocator::free_slow(void *ptr, size_t cls) {
+    SlabCache &cache = slab_cache;
+    if (unlikely(cache.state == SlabCache::EXITED)) {
+        *static_cast<void **>(ptr) = nullptr;
+        push_central(cls, ptr, ptr, 1);
+        return;
+    }
+    if (cache.state == SlabCache::UNUSED) activate_slab_cache();
+    SlabCache::List &list = cache.lists[cls];
+    if (list.size >= list.limit) {
+        uint32_t n = batch_size(cls);
+        void *head = list.head;
+        void *tail = list_tail(head, n);
+        list.head = *static_cast<void **>(tail);
+        list.size -= n;
+        push_central(cls, head, tail, n);
+    }
+    *static_cast<void **>(ptr) = list.head;
+    list.head = ptr;
+    list.size++;
+}
+
+size_t SlabAllocator::usable_size(const void *ptr) const {
+    size_t cls;
+    if (find_class(ptr, cls)) return CLASS_SIZES[cls];
+    return malloc_usable_size(const_cast<void *>(ptr));
+}
+
+void SlabAllocator::flush_cache() {
+    SlabCache &cache = slab_cache;
+    for (size_t cls = 0; cls < N_CLASSES; cls++) {
+        SlabCache::List &list = cache.lists[cls];
+        if (list.head != nullptr) {
+            uint32_t n = list.size;
+            push_central(cls, list.head, list_tail(list.head, n), n);
+        }
+        list = {};  // limit 0: frees go to the central list
+        if (cache.cursors[cls] != cache.ends[cls]) {
+            Central &central = centrals[cls];
+            central.spin_lock.Lock();
+            // otherwise left unused, the pages were never touched
+            if (central.spare_cursor == nullptr) {
+                central.spare_cursor = cache.cursors[cls];
+                central.spare_end = cache.ends[cls];
+            }
+            central.spin_lock.Unlock();
+        }
+        cache.cursors[cls] = cache.ends[cls] = nullptr;
+    }
+    cache.state = SlabCache::EXITED;
+}
+
+void SlabAllocator::push_central(size_t cls, void *head, void *tail,
+                                 uint32_t n) {
+    Central &central = centrals[cls];
+    central.spin_lock.Lock();
+    *static_cast<void **>(tail) = central.head;
+    central.head = head;
+    central.size += n;
+    central.spin_lock.Unlock();
+}
+
+std::byte *SlabAllocator::carve(size_t cls) {
+    region_lock.Lock();
+    if (region.load(std::memory_order_relaxed) == NO_REGION &&
+        !region_failed) {
+        // aligned to the slab size
+        const size_t length = REGION_SIZE + SLAB_SIZE;
+        void *addr = mmap(nullptr, length, PROT_READ | PROT_WRITE,
+                          MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+        if (addr == MAP_FAILED) {
+            fprintf(stderr,
+                    "Warning: failed to reserve the slab region: %s, "
+                    "objects are malloc'ed\n",
+                    strerror(errno));
+            region_failed = true;
+        } else {
+            const uintptr_t start = reinterpret_cast<uintptr_t>(addr);
+            const uintptr_t aligned =
+                (start + SLAB_SIZE - 1) & ~(SLAB_SIZE - 1);
+            if (aligned > start) munmap(addr, aligned - start);
+            munmap(reinterpret_cast<void *>(aligned + REGION_SIZE),
+                   start + length - aligned - REGION_SIZE);
+            region.store(aligned, std::memory_order_relaxed);
+        }
+    }
+    const size_t slab = carved_slabs.load(std::memory_order_relaxed);
+    if (region_failed || slab == REGION_SIZE / SLAB_SIZE) {
+        region_lock.Unlock();
+        return nullptr;
+    }
+    slab_classes[slab] = cls;
+    carved_slabs.store(slab + 1, std::memory_order_relaxed);
+    region_lock.Unlock();
+    return reinterpret_cast<std::byte *>(region.load() + slab * SLAB_SIZE);
+}
+
 // thread.hpp
-int sampling_rate = 100, sampling_method = 1, core_id = 0;
+int core_id = 0;
 
 std::atomic_size_t n_validation_core = 0;
-size_t max_validation_core = 0;
 
-// scee.hpp
-void validate_one(LogHead *log) {
+void set_max_validation_core(size_t n) {
+    update_sampling_config([n](SamplingConfig &c) { c.max_cores = n; },
+                           "limvc");
+}
+
+// sampling.hpp
+thread_local WindowSampler window_sampler;
+
+// controller.hpp
+ValidationController validation_controller;
+
+ValidationController::ValidationController() {
+    if (const char *env = getenv("SCEE_VALIDATION_CORES")) {
+        target_cycles_per_us = atof(env) * kCpuMhzNorm;
+    }
+    if (const char *env = getenv("SCEE_VALIDATION_LAG_US")) {
+        target_lag_us = strtoull(env, nullptr, 10);
+    }
+    if (const char *env = getenv("SCEE_VALIDATION_MIN_RATE")) {
+        min_rate = std::clamp<uint32_t>(atof(env) * (FULL_RATE / 100), 1,
+                                        FULL_RATE);
+    }
+    if (!enabled()) return;
+    fprintf(stderr, "validation controller: %.2f cores, lag %lu us\n",
+            target_cycles_per_us / kCpuMhzNorm, target_lag_us);
+    profile::add_gauge("controller.rate_bp", [this] {
+        return rate(get_sampling_config().rate);
+    });
+    profile::add_gauge("controller.validation_mcores",
+                       [this] { return last_mcores.load(); });
+    profile::add_gauge("controller.lag_us",
+                       [this] { return last_lag_us.load(); });
+}
+
+void ValidationController::record(uint64_t cycles, uint64_t count,
+                                  uint64_t validated, uint64_t lag_us) {
+    period_cycles.fetch_add(cycles, std::memory_order_relaxed);
+    period_logs.fetch_add(count, std::memory_order_relaxed);
+    period_validated.fetch_add(validated, std::memory_order_relaxed);
+    uint64_t lag = period_lag_us.load(std::memory_order_relaxed);
+    while (lag < lag_us && !period_lag_us.compare_exchange_weak(
+                               lag, lag_us, std::memory_order_relaxed)) {
+    }
+    const int64_t now_us = profile::get_us_abs();
+    if (now_us - period_start_us.load(std::memory_order_relaxed) >=
+            PERIOD_US &&
+        !updating.test_and_set(std::memory_order_acquire)) {
+        update(now_us);
+        updating.clear(std::memory_order_release);
+    }
+}
+
+void ValidationController::update(int64_t now_us) {
+    const int64_t start_us = period_start_us.exchange(now_us);
+    const double cycles = period_cycles.exchange(0);
+    const double logs = period_logs.exchange(0);
+    const double validated = period_validated.exchange(0);
+    const uint64_t lag_us = period_lag_us.exchange(0);
+    if (start_us == 0) return;  // the first period is partial
+    const double elapsed_us = now_us - start_us;
+    last_mcores = cycles * 1000 / kCpuMhzNorm / elapsed_us;
+    last_lag_us = lag_us;
+
+    // exponentially weighted estimates
+    constexpr double ALPHA = 0.3;
+    logs_per_us = (1 - ALPHA) * logs_per_us + ALPHA * logs / elapsed_us;
+    if (validated > 0) {
+        const double cost = cycles / validated;
+        cycles_per_validation =
+            cycles_per_validation == 0
+                ? cost
+                : (1 - ALPHA) * cycles_per_validation + ALPHA * cost;
+    }
+
+    const double max_rate =
+        std::max<uint32_t>(get_sampling_config().rate, min_rate);
+    double rate = max_rate;
+    if (target_cycles_per_us > 0 && cycles_per_validation > 0 &&
+        logs_per_us > 0) {
+        // validations per us the budget affords, over the logs per us
+        const double affordable = target_cycles_per_us / cycles_per_validation;
+        rate = std::min(rate, FULL_RATE * affordable / logs_per_us);
+    }
+    if (target_lag_us > 0) {
+        lag_rate = lag_us > target_lag_us ? lag_rate * 0.7
+                                          : lag_rate + FULL_RATE / 50;
+        lag_rate = std::clamp<double>(lag_rate, min_rate, max_rate);
+        rate = std::min(rate, lag_rate);
+    }
+    current.store(std::clamp<double>(rate, min_rate, max_rate),
+                  std::memory_order_relaxed);
+}
+
+// `rate` is the effective sampling rate of `config`
+static bool validate_sampled(LogHead *log, const SamplingConfig &config,
+                             uint32_t rate) {
+    if (unlikely(log->length == 0)) {
+        // closes its buffer, not a closure (log.hpp)
+        reclaim_log(log);
+        return true;
+    }
     bool do_validation = true;
-    if (sampling_rate < 100) {
-        if (sampling_method == 1) {
-            do_validation = rand() % 100 < sampling_rate;
+    if (rate < SAMPLING_FULL_RATE) {
+        if (config.method == SAMPLING_RANDOM) {
+            do_validation = rand() % SAMPLING_FULL_RATE < rate;
+        } else if (config.method == SAMPLING_WINDOW) {
+            const auto *validable = LogReader(log).peek<Validable>();
+            do_validation = window_sampler.sample(&typeid(*validable), rate);
         } else {
             // NOT IMPLEMENTED
             assert(false);
@@ -53,13 +567,15 @@ void validate_one(LogHead *log) {
         log_reader.close();
     };
 
+    bool validated = do_validation;
     if (do_validation) {
-        if (max_validation_core != 0) {
+        if (config.max_cores != 0) {
             if (n_validation_core.fetch_add(1, std::memory_order_relaxed) <
-                max_validation_core) {
+                config.max_cores) {
                 validate();
             } else {
                 reclaim_log(log);
+                validated = false;
             }
             n_validation_core.fetch_sub(1, std::memory_order_relaxed);
         } else {
@@ -68,55 +584,448 @@ void validate_one(LogHead *log) {
     } else {
         reclaim_log(log);
     }
+    return validated;
 }
 
-// thread.hpp
-thread_local Thread validator_thread;
-thread_local std::atomic<bool> stop_validation;
+// scee.hpp
+bool validate_one(LogHead *log) {
+    const SamplingConfig config = get_sampling_config();
+    const uint32_t rate = validation_controller.rate(config.rate);
+    return validate_sampled(log, config, rate);
+}
 
 // memmgr.hpp
 thread_local void *bulk_buffer = nullptr;
 thread_local size_t bulk_cursor = BULK_BUFFER_SIZE;
+std::atomic<uint64_t> bulk_buffer_bytes = 0;
+static const int bulk_buffer_gauge = profile::add_gauge(
+    "mem.bulk_buffers", [] { return bulk_buffer_bytes.load(); });
+
+// validator_pool.hpp
+std::atomic<int> parked_validators = 0;
+
+// a chunk of a closure run by run_chunked() (scee.hpp)
+static bool is_chunk_log(LogHead *log) {
+    return log->length != 0 && LogReader(log).peek<Validable>()->is_chunk();
+}
+
+ValidatorPool validator_pool;
+
+void wake_validator() { validator_pool.wake(); }
+
+ValidatorPool::ValidatorPool() {
+    if (const char *env = getenv("SCEE_VALIDATORS")) {
+        max_validators = strtoul(env, nullptr, 10);
+    }
+    profile::add_gauge("validator_pool.validators", [this] {
+        std::lock_guard<std::mutex> guard(mutex);
+        return validators.size();
+    });
+    profile::add_gauge("validator_pool.parked", [] {
+        return std::max(parked_validators.load(std::memory_order_relaxed), 0);
+    });
+    profile::add_gauge("mem.free_log_pending",
+                       [] { return epoch_manager.pending_bytes(); });
+}
+
+ValidatorPool::~ValidatorPool() {
+    stop = true;
+    wakeups.fetch_add(2);
+    wakeups.notify_all();
+    for (std::thread &validator : validators) {
+        validator.join();
+    }
+}
+
+size_t ValidatorPool::register_queue(LogQueue *queue, ThreadGC *thread_gc) {
+    std::lock_guard<std::mutex> guard(mutex);
+    size_t id;
+    if (!free_slots.empty()) {
+        id = free_slots.back();
+        free_slots.pop_back();
+    } else {
+        id = n_slots.load(std::memory_order_relaxed);
+        if (id == MAX_QUEUES) {
+            fprintf(stderr, "Error: more than %lu application threads\n",
+                    MAX_QUEUES);
+            std::abort();
+        }
+    }
+    Slot &slot = slots[id];
+    while (!slot.try_lock()) {
+        cpu_relax();
+    }
+    slot.queue = queue;
+    slot.thread_gc = thread_gc;
+    slot.unlock();
+    if (id == n_slots.load(std::memory_order_relaxed)) {
+        n_slots.store(id + 1, std::memory_order_release);
+    }
+    n_queues++;
+    while (validators.size() < n_queues &&
+           (max_validators == 0 || validators.size() < max_validators)) {
+        validators.emplace_back(&ValidatorPool::run, this, validators.size());
+    }
+    return id;
+}
 
-void validate(LogQueue *queue, std::atomic<bool> &stop, ThreadGC *thread_gc) {
-    app_thread_gc_instance = thread_gc;
-    while (!stop) {
-        while (queue->empty() && !stop) {
+void ValidatorPool::unregister_queue(size_t id) {
+    Slot &slot = slots[id];
+    // checked under the lock: the validator of a batch hands off its chunks
+    // while it holds the slot
+    while (true) {
+        while (!slot.try_lock()) {
             cpu_relax();
         }
-        const uint64_t start = rdtsc();
-        size_t validation_count = 0;
-        while (true) {
-            auto *log = static_cast<LogHead *>(log_dequeue(queue));
-            if (log == nullptr) {
-                break;
-            }
-            validate_one(log);
-            validation_count++;
+        if (slot.queue->empty() &&
+            slot.pending_handoffs.load(std::memory_order_acquire) == 0) {
+            break;
         }
-        const uint64_t end = rdtsc();
-        if (validation_count > 0) {
-            profile::record_validation_cpu_time(end - start, validation_count);
+        slot.unlock();
+        wake();
+        std::this_thread::yield();
+    }
+    slot.queue = nullptr;
+    slot.thread_gc = nullptr;
+    slot.unlock();
+    std::lock_guard<std::mutex> guard(mutex);
+    free_slots.push_back(id);
+    n_queues--;
+}
+
+// The futex word counts wakeups in its upper bits, its lowest bit is set
+// while a wakeup is pending, so that a burst of logs wakes one validator and
+// not one per log. A validator clears the bit when it resumes scanning.
+void ValidatorPool::wake() {
+    uint32_t word = wakeups.load(std::memory_order_relaxed);
+    if (word & 1) return;
+    if (wakeups.compare_exchange_strong(word, (word + 2) | 1)) {
+        wakeups.notify_one();
+    }
+}
+
+void ValidatorPool::run(size_t id) {
+    size_t cursor = id;
+    uint64_t idle_since = 0;
+    while (!stop.load(std::memory_order_relaxed)) {
+        if (validate_some(cursor)) {
+            idle_since = 0;
+            continue;
+        }
+        const uint64_t now = rdtsc();
+        if (idle_since == 0) idle_since = now;
+        if (now - idle_since < SPIN_US * kCpuMhzNorm) {
+            cpu_relax();
+            continue;
+        }
+        // park, unless a log was enqueued since the last scan
+        const uint32_t seen = wakeups.load();
+        parked_validators.fetch_add(1);
+        if (!(seen & 1) && !validate_some(cursor) && !stop) {
+            wakeups.wait(seen);
+        }
+        parked_validators.fetch_sub(1);
+        wakeups.fetch_and(~1u);
+        idle_since = 0;
+    }
+}
+
+bool ValidatorPool::validate_some(size_t &cursor) {
+    if (validate_handoff()) return true;
+    const size_t n = n_slots.load(std::memory_order_acquire);
+    for (size_t i = 0; i < n; i++) {
+        const size_t id = (cursor + i) % n;
+        Slot &slot = slots[id];
+        if (!slot.try_lock()) continue;
+        if (slot.queue != nullptr && !slot.queue->empty()) {
+            validate_batch(slot);
+            slot.unlock();
+            cursor = id + 1;
+            return true;
         }
+        slot.unlock();
     }
+    return false;
 }
 
+// Logs are popped in bulk, and the head of the next logs is prefetched while
+// one is validated. The configuration is read, the time measured and the
+// freed objects of the application thread are collected once per batch.
+void ValidatorPool::validate_batch(Slot &slot) {
+    void *logs[BATCH_SIZE];
+    size_t count = slot.queue->pop(logs, BATCH_SIZE);
+    if (count == 0) return;
+    for (size_t i = 0; i < std::min(count, PREFETCH_DISTANCE); i++) {
+        prefetch_log(logs[i]);
+    }
+    app_thread_gc_instance = slot.thread_gc;
+    const SamplingConfig config = get_sampling_config();
+    const uint32_t rate = validation_controller.rate(config.rate);
+    uint64_t lag_us = 0;
+    if (validation_controller.enabled()) {
+        // of the oldest closure, logs closing a buffer have no time
+        for (size_t i = 0; i < count; i++) {
+            auto *log = static_cast<LogHead *>(logs[i]);
+            if (log->length == 0) continue;
+            lag_us = std::max<int64_t>(
+                profile::get_us_abs() - get_log_start_us(log), 0);
+            break;
+        }
+    }
+
+    const uint64_t start = rdtsc();
+    size_t skipped_count = 0;
+    size_t chunk_count = 0;
+    batch_thread_gc = true;
+    for (size_t i = 0; i < count; i++) {
+        if (i + PREFETCH_DISTANCE < count) {
+            prefetch_log(logs[i + PREFETCH_DISTANCE]);
+        }
+        auto *log = static_cast<LogHead *>(logs[i]);
+        if (is_chunk_log(log)) {
+            // validated by the other validators meanwhile
+            hand_off(slot, log);
+            chunk_count++;
+            continue;
+        }
+        if (!validate_sampled(log, config, rate)) {
+            skipped_count++;
+        }
+    }
+    batch_thread_gc = false;
+    thread_gc(slot.thread_gc);
+    const uint64_t end = rdtsc();
+    count -= chunk_count;
+
+    profile::record_validation_cpu_time(end - start, count);
+    if (skipped_count > 0) {
+        profile::record_validation_skipped(skipped_count);
+    }
+    if (validation_controller.enabled()) {
+        validation_controller.record(end - start, count, count - skipped_count,
+                                     lag_us);
+    }
+}
+
+bool ValidatorPool::try_hand_off(size_t id, LogHead *log) {
+    // as many as the queues hold
+    const size_t max_handoffs = get_log_queue_config().capacity *
+                                n_slots.load(std::memory_order_relaxed);
+    if (n_handoffs.load(std::memory_order_relaxed) >= max_handoffs) {
+        return false;
+    }
+    hand_off(slots[id], log);
+    return true;
+}
+
+void ValidatorPool::hand_off(Slot &slot, LogHead *log) {
+    slot.pending_handoffs.fetch_add(1, std::memory_order_relaxed);
+    handoff_lock.Lock();
+    handoffs.push_back({log, &slot});
+    n_handoffs.store(handoffs.size(), std::memory_order_relaxed);
+    handoff_lock.Unlock();
+    wake();
+}
+
+// A validator that takes a log wakes another one while logs remain, so that
+// the chunks of a closure spread over the parked validators.
+bool ValidatorPool::validate_handoff() {
+    if (n_handoffs.load(std::memory_order_relaxed) == 0) return false;
+    handoff_lock.Lock();
+    if (handoffs.empty()) {
+        handoff_lock.Unlock();
+        return false;
+    }
+    const Handoff handoff = handoffs.front();
+    handoffs.pop_front();
+    const size_t remaining = handoffs.size();
+    n_handoffs.store(remaining, std::memory_order_relaxed);
+    handoff_lock.Unlock();
+    if (remaining > 0) wake();
+
+    app_thread_gc_instance = handoff.slot->thread_gc;
+    const SamplingConfig config = get_sampling_config();
+    const uint32_t rate = validation_controller.rate(config.rate);
+    const uint64_t start = rdtsc();
+    const bool validated = validate_sampled(handoff.log, config, rate);
+    const uint64_t end = rdtsc();
+    // the slot may be released once its logs are validated
+    handoff.slot->pending_handoffs.fetch_sub(1, std::memory_order_release);
+
+    profile::record_validation_cpu_time(end - start, 1);
+    if (!validated) {
+        profile::record_validation_skipped(1);
+    }
+    if (validation_controller.enabled()) {
+        validation_controller.record(end - start, 1, validated, 0);
+    }
+    return true;
+}
+
+// thread.hpp
+thread_local size_t log_queue_slot;
+// telemetry gauge of the depth of the log queue
+thread_local int log_queue_gauge = -1;
+
 void AppThread::register_queue() {
-    stop_validation = false;
     LogQueue *queue = &log_queue;
 #ifndef DISABLE_SCEE
-    validator_thread =
-        Thread(validate, queue, std::ref(stop_validation), &thread_gc_instance);
+    log_queue_gauge =
+        profile::add_gauge("log_queue." + std::to_string(gettid()),
+                           [queue] { return queue->size(); });
+    log_queue_slot =
+        validator_pool.register_queue(queue, &thread_gc_instance);
 #endif
 }
 
 void AppThread::unregister_queue() {
-    stop_validation = true;
 #ifndef DISABLE_SCEE
-    validator_thread.join();
+    validator_pool.unregister_queue(log_queue_slot);
+    profile::remove_gauge(log_queue_gauge);
 #endif
 }
 
+// queue.hpp
+const LogQueueConfig &get_log_queue_config() {
+    static const LogQueueConfig config = [] {
+        static const char *const POLICIES[] = {"spin", "block", "spill",
+                                               "shed", "help"};
+        LogQueueConfig config;
+        if (const char *env = getenv("SCEE_LOG_QUEUE_CAPACITY")) {
+            config.capacity = std::max<size_t>(strtoul(env, nullptr, 10), 1);
+        }
+        if (const char *env = getenv("SCEE_LOG_QUEUE_WAIT_US")) {
+            config.wait_us = strtoull(env, nullptr, 10);
+        }
+        if (const char *env = getenv("SCEE_LOG_QUEUE_OVERFLOW")) {
+            const auto *policy = std::find_if(
+                std::begin(POLICIES), std::end(POLICIES),
+                [env](const char *name) { return strcmp(name, env) == 0; });
+            if (policy == std::end(POLICIES)) {
+                fprintf(stderr, "Error: unknown log queue overflow %s\n", env);
+                std::abort();
+            }
+            config.overflow =
+                LogQueueOverflow(policy - std::begin(POLICIES));
+        }
+        if (config.capacity != LOG_QUEUE_CAPACITY ||
+            config.overflow != LogQueueOverflow::SPIN) {
+            fprintf(stderr, "log queue: capacity %zu, overflow %s\n",
+                    config.capacity, POLICIES[int(config.overflow)]);
+        }
+        return config;
+    }();
+    return config;
+}
+
+struct LogQueueStats {
+    std::atomic<uint64_t> full = 0;  // overflows of a queue
+    std::atomic<uint64_t> stall_cycles = 0;
+    std::atomic<uint64_t> spilled = 0;
+    std::atomic<uint64_t> shed = 0;
+    std::atomic<uint64_t> handed_off = 0;
+};
+
+static LogQueueStats log_queue_stats;
+static const int log_queue_gauges = [] {
+    profile::add_gauge("log_queue_overflow.full",
+                       [] { return log_queue_stats.full.load(); });
+    profile::add_gauge("log_queue_overflow.stall_us", [] {
+        return log_queue_stats.stall_cycles.load() / kCpuMhzNorm;
+    });
+    profile::add_gauge("log_queue_overflow.spilled",
+                       [] { return log_queue_stats.spilled.load(); });
+    profile::add_gauge("log_queue_overflow.shed",
+                       [] { return log_queue_stats.shed.load(); });
+    profile::add_gauge("log_queue_overflow.handed_off",
+                       [] { return log_queue_stats.handed_off.load(); });
+    return 0;
+}();
+
+// logs shed, per closure type; the counters are not moved by a rehash
+static SpinLock shed_lock;
+static std::unordered_map<const std::type_info *, std::atomic<uint64_t>>
+    shed_counts;
+
+static std::string demangle(const char *name) {
+    int status = 0;
+    char *demangled = abi::__cxa_demangle(name, nullptr, nullptr, &status);
+    if (status != 0) return name;
+    std::string result = demangled;
+    free(demangled);
+    return result;
+}
+
+// reclaims the log without validation, on the application thread
+static void shed_log(LogHead *log) {
+    log_queue_stats.shed.fetch_add(1, std::memory_order_relaxed);
+    profile::record_validation_skipped(1);
+    if (log->length != 0) {
+        const auto *validable = LogReader(log).peek<Validable>();
+        const std::type_info *type = &typeid(*validable);
+        shed_lock.Lock();
+        auto [it, inserted] = shed_counts.try_emplace(type);
+        it->second.fetch_add(1, std::memory_order_relaxed);
+        shed_lock.Unlock();
+        if (unlikely(inserted)) {
+            profile::add_gauge(
+                "log_queue_overflow.shed." + demangle(type->name()),
+                [count = &it->second] { return count->load(); });
+        }
+    }
+    // as a validator of the thread would
+    ThreadGC *validator_gc =
+        std::exchange(app_thread_gc_instance, &thread_gc_instance);
+    reclaim_log(log);
+    app_thread_gc_instance = validator_gc;
+}
+
+void log_queue_overflow(void *ptr) {
+    auto *log = static_cast<LogHead *>(ptr);
+    const LogQueueConfig &config = get_log_queue_config();
+    if (log_queue.spilled_size() > 0) {
+        // after the logs spilled before
+        log_queue.spill(log);
+        log_queue_stats.spilled.fetch_add(1, std::memory_order_relaxed);
+        return;
+    }
+    log_queue_stats.full.fetch_add(1, std::memory_order_relaxed);
+    switch (config.overflow) {
+    case LogQueueOverflow::HELP:
+        if (validator_pool.try_hand_off(log_queue_slot, log)) {
+            log_queue_stats.handed_off.fetch_add(1,
+                                                 std::memory_order_relaxed);
+            break;
+        }
+        // the validators are behind on the logs handed off too
+        [[fallthrough]];
+    case LogQueueOverflow::SPIN:
+    case LogQueueOverflow::BLOCK: {
+        const uint64_t max_cycles = config.overflow != LogQueueOverflow::SPIN
+                                        ? config.wait_us * kCpuMhzNorm
+                                        : UINT64_MAX;
+        const uint64_t start = rdtsc();
+        uint64_t now = start;
+        bool pushed;
+        while (!(pushed = log_queue.push(log)) && now - start < max_cycles) {
+            cpu_relax();
+            now = rdtsc();
+        }
+        log_queue_stats.stall_cycles.fetch_add(rdtsc() - start,
+                                               std::memory_order_relaxed);
+        if (!pushed) shed_log(log);
+        break;
+    }
+    case LogQueueOverflow::SPILL:
+        log_queue.spill(log);
+        log_queue_stats.spilled.fetch_add(1, std::memory_order_relaxed);
+        break;
+    case LogQueueOverflow::SHED:
+        shed_log(log);
+        break;
+    }
+}
+
 // scheduler.hpp
 
 }  // namespace scee
@@ -1,135 +1,114 @@
-import json
-import enum
+import argparse
 import numpy as np
 
-
-class ErrorType(enum.Enum):
-    SDC_DETECTED = "SDC_DETECTED"
-    SDC_NOT_DETECTED = "SDC_NOT_DETECTED"
-    MASKED = "MASKED"
-    FAIL_STOP = "FAIL_STOP"
-
-
-def get_error_type(injection_result: dict):
-    err_type = injection_result["error"]
-    err_log = injection_result["data"]["err"]
-
-    if any("SDC Not" in line for line in err_log):
-        return ErrorType.SDC_NOT_DETECTED
-    elif any("Validation failed" in line for line in err_log):
-        assert err_type == "RunResult.ErrorDetected"
-        return ErrorType.SDC_DETECTED
-    elif err_type != "RunResult.Success":
-        return ErrorType.FAIL_STOP
-    else:
-        return ErrorType.MASKED
-
-
-def get_fn_name(injection: dict):
-    name_tokens = injection["name"].split("|")
-    if len(name_tokens) == 6:
-        _, fn_name, _pc, _hw_type, _unit_type, _inst_name = name_tokens
-    elif len(name_tokens) == 7:
-        _, fn_name, _pc, _hw_type, _, _unit_type, _inst_name = name_tokens
-    return fn_name
+import fault_injection
+from fault_injection import ErrorType
 
 
 P = 0.02
-
-
-def run(filename: str, a: float, n: int, ncpu: int):
+WINDOW_SIZE = 1000
+TRIALS = 64
+SEED = 20250101
+Z_95 = 1.96
+
+
+def load_counts(filename: str):
+    table = fault_injection.load(filename)
+    detectable = table.count(ErrorType.SDC_DETECTED)
+    not_detectable = table.count(ErrorType.SDC_NOT_DETECTED)
+    total = int(detectable.sum() + not_detectable.sum())
+    # functions with SDC injections
+    return detectable[(detectable + not_detectable) > 0], total
+
+
+def window_counts(rng: np.random.Generator, n_fn: int, a: float, n: int):
+    """
+    Execution counts of each function in each window of `WINDOW_SIZE` closures,
+    and the rank of each function (1: the most executed).
+    Functions are ranked by a random permutation and executed following a Zipf
+    distribution of exponent `a`, so a window is a multinomial draw.
+    """
+    rank = rng.permutation(n_fn) + 1
+    w = 1 / rank.astype(np.float64) ** a
+    p = w / w.sum()
+    sizes = np.full(n // WINDOW_SIZE, WINDOW_SIZE)
+    if n % WINDOW_SIZE:
+        sizes = np.append(sizes, n % WINDOW_SIZE)
+    return rng.multinomial(sizes, p), rank
+
+
+def round_robin(counts: np.ndarray, budget: np.ndarray, rank: np.ndarray):
+    """
+    Number of validated closures of each function in each window, when the
+    validator visits functions round-robin, in `rank` order, until `budget`
+    closures are validated, i.e. water-filling `budget` over `counts`.
+    """
+    lo = np.zeros(len(counts), dtype=np.int64)
+    hi = counts.max(axis=1)
+    # largest level L with sum(min(counts, L)) <= budget
+    while np.any(lo < hi):
+        mid = (lo + hi + 1) // 2
+        fits = np.minimum(counts, mid[:, None]).sum(axis=1) <= budget
+        lo = np.where(fits, mid, lo)
+        hi = np.where(fits, hi, mid - 1)
+    validated = np.minimum(counts, lo[:, None])
+    # the remaining budget goes to the highest ranked functions still having
+    # closures, the first ones of the last round
+    remain = budget - validated.sum(axis=1)
+    order = np.argsort(rank)
+    above = counts[:, order] > lo[:, None]
+    extra = np.empty_like(above)
+    extra[:, order] = above & (np.cumsum(above, axis=1) <= remain[:, None])
+    return validated + extra
+
+
+def detected(rng: np.random.Generator, n_detectable: np.ndarray, p_miss: np.ndarray):
+    """
+    Each injection of a function is detected independently with probability
+    `1 - p_miss`, draw the number of detected injections of all functions.
+    """
+    return rng.binomial(n_detectable, 1 - p_miss).sum(axis=-1)
+
+
+def run(filename: str, a: float, n: int, ncpu: int, trials: int = TRIALS, seed: int = SEED):
     # parse
-
-    with open(filename, "r") as f:
-        data = json.load(f)
-
-    detectable = {}
-    not_detectable = {}
-
-    for fn_result in data.values():
-        for injection in fn_result["injection"]:
-            fn_name = get_fn_name(injection)
-            err_type = get_error_type(injection["result"])
-            if err_type == ErrorType.SDC_DETECTED:
-                if fn_name not in detectable:
-                    detectable[fn_name] = 1
-                else:
-                    detectable[fn_name] += 1
-            elif err_type == ErrorType.SDC_NOT_DETECTED:
-                if fn_name not in not_detectable:
-                    not_detectable[fn_name] = 1
-                else:
-                    not_detectable[fn_name] += 1
-
-    functions = set()
-    for fn_name in detectable:
-        functions.add(fn_name)
-    for fn_name in not_detectable:
-        functions.add(fn_name)
-
-    total_detectable = sum(detectable.values())
-    total_not_detectable = sum(not_detectable.values())
-    total = total_detectable + total_not_detectable
+    n_detectable, total = load_counts(filename)
 
     # simulate
-    fn_list = list(functions)
-    np.random.shuffle(fn_list)
-    w = [1 / (r**a) for r in range(1, len(fn_list) + 1)]
-    p = [wi / sum(w) for wi in w]
-    fn_exec = np.random.choice(fn_list, size=n, p=p, replace=True)
-
-    def random_sampling(sampling_rate: float):
-        detected = set()
-        for fn in fn_exec:
-            if fn not in detectable:
-                assert fn in fn_list
-                assert fn in not_detectable
-                continue
-            for i in range(detectable[fn]):
-                if np.random.random() < sampling_rate and np.random.random() < P:
-                    detected.add((fn, i))
-        return len(detected) / total
-
-    def orthrus_sampling(sampling_rate: float):
-        detected = set()
-        max_win_size = 1000
-        win_size = 0
-        win = {fn: 0 for fn in fn_list}
-
-        def validate():
-            nonlocal win_size, win, max_win_size, detected
-            nv = 0
-            max_nv = sampling_rate * win_size
-            while nv < max_nv:
-                for fn in win:
-                    if win[fn] == 0:
-                        continue
-                    win[fn] -= 1
-                    for i in range(detectable[fn]):
-                        if np.random.random() < P:
-                            detected.add((fn, i))
-                    nv += 1
-                    if nv >= max_nv:
-                        break
-            win = {fn: 0 for fn in fn_list}
-            win_size = 0
-
-        for fn in fn_exec:
-            if win_size < max_win_size:
-                win[fn] += 1
-                win_size += 1
-            else:
-                validate()
-        validate()
-
-        return len(detected) / total
-
     X = np.arange(ncpu) + 1
-    Yrandom = [random_sampling(x / ncpu) for x in X]
-    Yorthrus = [orthrus_sampling(x / ncpu) for x in X]
+    rates = X / ncpu
+    Yrandom = np.empty((trials, ncpu))
+    Yorthrus = np.empty((trials, ncpu))
+    for trial, ss in enumerate(np.random.SeedSequence(seed).spawn(trials)):
+        rng = np.random.default_rng(ss)
+        counts, rank = window_counts(rng, len(n_detectable), a, n)
+        n_exec = counts.sum(axis=0)
+
+        # random: every (execution, injection) pair is validated and detected
+        # independently, with probability `sampling_rate * P`
+        p_miss = (1 - rates[:, None] * P) ** n_exec[None, :]
+        Yrandom[trial] = detected(rng, n_detectable, p_miss) / total
+
+        # orthrus: each window validates `sampling_rate * window_size`
+        # closures, spread over functions round-robin (the "window" sampling
+        # method of the runtime, include/sampling.hpp)
+        n_validated = np.stack(
+            [
+                round_robin(counts, np.ceil(rate * counts.sum(axis=1)).astype(np.int64), rank).sum(axis=0)
+                for rate in rates
+            ]
+        )
+        p_miss = (1 - P) ** n_validated
+        Yorthrus[trial] = detected(rng, n_detectable, p_miss) / total
+
+    def summary(Y: np.ndarray):
+        mean = Y.mean(axis=0)
+        ci = Z_95 * Y.std(axis=0, ddof=1) / np.sqrt(len(Y)) if len(Y) > 1 else np.zeros_like(mean)
+        return [X, mean, ci]
+
     return {
-        "Random": [X, np.array(Yrandom)],
-        "Orthrus": [X, np.array(Yorthrus)],
+        "Random": summary(Yrandom),
+        "Orthrus": summary(Yorthrus),
         "xlim": ncpu + 1,
     }
 
@@ -148,11 +127,28 @@ mpl.rcParams["font.family"] = "serif"
 mpl.rcParams["pdf.fonttype"] = 42
 mpl.rcParams["ps.fonttype"] = 42
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--trials", type=int, default=TRIALS, help="seeded trials per sampling rate")
+parser.add_argument("--seed", type=int, default=SEED)
+parser.add_argument("--ncpu", type=int, default=None, help="override the number of cores of all benchmarks")
+parser.add_argument("--n-scale", type=float, default=1, help="scale the number of executed closures")
+args = parser.parse_args()
+
+
+def simulate(bench: str, a: float, n: int, ncpu: int):
+    ncpu = args.ncpu or ncpu
+    result = run(get_filename(bench), a, int(n * args.n_scale), ncpu, args.trials, args.seed)
+    for system in ["Orthrus", "Random"]:
+        x, mean, ci = result[system]
+        print(f"{bench:<10} {system:<8}", " ".join(f"{m * 100:5.1f}±{c * 100:.1f}" for m, c in zip(mean, ci)))
+    return result
+
+
 data = {
-    "Memcached": run(get_filename("memcached"), 1.2, 50000, 4),
-    "Masstree": run(get_filename("masstree"), 1.2, 10000, 4),
-    "LSMTree": run(get_filename("lsmtree"), 1.5, 4000, 4),
-    "Phoenix": run(get_filename("phoenix"), 1.2, 10000, 8),
+    "Memcached": simulate("memcached", 1.2, 50000, 4),
+    "Masstree": simulate("masstree", 1.2, 10000, 4),
+    "LSMTree": simulate("lsmtree", 1.5, 4000, 4),
+    "Phoenix": simulate("phoenix", 1.2, 10000, 8),
 }
 
 benchmarks = ["Memcached", "Phoenix", "Masstree", "LSMTree"]
@@ -183,10 +179,8 @@ for sub_x, bench in enumerate(benchmarks):
         ax.set_yticks([])
     with_legend = sub_x == 0
     for system, color, line_style, marker in zip(systems, colors, line_styles, markers):
-        values, percentiles = data[bench][system]
+        x, y, ci = data[bench][system]
         xlim = data[bench]["xlim"]
-        x = data[bench][system][0]
-        y = data[bench][system][1]
 
         arg_label = {"label": system} if with_legend else {}
         ax.plot(
@@ -201,9 +195,12 @@ for sub_x, bench in enumerate(benchmarks):
             markeredgewidth=LINE_WIDTH,
             **arg_label,
         )
+        ax.fill_between(x, (y - ci) * 100, (y + ci) * 100, color=color, alpha=0.25, linewidth=0)
     ax.set_xlim((0, xlim))
     ax.set_ylim((0, 100))
-    if xlim > 5:
+    if xlim > 17:
+        ax.set_xticks(np.arange(0, max(x) + 1, max(x) // 4))
+    elif xlim > 5:
         ax.set_xticks(np.arange(min(x), max(x) + 1, 2))
     else:
         ax.set_xticks(np.arange(min(x), max(x) + 1, 1))
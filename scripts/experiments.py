@@ -0,0 +1,305 @@
+"""
+Jobs of the evaluation, for scripts/scheduler.py
+
+Each plan mirrors a test-<bench>-<experiment> recipe of scripts/*/*.just and
+produces the same files under results/ and temp/, so the analyze-* recipes
+work unchanged. Core counts follow the taskset ranges of the recipes, memory
+needs are rough peaks.
+"""
+
+from typing import Callable, Dict, List
+
+from scheduler import LOG, Job, Proc
+
+MASSTREE_DATASET = "datasets/lognormal-190M.bin"
+PHOENIX_DATASET = "datasets/news.2024.en.shuffled.deduped"
+
+MEMCACHED_LATENCY_RPS = [30000, 40000, 50000, 60000, 70000, 80000, 90000, 100000, 110000, 120000]
+LSMTREE_LATENCY_RPS = [100, 1000, 5000, 10000, 20000, 30000, 50000, 70000, 100000, 120000, 140000]
+LSMTREE_LATENCY_RPS += [160000, 200000, 220000, 240000, 260000, 280000, 300000, 310000, 320000, 330000]
+
+PROFILE_ENV = {"PROFILE_HDR_LOG": "1"}
+
+
+# ================= memcached =================
+
+
+def memcached_servers(system: str, suffix: str = "", replica_suffix: str = None):
+    replica_suffix = suffix if replica_suffix is None else replica_suffix
+    if system == "rbv":
+        return [
+            Proc(f"./build/ae/memcached/memcached_rbv_replica{replica_suffix} {{replica}}", cpus=4),
+            Proc(f"./build/ae/memcached/memcached_rbv_primary{suffix} {{port}} 3 {{replica}}", cpus=4),
+        ]
+    return [Proc(f"./build/ae/memcached/memcached_{system}{suffix} {{port}}", cpus=8 if system == "orthrus" else 4)]
+
+
+def memcached_job(name, system, client_args="", suffix="", replica_suffix=None, delay=2.0, **kwargs):
+    procs = memcached_servers(system, suffix, replica_suffix)
+    procs.append(Proc(f"./build/ae/memcached/memcached_client localhost {{port}} {client_args}".rstrip(), cpus=20))
+    for proc in procs:
+        proc.delay = delay
+    ports = {"port": 1, "replica": 1} if system == "rbv" else {"port": 1}
+    return Job(name=name, procs=procs, ports=ports, mem_gb=16, **kwargs)
+
+
+def memcached_throughput():
+    return [
+        memcached_job(
+            f"memcached-throughput-{system}",
+            system,
+            outputs={"client.log": f"results/memcached-throughput-client-{system}.log"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def memcached_memory():
+    return [
+        memcached_job(
+            f"memcached-memory-{system}",
+            system,
+            suffix="_mem",
+            delay=1.0,
+            outputs={"memcached-memory_status-*.log": "temp/"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def memcached_latency_vs_pXX():
+    return [
+        memcached_job(
+            f"memcached-latency_vs_pXX-{system}-{rps}",
+            system,
+            client_args=f"client.log 3 32 24 19 {rps}",
+            delay=1.0,
+            outputs={"client.log": f"results/memcached-latency_vs_pXX-{system}.log"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+        for rps in MEMCACHED_LATENCY_RPS
+    ]
+
+
+def memcached_validation_latency_cdf():
+    return [
+        memcached_job(
+            f"memcached-validation_latency_cdf-{system}",
+            system,
+            suffix="" if system == "rbv" else "_profile",
+            replica_suffix="_profile",
+            delay=1.0,
+            env=PROFILE_ENV,
+            outputs={
+                "validation-latency-scee.cdf": f"results/memcached-validation_latency-{system}.cdf",
+                "validation-latency-scee.hlog": f"results/memcached-validation_latency-{system}.hlog",
+            },
+        )
+        for system in ["orthrus", "rbv"]
+    ]
+
+
+# ================= masstree =================
+
+MASSTREE_CPUS = {"vanilla": 5, "orthrus": 10, "rbv": 10}
+
+
+def masstree_job(name, system, suffix="", args="", delay=2.0, **kwargs):
+    cmd = f"./build/ae/masstree/masstree_{system}{suffix} {MASSTREE_DATASET} {args}".rstrip()
+    proc = Proc(cmd, cpus=MASSTREE_CPUS[system], delay=delay)
+    return Job(name=name, procs=[proc], mem_gb=48, **kwargs)
+
+
+def masstree_throughput():
+    return [
+        masstree_job(
+            f"masstree-throughput-{system}",
+            system,
+            outputs={"client.log": f"results/masstree-throughput-client-{system}.log"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def masstree_memory():
+    return [
+        masstree_job(
+            f"masstree-memory-{system}",
+            system,
+            suffix="_mem",
+            delay=1.0,
+            outputs={"masstree-memory_status-*.log": "temp/"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def masstree_validation_latency_cdf():
+    return [
+        masstree_job(
+            f"masstree-validation_latency_cdf-{system}",
+            system,
+            suffix="_profile",
+            delay=1.0,
+            env=PROFILE_ENV,
+            outputs={
+                "validation-latency-scee.cdf": f"results/masstree-validation_latency-{system}.cdf",
+                "validation-latency-scee.hlog": f"results/masstree-validation_latency-{system}.hlog",
+            },
+        )
+        for system in ["orthrus", "rbv"]
+    ]
+
+
+# ================= phoenix =================
+
+
+def phoenix_job(name, system, suffix="", primary_suffix=None, **kwargs):
+    primary_suffix = suffix if primary_suffix is None else primary_suffix
+    if system == "rbv":
+        procs = [
+            Proc(f"./build/ae/phoenix/phoenix_rbv_replica{suffix} --replica-port {{replica}}", cpus=16),
+            Proc(
+                f"./build/ae/phoenix/phoenix_rbv_primary{primary_suffix} "
+                "--replica-port {replica} --primary-port {input}",
+                cpus=16,
+            ),
+        ]
+        # the replica listens on its port and the next one
+        ports = {"input": 1, "replica": 2}
+    else:
+        cpus = 34 if system == "orthrus" else 16
+        procs = [Proc(f"./build/ae/phoenix/phoenix_{system}{suffix} --input-port {{input}}", cpus=cpus)]
+        ports = {"input": 1}
+    procs.append(Proc(f"./build/ae/phoenix/phoenix_loader -i {PHOENIX_DATASET} --primary-port {{input}}", cpus=1))
+    return Job(name=name, procs=procs, ports=ports, mem_gb=24, **kwargs)
+
+
+def phoenix_throughput():
+    return [
+        phoenix_job(
+            f"phoenix-throughput-{system}",
+            system,
+            header=f"{system} running",
+            outputs={LOG: "results/phoenix-throughput-report.txt"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def phoenix_memory():
+    return [
+        phoenix_job(
+            f"phoenix-memory-{system}",
+            system,
+            suffix="_mem",
+            env={"MIMALLOC_VERBOSE": "1", "MIMALLOC_SHOW_ERRORS": "1", "MIMALLOC_PURGE_DELAY": "0"},
+            outputs={"phoenix-memory_status-*.log": "temp/"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def phoenix_validation_latency_cdf():
+    return [
+        phoenix_job(
+            f"phoenix-validation_latency_cdf-{system}",
+            system,
+            suffix="_profile",
+            primary_suffix="",
+            env=PROFILE_ENV,
+            outputs={
+                "validation-latency-scee.cdf": f"results/phoenix-validation_latency-{system}.cdf",
+                "validation-latency-scee.hlog": f"results/phoenix-validation_latency-{system}.hlog",
+            },
+        )
+        for system in ["orthrus", "rbv"]
+    ]
+
+
+# ================= lsmtree =================
+
+LSMTREE_THROUGHPUT_OPS = 50000000
+
+
+def lsmtree_job(name, server, client, system, **kwargs):
+    ports = {"port": 1, "replica": 1} if system == "rbv" else {"port": 1}
+    replica = " --port_replica={replica}" if system == "rbv" else ""
+    procs = [
+        Proc(f"{server} --port={{port}}{replica}", cpus=10, quiet=True),
+        Proc(f"{client} --port={{port}}", cpus=8),
+    ]
+    return Job(name=name, procs=procs, ports=ports, mem_gb=16, **kwargs)
+
+
+def lsmtree_throughput():
+    return [
+        lsmtree_job(
+            f"lsmtree-throughput-{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_throughput_{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_throughput_client --total-ops={LSMTREE_THROUGHPUT_OPS}",
+            system,
+            header=f"{system} running",
+            outputs={LOG: "results/lsmtree-throughput-report.txt"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def lsmtree_memory():
+    return [
+        lsmtree_job(
+            f"lsmtree-memory-{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_profile_mem_{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_throughput_client --total-ops={LSMTREE_THROUGHPUT_OPS}",
+            system,
+            outputs={"lsmtree-memory_status-*.log": "temp/"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+    ]
+
+
+def lsmtree_validation_latency_cdf():
+    return [
+        lsmtree_job(
+            f"lsmtree-validation_latency_cdf-{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_val_latency_cdf_{system}",
+            f"./build/ae/lsmtree/throughput/lsmtree_socket_throughput_client --total-ops={LSMTREE_THROUGHPUT_OPS}",
+            system,
+            env=PROFILE_ENV,
+            outputs={"lsmtree-validation_latency-*.cdf": "results/", "lsmtree-validation_latency-*.hlog": "results/"},
+        )
+        for system in ["orthrus", "rbv"]
+    ]
+
+
+def lsmtree_latency_vs_pXX():
+    return [
+        lsmtree_job(
+            f"lsmtree-latency_vs_pXX-{system}-{rps}",
+            f"./build/ae/lsmtree/latency/lsmtree_socket_latency_pXX_{system}",
+            f"./build/ae/lsmtree/latency/lsmtree_socket_latency_pXX_client --throughput {rps}",
+            system,
+            outputs={LOG: f"results/lsmtree-latency_vs_pXX-{system}.log"},
+        )
+        for system in ["vanilla", "orthrus", "rbv"]
+        for rps in LSMTREE_LATENCY_RPS
+    ]
+
+
+PLANS: Dict[str, Callable[[], List[Job]]] = {
+    "memcached-throughput": memcached_throughput,
+    "memcached-memory": memcached_memory,
+    "memcached-latency_vs_pXX": memcached_latency_vs_pXX,
+    "memcached-validation_latency_cdf": memcached_validation_latency_cdf,
+    "masstree-throughput": masstree_throughput,
+    "masstree-memory": masstree_memory,
+    "masstree-validation_latency_cdf": masstree_validation_latency_cdf,
+    "phoenix-throughput": phoenix_throughput,
+    "phoenix-memory": phoenix_memory,
+    "phoenix-validation_latency_cdf": phoenix_validation_latency_cdf,
+    "lsmtree-throughput": lsmtree_throughput,
+    "lsmtree-memory": lsmtree_memory,
+    "lsmtree-validation_latency_cdf": lsmtree_validation_latency_cdf,
+    "lsmtree-latency_vs_pXX": lsmtree_latency_vs_pXX,
+}
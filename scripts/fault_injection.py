@@ -0,0 +1,219 @@
+"""
+Columnar cache of fault injection results
+
+results/fault_injection/<bench>.json is parsed once, in a streaming way, into
+integer columns (function id, error type, instruction class) and string tables,
+stored under results/fault_injection/.cache/<bench>/. Later loads memory-map
+the columns. The cache is rebuilt when the size or mtime of the source file
+changes and its content hash differs.
+"""
+
+import os
+import sys
+import enum
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+CACHE_VERSION = 1
+CHUNK_SIZE = 1 << 24
+
+
+class ErrorType(enum.Enum):
+    SDC_DETECTED = "SDC_DETECTED"
+    SDC_NOT_DETECTED = "SDC_NOT_DETECTED"
+    MASKED = "MASKED"
+    FAIL_STOP = "FAIL_STOP"
+
+
+ERROR_TYPES = list(ErrorType)
+ERROR_CODE = {t: i for i, t in enumerate(ERROR_TYPES)}
+
+
+def get_error_type(injection_result: dict):
+    err_type = injection_result["error"]
+    err_log = injection_result["data"]["err"]
+
+    if any("SDC Not" in line for line in err_log):
+        return ErrorType.SDC_NOT_DETECTED
+    elif any("Validation failed" in line for line in err_log):
+        assert err_type == "RunResult.ErrorDetected"
+        return ErrorType.SDC_DETECTED
+    elif err_type != "RunResult.Success":
+        return ErrorType.FAIL_STOP
+    else:
+        return ErrorType.MASKED
+
+
+def parse_name(injection: dict):
+    """returns (function name, instruction name) of an injection"""
+    name_tokens = injection["name"].split("|")
+    if len(name_tokens) == 6:
+        _, fn_name, _pc, _hw_type, _unit_type, inst_name = name_tokens
+    elif len(name_tokens) == 7:
+        _, fn_name, _pc, _hw_type, _, _unit_type, inst_name = name_tokens
+    else:
+        raise Exception("invalid injection name: ", injection["name"])
+    return fn_name, inst_name
+
+
+def get_fn_name(injection: dict):
+    return parse_name(injection)[0]
+
+
+def iter_functions(filename) -> Iterator[Tuple[str, dict]]:
+    """
+    Iterate over the top-level `{function: result}` object of a result file,
+    decoding one function result at a time instead of the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, "r", encoding="utf8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(max(CHUNK_SIZE, len(buf) - pos))
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # a number may be cut at the end of the buffer
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        fill()
+        skip(" \t\r\n")
+        if buf[pos : pos + 1] != "{":
+            raise Exception("invalid result file: ", filename)
+        pos += 1
+        while True:
+            skip(" \t\r\n,")
+            if buf[pos : pos + 1] in ("}", ""):
+                return
+            key = decode()
+            skip(" \t\r\n:")
+            yield key, decode()
+
+
+@dataclass
+class InjectionTable:
+    fn_id: np.ndarray  # int32, index of `fn_names`
+    err_type: np.ndarray  # int8, index of `ERROR_TYPES`
+    inst_class: np.ndarray  # int16, index of `inst_names`
+    fn_names: List[str]
+    inst_names: List[str]
+
+    def __len__(self):
+        return len(self.fn_id)
+
+    def count(self, err_type: ErrorType):
+        """number of injections of `err_type` of each function"""
+        mask = self.err_type == ERROR_CODE[err_type]
+        return np.bincount(self.fn_id[mask], minlength=len(self.fn_names))
+
+    def summary(self):
+        counts = np.bincount(self.err_type, minlength=len(ERROR_TYPES))
+        return {t.value: int(c) for t, c in zip(ERROR_TYPES, counts)}
+
+
+def cache_dir(filename) -> Path:
+    filename = Path(filename)
+    return filename.parent / ".cache" / filename.stem
+
+
+def file_hash(filename):
+    h = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def ingest(filename, out: Path, meta: dict):
+    fn_ids, err_types, inst_classes = [], [], []
+    fn_names, inst_names = {}, {}
+    for _, fn_result in iter_functions(filename):
+        for injection in fn_result["injection"]:
+            fn_name, inst_name = parse_name(injection)
+            fn_ids.append(fn_names.setdefault(fn_name, len(fn_names)))
+            inst_classes.append(inst_names.setdefault(inst_name, len(inst_names)))
+            err_types.append(ERROR_CODE[get_error_type(injection["result"])])
+
+    out.mkdir(parents=True, exist_ok=True)
+    np.save(out / "fn_id.npy", np.array(fn_ids, dtype=np.int32))
+    np.save(out / "err_type.npy", np.array(err_types, dtype=np.int8))
+    np.save(out / "inst_class.npy", np.array(inst_classes, dtype=np.int16))
+    with open(out / "strings.json", "w", encoding="utf8") as f:
+        json.dump({"fn_names": list(fn_names), "inst_names": list(inst_names)}, f)
+    # written last, a partial cache is never considered valid
+    with open(out / "meta.json", "w", encoding="utf8") as f:
+        json.dump(meta, f)
+
+
+def load(filename, rebuild=False) -> InjectionTable:
+    out = cache_dir(filename)
+    stat = os.stat(filename)
+    meta = {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    cached = None
+    if not rebuild and (out / "meta.json").exists():
+        with open(out / "meta.json", "r", encoding="utf8") as f:
+            cached = json.load(f)
+    if cached is None or cached["version"] != CACHE_VERSION:
+        meta["hash"] = file_hash(filename)
+        ingest(filename, out, meta)
+    elif (cached["size"], cached["mtime_ns"]) != (meta["size"], meta["mtime_ns"]):
+        meta["hash"] = file_hash(filename)
+        if meta["hash"] != cached["hash"]:
+            ingest(filename, out, meta)
+        else:
+            with open(out / "meta.json", "w", encoding="utf8") as f:
+                json.dump(meta, f)
+
+    with open(out / "strings.json", "r", encoding="utf8") as f:
+        strings = json.load(f)
+    return InjectionTable(
+        fn_id=np.load(out / "fn_id.npy", mmap_mode="r"),
+        err_type=np.load(out / "err_type.npy", mmap_mode="r"),
+        inst_class=np.load(out / "inst_class.npy", mmap_mode="r"),
+        fn_names=strings["fn_names"],
+        inst_names=strings["inst_names"],
+    )
+
+
+if __name__ == "__main__":
+    # coverage summary: python3 scripts/fault_injection.py results/fault_injection/*.json
+    for filename in sys.argv[1:]:
+        table = load(filename)
+        summary = table.summary()
+        sdc = summary["SDC_DETECTED"] + summary["SDC_NOT_DETECTED"]
+        print(f"{filename}: {len(table)} injections, {len(table.fn_names)} functions")
+        for err_type, count in summary.items():
+            print(f"  {err_type:<18} {count}")
+        if sdc > 0:
+            print(f"  SDC coverage       {summary['SDC_DETECTED'] / sdc * 100:.2f}%")
@@ -0,0 +1,343 @@
+"""
+Result history across commits
+
+Measurement points are recorded in a SQLite store (history/results.sqlite,
+outside temp/ and results/ which every test run wipes), with the commit, host
+and configuration (sampling.config and the cores of each process) they were
+measured with. Comparing two commits bootstraps confidence intervals of the
+relative change of every metric over the repeated trials of both, and exits
+with an error when a regression is significant.
+
+Usage:
+    # results of `just test-*` or `just test-all`
+    python3 scripts/history.py record --results results
+    # repeated trials of experiments of scripts/experiments.py, on disjoint cpusets
+    python3 scripts/history.py run --plan memcached-throughput --trials 5
+    # HEAD (or the working tree, if modified) against an older commit
+    python3 scripts/history.py compare HEAD~1
+    python3 scripts/history.py list
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import argparse
+import dataclasses
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ingest import FIELDS, ResultTable, parse
+
+ROOT = Path(__file__).resolve().parent.parent
+DB = ROOT / "history" / "results.sqlite"
+WORKTREE = "worktree"
+
+# metric -> 1 if higher is better, -1 if lower is better
+METRICS = {
+    "throughput": 1,
+    "duration_ms": -1,
+    "lat_avg_us": -1,
+    "lat_p90_us": -1,
+    "lat_p95_us": -1,
+    "lat_p99_us": -1,
+    "rss_peak_kb": -1,
+}
+
+# file name in results/ -> (format, experiment)
+RESULT_FILES = [
+    (re.compile(r"(?P<bench>memcached|masstree)-throughput-client-(?P<system>\w+)\.log"), "evaluation", "throughput"),
+    (re.compile(r"(?P<bench>lsmtree)-throughput-report\.txt"), "lsmtree", "throughput"),
+    (re.compile(r"(?P<bench>phoenix)-throughput-report\.txt"), "phoenix", "throughput"),
+    (re.compile(r"(?P<bench>memcached)-latency_vs_pXX-(?P<system>\w+)\.log"), "evaluation", "latency_vs_pXX"),
+    (re.compile(r"(?P<bench>lsmtree)-latency_vs_pXX-(?P<system>\w+)\.log"), "lsmtree", "latency_vs_pXX"),
+    (re.compile(r"(?P<bench>\w+)-validation_latency-(?P<system>[^.]+)\.hlog"), "hdr", "validation_latency"),
+]
+
+# plan of scripts/experiments.py -> (format, output in the job directory, experiment)
+PLAN_OUTPUTS = {
+    "memcached-throughput": ("evaluation", "client.log", "throughput"),
+    "masstree-throughput": ("evaluation", "client.log", "throughput"),
+    "lsmtree-throughput": ("lsmtree", "run.log", "throughput"),
+    "phoenix-throughput": ("phoenix", "run.log", "throughput"),
+    "memcached-latency_vs_pXX": ("evaluation", "client.log", "latency_vs_pXX"),
+    "lsmtree-latency_vs_pXX": ("lsmtree", "run.log", "latency_vs_pXX"),
+    "memcached-validation_latency_cdf": ("hdr", "*.hlog", "validation_latency"),
+    "masstree-validation_latency_cdf": ("hdr", "*.hlog", "validation_latency"),
+    "phoenix-validation_latency_cdf": ("hdr", "*.hlog", "validation_latency"),
+    "lsmtree-validation_latency_cdf": ("hdr", "*.hlog", "validation_latency"),
+}
+
+COLUMNS = [name for name, _ in FIELDS]
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    commit_sha TEXT NOT NULL,
+    dirty INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS configs (
+    hash TEXT PRIMARY KEY,
+    json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS points (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    trial INTEGER NOT NULL,
+    experiment TEXT NOT NULL,
+    config TEXT NOT NULL REFERENCES configs(hash),
+    cpus TEXT,
+    {", ".join(COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS runs_commit ON runs(commit_sha);
+CREATE INDEX IF NOT EXISTS points_run ON points(run);
+"""
+
+
+def git(*args) -> str:
+    return subprocess.run(["git", *args], cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True).stdout.strip()
+
+
+def worktree_dirty():
+    # untracked files (results, datasets) do not change the build
+    return bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+class History:
+    def __init__(self, path: Path = DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def new_run(self, label: Optional[str]) -> int:
+        cur = self.db.execute(
+            "INSERT INTO runs (time, commit_sha, dirty, host, label) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), git("rev-parse", "HEAD"), int(worktree_dirty()), socket.gethostname(), label),
+        )
+        return cur.lastrowid
+
+    def config(self, cores: str) -> str:
+        """hash of the configuration of a measurement: sampling.config and the cores of its processes"""
+        sampling = ROOT / "sampling.config"
+        config = {"sampling.config": sampling.read_text() if sampling.exists() else None, "cores": cores}
+        text = json.dumps(config, sort_keys=True)
+        digest = hashlib.blake2b(text.encode(), digest_size=6).hexdigest()
+        self.db.execute("INSERT OR IGNORE INTO configs (hash, json) VALUES (?, ?)", (digest, text))
+        return digest
+
+    def add(self, run: int, trial: int, experiment: str, config: str, table: ResultTable, cpus: str = None):
+        rows = [
+            (run, trial, experiment, config, cpus, *[None if v != v else v for v in row.values()])
+            for row in table.to_dicts()
+        ]
+        self.db.executemany(f"INSERT INTO points VALUES ({', '.join('?' * (5 + len(COLUMNS)))})", rows)
+        return len(rows)
+
+    def commit(self):
+        self.db.commit()
+
+    def runs(self, ref: str) -> List[int]:
+        """runs of a label, of `run:<id>`, of a commit (clean work tree only) or of the modified work tree"""
+        if ref.startswith("run:"):
+            return [int(ref[4:])]
+        ids = [r for r, in self.db.execute("SELECT id FROM runs WHERE label = ?", (ref,))]
+        if ids:
+            return ids
+        if ref == WORKTREE:
+            query, args = "SELECT id FROM runs WHERE commit_sha = ? AND dirty = 1", (git("rev-parse", "HEAD"),)
+        else:
+            try:
+                sha = git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+            except subprocess.CalledProcessError:
+                sha = ref
+            query, args = "SELECT id FROM runs WHERE commit_sha LIKE ? AND dirty = 0", (sha + "%",)
+        return [r for r, in self.db.execute(query, args)]
+
+    def samples(self, runs: List[int]) -> Dict[Tuple, Dict[str, np.ndarray]]:
+        """(host, config, experiment, bench, system, task, point) -> metric -> values of all trials"""
+        metrics = list(METRICS)
+        query = (
+            "SELECT runs.host, config, experiment, bench, system, task, rps, point, "
+            + ", ".join(metrics)
+            + f" FROM points JOIN runs ON runs.id = points.run WHERE run IN ({', '.join('?' * len(runs))})"
+        )
+        groups = {}
+        for host, config, experiment, bench, system, task, rps, point, *values in self.db.execute(query, runs):
+            # points of a load sweep are identified by their load, others by their order in the log
+            key = (host, config, experiment, bench, system, task, f"rps={rps:g}" if rps is not None else f"#{point}")
+            group = groups.setdefault(key, {metric: [] for metric in metrics})
+            for metric, value in zip(metrics, values):
+                if value is not None:
+                    group[metric].append(value)
+        return {key: {m: np.array(v) for m, v in group.items() if v} for key, group in groups.items()}
+
+
+# ================= recording =================
+
+
+def record_results(history: History, run: int, results: Path, cores: str):
+    config = history.config(cores)
+    n = 0
+    for path in sorted(results.iterdir()):
+        for pattern, fmt, experiment in RESULT_FILES:
+            if match := pattern.fullmatch(path.name):
+                table = parse(fmt, path, match["bench"], match.groupdict().get("system"))
+                n += history.add(run, 0, experiment, config, table)
+                print(f"{path}: {len(table)} points", flush=True)
+                break
+    return n
+
+
+def run_trials(history: History, run: int, plans: List[str], trials: int, reserve: str):
+    from experiments import PLANS
+    from scheduler import Scheduler, Topology, read_cpulist
+
+    sched = Scheduler(Topology(read_cpulist(reserve)), verbose=False)
+    n = 0
+    for trial in range(trials):
+        jobs = {}
+        for plan in plans:
+            for job in PLANS[plan]():
+                jobs[job.name] = (plan, dataclasses.replace(job, name=f"{job.name}-t{trial}"))
+        print(f"trial {trial + 1}/{trials}: {len(jobs)} jobs", flush=True)
+        results = sched.run([job for _, job in jobs.values()])
+        for name, (plan, job) in jobs.items():
+            if not results.get(job.name):
+                raise Exception(f"job {job.name} failed, see {job.dir}/run.log")
+            fmt, output, experiment = PLAN_OUTPUTS[plan]
+            bench = plan.split("-", 1)[0]
+            system = name[len(plan) + 1 :].split("-", 1)[0]
+            # the cores of each process, not their ids, identify the configuration
+            config = history.config(" ".join(f"{p.cmd.split()[0].rsplit('/', 1)[-1]}:{p.cpus}" for p in job.procs))
+            for path in sorted(job.dir.glob(output)):
+                table = parse(fmt, path, bench, system)
+                n += history.add(run, trial, experiment, config, table, sched.placements[job.name].describe())
+        history.commit()
+    return n
+
+
+# ================= comparison =================
+
+
+def bootstrap(base: np.ndarray, cand: np.ndarray, confidence: float, resamples: int, rng: np.random.Generator):
+    """relative change of the mean from `base` to `cand`, and its bootstrap confidence interval"""
+    base_means = base[rng.integers(0, len(base), (resamples, len(base)))].mean(axis=1)
+    cand_means = cand[rng.integers(0, len(cand), (resamples, len(cand)))].mean(axis=1)
+    changes = cand_means / base_means - 1
+    alpha = 1 - confidence
+    lo, hi = np.quantile(changes, [alpha / 2, 1 - alpha / 2])
+    return cand.mean() / base.mean() - 1, lo, hi
+
+
+def compare(history: History, base_ref: str, cand_ref: str, args) -> bool:
+    """prints the changes from `base_ref` to `cand_ref`, returns whether a regression is significant"""
+    base_runs, cand_runs = history.runs(base_ref), history.runs(cand_ref)
+    if not base_runs:
+        raise Exception(f"no recorded run of {base_ref}")
+    if not cand_runs:
+        raise Exception(f"no recorded run of {cand_ref}")
+    base, cand = history.samples(base_runs), history.samples(cand_runs)
+    rng = np.random.default_rng(args.seed)
+    regressed = False
+    print(f"{base_ref} ({len(base_runs)} runs) -> {cand_ref} ({len(cand_runs)} runs)")
+    print(f"{'point':<48} {'metric':<12} {'base':>12} {'new':>12} {'change':>8}  {args.confidence:.0%} CI")
+    for key in sorted(cand):
+        if key not in base:
+            continue
+        host, config, experiment, bench, system, task, point = key
+        name = f"{bench}/{experiment}/{system} {task} {point}".replace("  ", " ")
+        for metric, sign in METRICS.items():
+            if metric not in base[key] or metric not in cand[key]:
+                continue
+            b, c = base[key][metric], cand[key][metric]
+            line = f"{name:<48} {metric:<12} {b.mean():>12.2f} {c.mean():>12.2f}"
+            if min(len(b), len(c)) < 2 or b.mean() == 0:
+                print(f"{line} {c.mean() / b.mean() - 1 if b.mean() else 0:>+8.1%}  (needs 2 trials)")
+                continue
+            change, lo, hi = bootstrap(b, c, args.confidence, args.resamples, rng)
+            # a regression when the whole interval is worse than the threshold
+            worse = hi < -args.threshold if sign > 0 else lo > args.threshold
+            better = lo > args.threshold if sign > 0 else hi < -args.threshold
+            verdict = "REGRESSION" if worse else "improved" if better else ""
+            regressed |= worse
+            print(f"{line} {change:>+8.1%}  [{lo:+.1%}, {hi:+.1%}] {verdict}".rstrip())
+    unmatched = len([key for key in cand if key not in base])
+    if unmatched:
+        print(f"{unmatched} points have no baseline with the same host and configuration")
+    return regressed
+
+
+def list_runs(history: History):
+    query = (
+        "SELECT runs.id, time, commit_sha, dirty, host, label, COUNT(points.run), MAX(points.trial) + 1 "
+        "FROM runs LEFT JOIN points ON points.run = runs.id GROUP BY runs.id ORDER BY runs.id"
+    )
+    print(f"{'run':>5} {'time':<19} {'commit':<13} {'host':<16} {'points':>7} {'trials':>7} label")
+    for rid, t, sha, dirty, host, label, npoints, ntrials in history.db.execute(query):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+        commit = sha[:12] + ("+" if dirty else "")
+        print(f"{rid:>5} {stamp:<19} {commit:<13} {host:<16} {npoints:>7} {ntrials or 0:>7} {label or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record results across commits and compare them")
+    parser.add_argument("--db", type=Path, default=Path(os.environ.get("ORTHRUS_HISTORY", DB)))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compare_args = argparse.ArgumentParser(add_help=False)
+    compare_args.add_argument("--threshold", type=float, default=0.02, help="relative change tolerated (default 2%%)")
+    compare_args.add_argument("--confidence", type=float, default=0.95)
+    compare_args.add_argument("--resamples", type=int, default=10000)
+    compare_args.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("record", help="record the results of a test run")
+    p.add_argument("--results", type=Path, default=ROOT / "results", help="directory of the results")
+    p.add_argument("--cores", default="recipes", help="core sets the results were measured with")
+    p.add_argument("--label")
+
+    p = sub.add_parser("run", parents=[compare_args], help="run and record repeated trials of experiments")
+    p.add_argument("--plan", action="append", required=True, choices=sorted(PLAN_OUTPUTS))
+    p.add_argument("--trials", type=int, default=5)
+    p.add_argument("--reserve", default="0", help="cpus left to the system")
+    p.add_argument("--label")
+    p.add_argument("--baseline", help="compare with the runs of a commit or label afterwards")
+
+    p = sub.add_parser("compare", parents=[compare_args], help="compare two commits, labels or runs")
+    p.add_argument("baseline", help="commit, label or run:<id>")
+    p.add_argument("candidate", nargs="?", help=f"default: HEAD, or '{WORKTREE}' if it is modified")
+
+    sub.add_parser("list", help="list recorded runs")
+    args = parser.parse_args()
+
+    history = History(args.db)
+    if args.command == "list":
+        list_runs(history)
+        return
+    if args.command == "record":
+        run = history.new_run(args.label)
+        n = record_results(history, run, args.results, args.cores)
+        history.commit()
+        print(f"recorded {n} points as run:{run}")
+        return
+    if args.command == "run":
+        run = history.new_run(args.label)
+        n = run_trials(history, run, args.plan, args.trials, args.reserve)
+        print(f"recorded {n} points as run:{run}")
+        if not args.baseline:
+            return
+        args.candidate = f"run:{run}"
+    candidate = args.candidate or (WORKTREE if worktree_dirty() else "HEAD")
+    if compare(history, args.baseline, candidate, args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
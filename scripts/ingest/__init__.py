@@ -0,0 +1,21 @@
+"""
+Ingestion of evaluation logs
+
+Each log format registers a parser with `register()`. A parser reads the log
+line by line (binary logs: the opened file) in a single pass and yields one
+dict per measurement point, which are collected into a typed, columnar
+`ResultTable`.
+
+Example:
+    from ingest import parse, parse_all
+    table = parse_all("evaluation", {"vanilla": "temp/a.log", "orthrus": "temp/b.log"}, bench="memcached")
+    table.select(system="orthrus")["throughput"]
+"""
+
+from .table import FIELDS, ResultTable
+from .registry import FORMATS, register, parse, parse_all
+
+# register parsers of all log formats
+from . import evaluation, lsmtree, phoenix, memory, hdr
+
+__all__ = ["FIELDS", "FORMATS", "ResultTable", "register", "parse", "parse_all"]
@@ -0,0 +1,49 @@
+"""
+Summary lines of `monitor::evaluation` (ae/memcached/client.cpp and the
+masstree benchmarks), latencies are reported in nanoseconds.
+"""
+
+import re
+
+from .registry import register
+
+# client setting ngroups=3, nclients=32, nsets=50331648, ngets=524288, rps=0
+pat_setting = re.compile(r"client setting .*rps=(?P<rps>\d+)")
+# UPDATE put 365130 avg 84194 p90 91366 p95 94937 p99 243115
+pat_task = re.compile(
+    r"(?P<task>\S+) put (?P<throughput>\d+) avg (?P<avg>\d+) p90 (?P<p90>\d+) p95 (?P<p95>\d+) p99 (?P<p99>\d+)"
+)
+
+# tasks loading the dataset, excluded from the reported numbers
+LOAD_TASKS = {"SET"}
+
+
+def summarize(rps, tasks):
+    # the reported point is the average of all (non-loading) tasks
+    tasks = [t for t in tasks if t["task"] not in LOAD_TASKS] or tasks
+    mean = lambda key: sum(int(t[key]) for t in tasks) / len(tasks)
+    return {
+        "task": "+".join(t["task"] for t in tasks),
+        "rps": rps,
+        "throughput": mean("throughput"),
+        "lat_avg_us": mean("avg") / 1000,
+        "lat_p90_us": mean("p90") / 1000,
+        "lat_p95_us": mean("p95") / 1000,
+        "lat_p99_us": mean("p99") / 1000,
+    }
+
+
+@register("evaluation")
+def parse_evaluation(lines):
+    rps, tasks = float("nan"), []
+    for line in lines:
+        if match := pat_setting.match(line):
+            if tasks:
+                yield summarize(rps, tasks)
+            rps, tasks = float(match["rps"]), []
+        elif match := pat_task.match(line):
+            tasks.append(match.groupdict())
+        elif line.strip():
+            raise Exception("invalid data: ", line)
+    if tasks:
+        yield summarize(rps, tasks)
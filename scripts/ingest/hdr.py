@@ -0,0 +1,246 @@
+"""
+HdrHistogram logs written by `profile::write_hdr_log` (profile.cpp)
+
+A log holds one or more intervals, each a base64, zlib compressed V2 encoded
+histogram. Decoded histograms keep the exact bucket counts, so histograms of
+repeated runs, threads or processes (e.g. RBV primary and replica) merge
+without any loss, and any percentile can be queried afterwards.
+    #[ValueScale: 2800.000000]
+    "StartTimestamp","Interval_Length","Interval_Max","Interval_Compressed_Histogram"
+    1700000000.123,12.345,5678.0,HISTFAAAA...
+"""
+
+import re
+import math
+import zlib
+import base64
+import struct
+from dataclasses import dataclass, field
+from typing import Iterable, List
+
+import numpy as np
+
+from .registry import register
+
+V2_ENCODING_COOKIE = 0x1C849303
+V2_COMPRESSION_COOKIE = 0x1C849304
+# cookie, payload length, normalizing index offset, significant figures,
+# lowest and highest trackable value, integer to double conversion ratio
+ENCODING_HEADER = struct.Struct(">iiiiqqd")
+COMPRESSION_HEADER = struct.Struct(">ii")
+
+pat_scale = re.compile(r"#\[ValueScale: (?P<scale>[\d.eE+-]+)\]")
+
+
+def cookie_base(cookie: int):
+    # the low bits of the cookie hold the word size of older encodings
+    return cookie & ~0xF0
+
+
+def decode_counts(payload: bytes, counts_len: int) -> np.ndarray:
+    """ZigZag LEB128 counts, a negative value is a run of zero counts"""
+    counts = np.zeros(counts_len, dtype=np.int64)
+    index, pos, end = 0, 0, len(payload)
+    while pos < end:
+        value, shift = 0, 0
+        while True:
+            b = payload[pos]
+            pos += 1
+            if shift == 56:
+                # the 9th byte carries 8 bits
+                value |= b << 56
+                break
+            value |= (b & 0x7F) << shift
+            shift += 7
+            if b & 0x80 == 0:
+                break
+        value = (value >> 1) ^ -(value & 1)
+        if value < 0:
+            index += -value
+        else:
+            if index >= counts_len:
+                raise Exception("count index out of range: ", index)
+            counts[index] = value
+            index += 1
+    return counts
+
+
+@dataclass
+class Histogram:
+    lowest: int
+    highest: int
+    sig_figs: int
+    counts: np.ndarray  # int64, in the bucket layout of HdrHistogram_c
+    scale: float = 1.0  # recorded value / scale = microseconds
+    start: float = math.nan  # interval start, seconds since epoch
+    length: float = 0.0  # interval length, seconds
+    _layout: tuple = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def unit_magnitude(self):
+        return int(math.floor(math.log2(self.lowest)))
+
+    @property
+    def sub_bucket_half_count_magnitude(self):
+        largest_single_unit = 2 * 10**self.sig_figs
+        return max(int(math.ceil(math.log2(largest_single_unit))), 1) - 1
+
+    def counts_len(self, highest=None):
+        highest = self.highest if highest is None else highest
+        sub_bucket_count = 1 << (self.sub_bucket_half_count_magnitude + 1)
+        smallest_untrackable = sub_bucket_count << self.unit_magnitude
+        buckets = 1
+        while smallest_untrackable <= highest:
+            if smallest_untrackable > (1 << 62):
+                buckets += 1
+                break
+            smallest_untrackable <<= 1
+            buckets += 1
+        return (buckets + 1) * (sub_bucket_count // 2)
+
+    def layout(self):
+        """(lowest, highest) equivalent value of every bucket"""
+        if self._layout is None or len(self._layout[0]) != len(self.counts):
+            half_mag = self.sub_bucket_half_count_magnitude
+            half_count = 1 << half_mag
+            index = np.arange(len(self.counts), dtype=np.int64)
+            bucket = (index >> half_mag) - 1
+            sub_bucket = (index & (half_count - 1)) + half_count
+            first = bucket < 0
+            sub_bucket[first] -= half_count
+            bucket[first] = 0
+            shift = bucket + self.unit_magnitude
+            lowest = sub_bucket << shift
+            self._layout = (lowest, lowest + (np.int64(1) << shift) - 1)
+        return self._layout
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def config(self):
+        return self.lowest, self.sig_figs, self.scale
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        if self.config() != other.config():
+            raise Exception("incompatible histograms: ", self.config(), other.config())
+        n = max(len(self.counts), len(other.counts))
+        counts = np.zeros(n, dtype=np.int64)
+        counts[: len(self.counts)] += self.counts
+        counts[: len(other.counts)] += other.counts
+        starts = [t for t in (self.start, other.start) if not math.isnan(t)]
+        ends = [h.start + h.length for h in (self, other) if not math.isnan(h.start)]
+        return Histogram(
+            lowest=self.lowest,
+            highest=max(self.highest, other.highest),
+            sig_figs=self.sig_figs,
+            counts=counts,
+            scale=self.scale,
+            start=min(starts) if starts else math.nan,
+            length=max(ends) - min(starts) if starts else 0.0,
+        )
+
+    def value_at_percentile(self, percentile):
+        """
+        Recorded value at `percentile` (0-100, scalar or array) in microseconds,
+        the highest equivalent value of the bucket, as hdr_value_at_percentile.
+        """
+        percentile = np.minimum(np.asarray(percentile, dtype=np.float64), 100.0)
+        lowest, highest = self.layout()
+        cumulative = np.cumsum(self.counts)
+        if cumulative[-1] == 0:
+            return np.zeros_like(percentile)
+        count_at = np.maximum((percentile / 100 * cumulative[-1] + 0.5).astype(np.int64), 1)
+        index = np.searchsorted(cumulative, count_at, side="left")
+        value = np.where(percentile == 0, lowest[index], highest[index])
+        return value / self.scale
+
+    def mean(self):
+        """mean in microseconds, using the median equivalent value of buckets as hdr_mean"""
+        total = self.total
+        if total == 0:
+            return 0.0
+        lowest, highest = self.layout()
+        median = lowest + (highest - lowest + 1) // 2
+        return float((median * self.counts).sum() / total / self.scale)
+
+    def max(self):
+        nonzero = np.flatnonzero(self.counts)
+        return self.layout()[1][nonzero[-1]] / self.scale if len(nonzero) else 0.0
+
+    def cdf(self):
+        """(values in microseconds, cumulative fraction) of the non-empty buckets"""
+        nonzero = np.flatnonzero(self.counts)
+        cumulative = np.cumsum(self.counts[nonzero])
+        total = max(int(cumulative[-1]) if len(cumulative) else 0, 1)
+        return self.layout()[1][nonzero] / self.scale, cumulative / total
+
+
+def decode(encoded: str, scale: float = 1.0) -> Histogram:
+    blob = base64.b64decode(encoded)
+    cookie, length = COMPRESSION_HEADER.unpack_from(blob)
+    if cookie_base(cookie) != V2_COMPRESSION_COOKIE:
+        raise Exception("unsupported histogram compression: ", hex(cookie))
+    data = zlib.decompress(blob[COMPRESSION_HEADER.size : COMPRESSION_HEADER.size + length])
+    cookie, payload_len, offset, sig_figs, lowest, highest, _ = ENCODING_HEADER.unpack_from(data)
+    if cookie_base(cookie) != V2_ENCODING_COOKIE:
+        raise Exception("unsupported histogram encoding: ", hex(cookie))
+    h = Histogram(lowest=lowest, highest=highest, sig_figs=sig_figs, counts=np.zeros(0, dtype=np.int64), scale=scale)
+    payload = data[ENCODING_HEADER.size : ENCODING_HEADER.size + payload_len]
+    counts = decode_counts(payload, h.counts_len())
+    # counts are stored in the normalized order of the recording histogram
+    h.counts = np.roll(counts, offset) if offset else counts
+    return h
+
+
+def read_log(lines: Iterable[str]) -> List[Histogram]:
+    scale = 1.0
+    intervals = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#"):
+            if match := pat_scale.match(line):
+                scale = float(match["scale"])
+            continue
+        if not line or line.startswith('"'):
+            continue
+        fields = line.split(",")
+        if fields[0].startswith("Tag="):
+            fields = fields[1:]
+        start, length, _max, encoded = fields
+        h = decode(encoded, scale)
+        h.start, h.length = float(start), float(length)
+        intervals.append(h)
+    return intervals
+
+
+def merge(histograms: Iterable[Histogram]) -> Histogram:
+    merged = None
+    for h in histograms:
+        merged = h if merged is None else merged.merge(h)
+    if merged is None:
+        raise Exception("no histograms to merge")
+    return merged
+
+
+def load(*paths) -> Histogram:
+    """all intervals of all logs at `paths`, merged into one histogram"""
+
+    def histograms():
+        for path in paths:
+            with open(path, "r", encoding="utf8") as f:
+                yield from read_log(f)
+
+    return merge(histograms())
+
+
+@register("hdr")
+def parse_hdr(lines):
+    h = merge(read_log(lines))
+    p90, p95, p99 = h.value_at_percentile([90, 95, 99])
+    yield {
+        "lat_avg_us": h.mean(),
+        "lat_p90_us": float(p90),
+        "lat_p95_us": float(p95),
+        "lat_p99_us": float(p99),
+    }
@@ -0,0 +1,45 @@
+"""
+LSMTree client output (ae/lsmtree/*/client.cpp), either a raw client log or a
+report with one "<system> running" line before each run.
+"""
+
+import re
+
+from .registry import register
+
+pat_system = re.compile(r"(?P<system>\w+) running$")
+pat_start = re.compile(r"Send Interval = (?P<interval>[^(]+)\(us\)")
+# execution time: 2301513, throughput: 21724.4
+pat_exec = re.compile(r"execution time: (?P<duration>\d+), throughput: (?P<throughput>.+)")
+# avg: 45.2 us, p90: 50 us, p95: 60 us, p99: 122 us
+pat_latency = re.compile(r"avg: (?P<avg>[^ ]+) us, p90: (?P<p90>[^ ]+) us, p95: (?P<p95>[^ ]+) us, p99: (?P<p99>[^ ]+) us")
+
+
+@register("lsmtree")
+def parse_lsmtree(lines):
+    system, item, latency = None, None, None
+
+    def current():
+        return {} if system is None else {"system": system}
+
+    for line in lines:
+        if (match := pat_system.match(line)) or pat_start.match(line):
+            if item:
+                yield item
+            item, latency = None, None
+            if match:
+                system = match["system"]
+        elif match := pat_exec.search(line):
+            item = current() if item is None else item
+            item["duration_ms"] = float(match["duration"]) / 1000
+            item["throughput"] = float(match["throughput"])
+        elif line.startswith("latency_"):
+            latency = line.strip()
+        elif (match := pat_latency.match(line)) and latency == "latency_req":
+            item = current() if item is None else item
+            item["lat_avg_us"] = float(match["avg"])
+            item["lat_p90_us"] = float(match["p90"])
+            item["lat_p95_us"] = float(match["p95"])
+            item["lat_p99_us"] = float(match["p99"])
+    if item:
+        yield item
@@ -0,0 +1,183 @@
+"""
+Memory status logs written by profile-mem.cpp
+
+Logs are binary records with CLOCK_MONOTONIC timestamps (us), so samples of
+several processes on the same host can be aligned on a common clock. Each
+sample has the RSS and the memory of the components of the runtime, e.g. the
+log buffers (see the format in profile-mem.cpp).
+
+Older builds wrote text logs, which are still read:
+    <us> # start
+    <us> VmRSS:     1234 kB
+    <us> # stop
+and before them bare VmRSS lines, sampled every millisecond.
+"""
+
+import re
+import struct
+from array import array
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, List, Optional
+
+import numpy as np
+
+from .registry import register
+
+pat_rss = re.compile(r"(?:(?P<ts>\d+) )?VmRSS:\s+(?P<rss>\d+) kB")
+pat_mark = re.compile(r"(?P<ts>\d+) # (?P<mark>\w+)")
+
+# sampling interval of logs without timestamps
+LEGACY_INTERVAL_US = 1000
+
+
+@dataclass
+class MemorySeries:
+    t_us: np.ndarray  # int64, monotonic timestamps
+    rss_kb: np.ndarray  # int64
+    start_us: Optional[int] = None  # the run phase, between start() and stop()
+    stop_us: Optional[int] = None
+    timestamped: bool = True
+    # name -> int64 kB of each sample, 0 where the component was not sampled
+    components: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def run_phase(self):
+        start = self.start_us if self.start_us is not None else self.t_us[0]
+        stop = self.stop_us if self.stop_us is not None else self.t_us[-1]
+        return int(start), int(stop)
+
+
+def read_series(lines) -> MemorySeries:
+    t_us, rss_kb = array("q"), array("q")
+    marks = {}
+    timestamped = True
+    for line in lines:
+        if match := pat_rss.match(line):
+            if match["ts"] is None:
+                timestamped = False
+                t_us.append(len(t_us) * LEGACY_INTERVAL_US)
+            else:
+                t_us.append(int(match["ts"]))
+            rss_kb.append(int(match["rss"]))
+        elif match := pat_mark.match(line):
+            marks.setdefault(match["mark"], int(match["ts"]))
+    if len(t_us) == 0:
+        raise Exception("no memory samples")
+    return MemorySeries(
+        t_us=np.frombuffer(t_us, dtype=np.int64),
+        rss_kb=np.frombuffer(rss_kb, dtype=np.int64),
+        start_us=marks.get("start"),
+        stop_us=marks.get("stop"),
+        timestamped=timestamped,
+    )
+
+
+MAGIC = b"ORTHMEM1"
+RECORD_HEAD = struct.Struct("<IIq")  # type, size, monotonic us
+RECORD_MARK, RECORD_COMPONENTS, RECORD_SAMPLE = 1, 2, 3
+
+
+def read_binary_series(data: bytes) -> MemorySeries:
+    t_us, rss_kb = array("q"), array("q")
+    components: Dict[str, array] = {}
+    names: List[str] = []
+    marks = {}
+    offset = len(MAGIC)
+    while offset + RECORD_HEAD.size <= len(data):
+        kind, size, ts = RECORD_HEAD.unpack_from(data, offset)
+        offset += RECORD_HEAD.size
+        payload = data[offset : offset + size]
+        offset += size
+        if len(payload) < size:
+            break  # truncated by a crash
+        if kind == RECORD_MARK:
+            marks.setdefault(payload.decode(), ts)
+        elif kind == RECORD_COMPONENTS:
+            names = [name.decode() for name in payload.split(b"\0")[:-1]]
+        elif kind == RECORD_SAMPLE:
+            values = struct.unpack_from(f"<{size // 8}Q", payload)
+            for name in names:
+                components.setdefault(name, array("q", bytes(8 * len(t_us))))
+            t_us.append(ts)
+            rss_kb.append(values[0] // 1024)
+            sampled = dict(zip(names, values[1:]))
+            for name, column in components.items():
+                column.append(sampled.get(name, 0) // 1024)
+    if len(t_us) == 0:
+        raise Exception("no memory samples")
+    return MemorySeries(
+        t_us=np.frombuffer(t_us, dtype=np.int64),
+        rss_kb=np.frombuffer(rss_kb, dtype=np.int64),
+        start_us=marks.get("start"),
+        stop_us=marks.get("stop"),
+        components={name: np.frombuffer(column, dtype=np.int64) for name, column in components.items()},
+    )
+
+
+def read_file(f: BinaryIO) -> MemorySeries:
+    data = f.read()
+    if data.startswith(MAGIC):
+        return read_binary_series(data)
+    return read_series(data.decode("utf8", errors="replace").splitlines())
+
+
+def load_series(path) -> MemorySeries:
+    with open(path, "rb") as f:
+        return read_file(f)
+
+
+def combine(
+    series: List[MemorySeries],
+    step_us: int = 1000,
+    warmup_us: int = 0,
+    teardown_us: int = 0,
+    component: Optional[str] = None,
+):
+    """
+    Total RSS of processes running together, sampled every `step_us` on their
+    common clock. A process holds its latest sample and counts as 0 outside
+    its lifetime. Only the run phase shared by all processes is kept, without
+    its first `warmup_us` and last `teardown_us`.
+    With `component`, the total of that component instead of the RSS.
+    Returns (timestamps relative to the run phase in seconds, kB).
+    """
+    if not all(s.timestamped for s in series):
+        # no common clock, align the first samples of all processes
+        series = [
+            MemorySeries(s.t_us - s.t_us[0], s.rss_kb, timestamped=False, components=s.components) for s in series
+        ]
+    phases = [s.run_phase() for s in series]
+    begin = max(start for start, _ in phases) + warmup_us
+    end = min(stop for _, stop in phases) - teardown_us
+    if end < begin:
+        raise Exception("empty run phase")
+    grid = np.arange(begin, end + 1, step_us, dtype=np.int64)
+    total = np.zeros(len(grid), dtype=np.int64)
+    for s in series:
+        if component is None:
+            values = s.rss_kb
+        elif component in s.components:
+            values = s.components[component]
+        else:
+            continue
+        idx = np.searchsorted(s.t_us, grid, side="right") - 1
+        alive = (idx >= 0) & (grid <= s.t_us[-1])
+        total[alive] += values[idx[alive]]
+    return (grid - begin) / 1e6, total
+
+
+def summarize(rss_kb: np.ndarray):
+    p50, p95, p99 = np.percentile(rss_kb, [50, 95, 99])
+    return {
+        "peak": int(rss_kb.max()),
+        "mean": float(rss_kb.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+    }
+
+
+@register("memory", binary=True)
+def parse_memory(f):
+    _, rss_kb = combine([read_file(f)])
+    stats = summarize(rss_kb)
+    yield {"rss_peak_kb": stats["peak"], "rss_avg_kb": stats["mean"]}
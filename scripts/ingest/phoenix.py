@@ -0,0 +1,24 @@
+"""
+Phoenix throughput report, "<system> running" followed by the "Time taken"
+line of that run.
+"""
+
+import re
+
+from .registry import register
+
+pat_system = re.compile(r"(?P<system>\w+) running$")
+pat_time = re.compile(r".*Time taken: (?P<duration>\d+) ms")
+
+
+@register("phoenix")
+def parse_phoenix(lines):
+    system = None
+    for line in lines:
+        if match := pat_system.match(line):
+            system = match["system"]
+        elif match := pat_time.match(line):
+            item = {"duration_ms": float(match["duration"])}
+            if system is not None:
+                item["system"] = system
+            yield item
@@ -0,0 +1,51 @@
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+from .table import ResultTable
+
+# format name -> parser(source) yielding one dict per measurement point, the
+# source is the lines of the log, or the log opened in binary mode for the
+# parsers registered with `binary`
+FORMATS: Dict[str, Callable[[Union[Iterator[str], BinaryIO]], Iterator[Dict]]] = {}
+
+
+def register(name: str, binary: bool = False):
+    """a `binary` parser is given the log opened in binary mode instead of its lines"""
+
+    def wrapper(parser):
+        if name in FORMATS:
+            raise Exception("duplicated log format: ", name)
+        parser.binary = binary
+        FORMATS[name] = parser
+        return parser
+
+    return wrapper
+
+
+def parse(fmt: str, path, bench: str = "", system: Optional[str] = None) -> ResultTable:
+    """
+    Parse the log at `path` with the parser of `fmt`.
+    `system` fills the rows that do not name their system in the log itself.
+    """
+    parser = FORMATS[fmt]
+
+    def rows():
+        if parser.binary:
+            f = open(Path(path), "rb")
+        else:
+            f = open(Path(path), "r", encoding="utf8", errors="replace")
+        with f:
+            source = f if parser.binary else (line.rstrip("\n") for line in f)
+            for point, row in enumerate(parser(source)):
+                row.setdefault("point", point)
+                row.setdefault("bench", bench)
+                if system is not None:
+                    row.setdefault("system", system)
+                yield row
+
+    return ResultTable.from_rows(rows())
+
+
+def parse_all(fmt: str, paths: Dict[str, str], bench: str = "") -> ResultTable:
+    """parse one log per system, `paths` maps system name to log path"""
+    return ResultTable.concat([parse(fmt, path, bench, system) for system, path in paths.items()])
@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# name, dtype
+# latencies are in microseconds, memory in kB
+FIELDS = [
+    ("bench", "U16"),
+    ("system", "U16"),
+    ("task", "U32"),
+    ("point", "i4"),
+    ("rps", "f8"),
+    ("throughput", "f8"),
+    ("duration_ms", "f8"),
+    ("lat_avg_us", "f8"),
+    ("lat_p90_us", "f8"),
+    ("lat_p95_us", "f8"),
+    ("lat_p99_us", "f8"),
+    ("rss_peak_kb", "f8"),
+    ("rss_avg_kb", "f8"),
+]
+
+DTYPE = np.dtype(FIELDS)
+
+DEFAULTS = {
+    name: ("" if np.dtype(dtype).kind == "U" else -1 if np.dtype(dtype).kind == "i" else np.nan)
+    for name, dtype in FIELDS
+}
+
+
+class ResultTable:
+    """
+    Columnar table of measurement points, backed by a numpy structured array.
+    Missing values are NaN (float columns), -1 (int columns) or "".
+    """
+
+    def __init__(self, data: np.ndarray = None):
+        self.data = np.empty(0, dtype=DTYPE) if data is None else data
+
+    @staticmethod
+    def from_rows(rows: Iterable[Dict]) -> "ResultTable":
+        records = [tuple(row.get(name, DEFAULTS[name]) for name, _ in FIELDS) for row in rows]
+        return ResultTable(np.array(records, dtype=DTYPE))
+
+    @staticmethod
+    def concat(tables: List["ResultTable"]) -> "ResultTable":
+        return ResultTable(np.concatenate([t.data for t in tables] + [np.empty(0, dtype=DTYPE)]))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.data[name]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def select(self, **conditions) -> "ResultTable":
+        mask = np.ones(len(self.data), dtype=bool)
+        for name, value in conditions.items():
+            mask &= self.data[name] == value
+        return ResultTable(self.data[mask])
+
+    def sort(self, *names: str) -> "ResultTable":
+        return ResultTable(np.sort(self.data, order=list(names)))
+
+    def value(self, name: str, **conditions):
+        """the single value of `name` in the rows matching `conditions`"""
+        column = self.select(**conditions)[name]
+        if len(column) != 1:
+            raise Exception(f"expected one row for {conditions}, found {len(column)}")
+        return column[0].item()
+
+    def to_dicts(self) -> List[Dict]:
+        return [{name: row[name].item() for name, _ in FIELDS} for row in self.data]
@@ -12,8 +12,6 @@ NAME=$2     # lsmtree, mastress, etc
 VERSION=$3  # scee, raw, rbv
 LOG=${NAME}-latency_vs_pXX-${VERSION}.log
 
-just build
-
 echo > $LOG
 
 for i in  `seq 10 7000 300000`; do
@@ -1,119 +1,68 @@
-import os
-import re
-import json
+"""
+Memory usage of Vanilla, Orthrus and RBV
+
+Samples of several processes of one system (e.g. RBV primary and replica) are
+aligned on their common clock and summed, warm-up and teardown are excluded.
+"""
+
 import argparse
-from typing import List, Dict, Any
 from pathlib import Path
-from toolz.curried import map, compose, pipe, take, reduce, filter
-from toolz.recipes import partitionby
 
+import numpy as np
+
+from ingest.memory import load_series, combine, summarize
 
 
 parser = argparse.ArgumentParser()
-parser.add_argument("--input-raw", required=True, help="lsmtree-memory_status-raw.log")
-parser.add_argument("--input-scee", required=True, help="lsmtree-memory_status-scee.log")
+parser.add_argument("--input-raw", required=True, action="append", help="lsmtree-memory_status-raw.log")
+parser.add_argument("--input-scee", required=True, action="append", help="lsmtree-memory_status-scee.log")
 parser.add_argument("--input-rbv", required=True, action="append", help="lsmtree-memory_status-rbv.log")
+parser.add_argument("--warmup", type=float, default=0, help="seconds excluded after profile start")
+parser.add_argument("--teardown", type=float, default=0, help="seconds excluded before profile stop")
+parser.add_argument("--step", type=float, default=1, help="resampling interval in milliseconds")
+parser.add_argument("--plot", help="save RSS over time to this file")
 
 args = parser.parse_args()
 
-raw_mem = Path(args.input_raw)
-scee_mem = Path(args.input_scee)
-
-rbv_mems = [Path(x) for x in args.input_rbv]
-
-# DIVISION_MARK = "---- started ----"
-
-def parser(mem: Path):
-    pat = re.compile(r"VmRSS:\s+(\d+) kB")
-
-    def process(line):
-        matches = pat.match(line)
-        if not matches:
-            print("="*10)
-            print(line)
-            return None
-        # print(matches[1])
-        ret = int(matches[1])
-        return ret
-
-    with open(mem, "r", encoding="utf8") as f:
-        data: List[str] = f.read().splitlines()
-
-    # tmp = partitionby(lambda x: x == DIVISION_MARK, data)
-    # tmp = list(tmp)
-    # init_stage = tmp[0]
-    # run_stage = tmp[2]
-
-    run_stage = data
-
-    f = compose(
-        map(lambda x: process(x)),
-        filter(lambda x: x),
-    )
-
-    # init_stage_parsed = list(f(init_stage))
-    run_stage_parsed = list(f(run_stage))
-    # max_init_stage_mem = max(init_stage_parsed)
-    max_run_stage_mem = max(run_stage_parsed)
-    avg_run_stage_mem = sum(run_stage_parsed) // len(run_stage_parsed)
-
-    # print("max mem init: ", max_init_stage_mem)
-    print("max mem run : ", max_run_stage_mem)
-    # print("mem max diff usage:    ", max_run_stage_mem - max_init_stage_mem)
-    # print("mem avg diff usage:    ", avg_run_stage_mem - max_init_stage_mem)
-    return (
-        # max_init_stage_mem,
-        max_run_stage_mem,
-        avg_run_stage_mem,
-        # max_run_stage_mem - max_init_stage_mem,
-        # avg_run_stage_mem - max_init_stage_mem,
-    )
-
-
-print("Processing raw")
-(
-    # raw_max_init_mem,
-    raw_max_run_mem,
-    raw_avg_run_mem,
-    # raw_max_diff_mem,
-    # raw_avg_diff_mem,
-) = parser(raw_mem)
-
-print("Processing scee")
-(
-    # scee_max_init_mem,
-    scee_max_run_mem,
-    scee_avg_run_mem,
-    # scee_max_diff_mem,
-    # scee_avg_diff_mem,
-) = parser(scee_mem)
-
-print("Processing rbv")
-rbv_max_run_mem = 0
-rbv_avg_run_mem = 0
-for rbv_mem in rbv_mems:
-    (
-        # rbv_max_init_mem,
-        _rbv_max_run_mem,
-        _rbv_avg_run_mem,
-        # rbv_max_diff_mem,
-        # rbv_avg_diff_mem,
-    ) = parser(rbv_mem)
-    rbv_max_run_mem += _rbv_max_run_mem
-    rbv_avg_run_mem += _rbv_avg_run_mem
+SYSTEMS = {
+    "Vanilla": args.input_raw,
+    "Orthrus": args.input_scee,
+    "RBV": args.input_rbv,
+}
+
+data = {}
+for system, inputs in SYSTEMS.items():
+    print(f"Processing {system}")
+    series = [load_series(Path(x)) for x in inputs]
+    window = dict(step_us=int(args.step * 1000), warmup_us=int(args.warmup * 1e6), teardown_us=int(args.teardown * 1e6))
+    t, rss = combine(series, **window)
+    stats = summarize(rss)
+    print("  " + ", ".join(f"{k}: {v:.0f} kB" for k, v in stats.items()))
+    # memory of the runtime components, in logs of builds that sample them
+    for component in sorted({name for s in series for name in s.components}):
+        _, kb = combine(series, component=component, **window)
+        print(f"  {component}: mean {kb.mean():.0f} kB, peak {kb.max():.0f} kB")
+    data[system] = (t, rss, stats)
 
 
 diff = lambda a, b: a / b
 
-print("-"*10, " results(peak) ", "-"*10)
-print("ratio (Orthrus vs Vanilla): ", diff(scee_max_run_mem, raw_max_run_mem))
-print("ratio (RBV vs Vanilla):     ", diff(rbv_max_run_mem, raw_max_run_mem))
-
-print("-"*10, " results(avg) ", "-"*10)
-print("ratio (Orthrus vs Vanilla): ", diff(scee_avg_run_mem, raw_avg_run_mem))
-print("ratio (RBV vs Vanilla):     ", diff(rbv_avg_run_mem, raw_avg_run_mem))
-
-# print("-"*10, " results(peak run) ", "-"*10)
-# print("ratio (RBV vs Vanilla):     ", diff(rbv_max_run_mem, raw_max_run_mem))
-# print("ratio (Orthrus vs Vanilla): ", diff(scee_max_run_mem, raw_max_run_mem))
-# print("ratio (Orthrus vs RBV):     ", diff(rbv_max_run_mem, scee_max_run_mem))
+for metric in ["peak", "mean", "p50", "p95", "p99"]:
+    print("-" * 10, f" results({metric}) ", "-" * 10)
+    raw = data["Vanilla"][2][metric]
+    print("ratio (Orthrus vs Vanilla): ", diff(data["Orthrus"][2][metric], raw))
+    print("ratio (RBV vs Vanilla):     ", diff(data["RBV"][2][metric], raw))
+
+if args.plot:
+    import matplotlib.pyplot as plt
+
+    COLORS = ["#9CB3D4", "#D6851C", "#3D8E84"]
+    fig, ax = plt.subplots(figsize=(8, 4))
+    for (system, (t, rss, _)), color in zip(data.items(), COLORS):
+        ax.plot(t, rss / 1024, color=color, label=system)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("RSS (MiB)")
+    ax.set_ylim((0, None))
+    ax.legend()
+    fig.tight_layout()
+    plt.savefig(args.plot)
@@ -0,0 +1,60 @@
+"""
+Change the validation settings of a running Orthrus process
+
+Talks to the control socket of a process started with SCEE_CTL (control.cpp).
+A change applies to the next validated log, the process logs it to stderr.
+
+Example:
+    SCEE_CTL=1 ./build/ae/memcached/memcached_orthrus 12345 &
+    python3 scripts/orthrus-ctl.py $! set rate=5          # shed validation
+    python3 scripts/orthrus-ctl.py $! set method=window rate=20 max_cores=2
+    python3 scripts/orthrus-ctl.py $! reload              # back to sampling.config
+    python3 scripts/orthrus-ctl.py $! get
+"""
+
+import sys
+import json
+import socket
+import argparse
+from pathlib import Path
+
+
+def socket_path(target: str):
+    if target.isdigit():
+        return f"/tmp/orthrus-ctl-{target}.sock"
+    return target
+
+
+def request(path: str, command: str):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(command.encode() + b"\n")
+        with sock.makefile("r", encoding="utf8") as f:
+            return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Change the validation settings of a running Orthrus process")
+    parser.add_argument("target", help="pid (with SCEE_CTL=1) or socket path")
+    parser.add_argument("command", choices=["get", "set", "reload"])
+    parser.add_argument("settings", nargs="*", help="method=random|window rate=<percentage> max_cores=<n>")
+    args = parser.parse_args()
+    if args.command == "set" and not args.settings:
+        parser.error("set needs at least one setting")
+
+    path = socket_path(args.target)
+    if not Path(path).exists():
+        sys.exit(f"no control socket {path}, is the process running with SCEE_CTL set?")
+    reply = request(path, " ".join([args.command, *args.settings]))
+    if not reply["ok"]:
+        sys.exit(f"error: {reply['error']}")
+    config = reply["config"]
+    print(f"method:         {config['method']}")
+    print(f"rate:           {config['rate']:.2f}%")
+    if config["controller"]:
+        print(f"effective rate: {config['effective_rate']:.2f}% (validation controller)")
+    print(f"max cores:      {config['max_cores'] or 'unlimited'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Live validation telemetry of a running Orthrus process
+
+Attaches to the telemetry socket of a process started with PROFILE_TELEMETRY
+(profile.cpp) and shows, for every interval, the validation and skip rates,
+the CPU spent in validation (in validator cores), the validation latency
+percentiles, the depth of the log queue of each application thread and the
+other gauges, e.g. the decisions of the validation controller.
+
+Example:
+    PROFILE_TELEMETRY=1 ./build/ae/memcached/memcached_orthrus 12345 &
+    python3 scripts/orthrus-top.py $!
+"""
+
+import sys
+import json
+import socket
+import argparse
+from collections import deque
+from pathlib import Path
+
+
+def socket_path(target: str):
+    if target.isdigit():
+        return f"/tmp/orthrus-telemetry-{target}.sock"
+    return target
+
+
+def snapshots(path: str):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        with sock.makefile("r", encoding="utf8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+QUEUE_GAUGE = "log_queue."
+
+
+def interval_row(prev, cur):
+    """rates of the interval between two snapshots"""
+    seconds = cur["interval_us"] / 1e6
+    logs = cur["validations"] - prev["validations"]
+    skipped = cur["skipped"] - prev["skipped"]
+    cycles = cur["validation_cycles"] - prev["validation_cycles"]
+    depths = [depth for name, depth in cur["gauges"].items() if name.startswith(QUEUE_GAUGE)]
+    lat = cur["latency_us"]
+    return {
+        "logs/s": logs / seconds,
+        "skipped/s": skipped / seconds,
+        "skip%": 100 * skipped / logs if logs else 0.0,
+        "cores": cycles / cur["cpu_mhz"] / cur["interval_us"],
+        "p50": lat["p50"],
+        "p99": lat["p99"],
+        "p99.9": lat["p999"],
+        "max": lat["max"],
+        "queued": sum(depths),
+        "max queue": max(depths, default=0),
+    }
+
+
+# name, width, format
+COLUMNS = [
+    ("logs/s", 12, ".0f"),
+    ("skipped/s", 11, ".0f"),
+    ("skip%", 7, ".1f"),
+    ("cores", 7, ".2f"),
+    ("p50", 8, "d"),
+    ("p99", 8, "d"),
+    ("p99.9", 8, "d"),
+    ("max", 9, "d"),
+    ("queued", 8, "d"),
+    ("max queue", 10, "d"),
+]
+
+HEADER = "".join(f"{name:>{width}}" for name, width, _ in COLUMNS)
+
+
+def format_row(row):
+    return "".join(f"{row[name]:>{width}{fmt}}" for name, width, fmt in COLUMNS)
+
+
+def draw(cur, rows, args):
+    lines = [
+        f"pid {cur['pid']}  validations {cur['validations']}  skipped {cur['skipped']}  "
+        f"interval {cur['interval_us'] / 1e3:.0f} ms  (latencies in us)"
+        + (f"  log {cur['log_bytes'] / cur['logs']:.0f} B/log" if cur.get("logs") else ""),
+        "  ".join(f"{name}={value}" for name, value in cur["gauges"].items() if not name.startswith(QUEUE_GAUGE)),
+        "",
+        HEADER,
+        *[format_row(row) for row in rows],
+        "",
+        f"{'log queue':<24}{'depth':>8}",
+    ]
+    queues = sorted(((n, d) for n, d in cur["gauges"].items() if n.startswith(QUEUE_GAUGE)), key=lambda kv: -kv[1])
+    lines += [f"{name:<24}{depth:>8}" for name, depth in queues[: args.queues]]
+    if len(queues) > args.queues:
+        lines.append(f"... {len(queues) - args.queues} more")
+    # home, clear screen
+    sys.stdout.write("\033[H\033[2J" + "\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live validation telemetry of an Orthrus process")
+    parser.add_argument("target", help="pid (with PROFILE_TELEMETRY=1) or socket path")
+    parser.add_argument("--rows", type=int, default=20, help="intervals shown")
+    parser.add_argument("--queues", type=int, default=16, help="log queues shown, deepest first")
+    parser.add_argument("-n", "--count", type=int, help="exit after this many intervals")
+    parser.add_argument("--json", action="store_true", help="print the raw snapshots, one per line")
+    args = parser.parse_args()
+
+    path = socket_path(args.target)
+    if not Path(path).exists():
+        sys.exit(f"no telemetry socket {path}, is the process running with PROFILE_TELEMETRY set?")
+    interactive = sys.stdout.isatty() and not args.json
+    rows = deque(maxlen=args.rows)
+    prev, n = None, 0
+    try:
+        for cur in snapshots(path):
+            if args.json:
+                print(json.dumps(cur), flush=True)
+            elif prev is not None:
+                rows.append(interval_row(prev, cur))
+                if interactive:
+                    draw(cur, rows, args)
+                else:
+                    if n == 1:
+                        print(HEADER)
+                    print(format_row(rows[-1]), flush=True)
+            prev, n = cur, n + 1
+            if args.count is not None and n > args.count:
+                break
+    except KeyboardInterrupt:
+        pass
+    except ConnectionError as e:
+        sys.exit(f"telemetry connection lost: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Print the measurement points parsed from evaluation logs
+
+Example:
+    python3 scripts/parse-results.py --format evaluation --bench memcached \
+        --log vanilla=temp/memcached-throughput-client-vanilla.log \
+        --log orthrus=temp/memcached-throughput-client-orthrus.log
+"""
+
+import sys
+import argparse
+
+from ingest import FORMATS, ResultTable, parse
+
+# name, width, format
+COLUMNS = [
+    ("system", 10, "<"),
+    ("task", 18, "<"),
+    ("rps", 10, ">.0f"),
+    ("throughput", 12, ">.1f"),
+    ("duration_ms", 12, ">.1f"),
+    ("lat_avg_us", 11, ">.2f"),
+    ("lat_p90_us", 11, ">.2f"),
+    ("lat_p95_us", 11, ">.2f"),
+    ("lat_p99_us", 11, ">.2f"),
+    ("rss_peak_kb", 12, ">.0f"),
+    ("rss_avg_kb", 12, ">.0f"),
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--format", required=True, choices=sorted(FORMATS))
+parser.add_argument("--bench", default="")
+parser.add_argument("--log", required=True, action="append", help="[system=]path, the system may be named in the log")
+parser.add_argument("-o", "--output", help="write the report to a file instead of stdout")
+
+args = parser.parse_args()
+
+tables = []
+for log in args.log:
+    system, path = log.split("=", 1) if "=" in log else (None, log)
+    tables.append(parse(args.format, path, args.bench, system))
+table = ResultTable.concat(tables)
+
+# only print columns with values
+columns = [(name, width, fmt) for name, width, fmt in COLUMNS if any(v == v and v != "" for v in table[name])]
+
+fout = open(args.output, "w") if args.output else sys.stdout
+print(" ".join(f"{name:{fmt[0]}{width}}" for name, width, fmt in columns), file=fout)
+for row in table:
+    print(" ".join(f"{row[name].item():{fmt[0]}{width}{fmt[1:]}}" for name, width, fmt in columns), file=fout)
+if args.output:
+    fout.close()
@@ -0,0 +1,278 @@
+"""
+Incremental result generation
+
+Every parse, aggregate and plot step declares its command, inputs (paths or
+globs) and outputs. A step is keyed by the content hash of its command and
+inputs, and runs only when the key changed or an output is missing; a step
+whose inputs were regenerated with the same content is not run again.
+Independent steps run in a process pool. File hashes are cached by size and
+mtime, and the state is kept in results/.pipeline.json.
+
+Usage:
+    python3 scripts/pipeline.py                  # all figures
+    python3 scripts/pipeline.py throughput -j 4  # one step and its dependencies
+    python3 scripts/pipeline.py --list
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+STATE = ROOT / "results" / ".pipeline.json"
+CHUNK_SIZE = 1 << 24
+
+BENCHES = ["memcached", "masstree", "lsmtree", "phoenix"]
+INGEST = ["scripts/ingest/*.py"]
+
+
+@dataclass
+class Step:
+    name: str
+    cmd: List[str]
+    inputs: List[str]  # paths or globs, relative to the repository; a glob may match nothing
+    outputs: List[str]  # files, or directories ending with "/"
+    deps: List[str] = field(default_factory=list)
+
+
+STEPS = [
+    Step(
+        name="extract-fault_injection",
+        cmd=["tar", "-xzf", "datasets/fault_injection.tar.gz", "-C", "results"],
+        inputs=["datasets/fault_injection.tar.gz"],
+        outputs=["results/fault_injection/"],
+    ),
+    *[
+        Step(
+            name=f"fault_injection-{bench}",
+            cmd=["python3", "scripts/fault_injection.py", f"results/fault_injection/{bench}.json"],
+            inputs=["scripts/fault_injection.py", f"results/fault_injection/{bench}.json"],
+            outputs=[f"results/fault_injection/.cache/{bench}/"],
+            deps=["extract-fault_injection"],
+        )
+        for bench in BENCHES
+    ],
+    Step(
+        name="detection-rate",
+        cmd=["python3", "scripts/detection-rate.py"],
+        inputs=["scripts/detection-rate.py", "scripts/fault_injection.py", "results/fault_injection/*.json"],
+        outputs=["results/img/detection-rate.png", "results/img/detection-rate.pdf"],
+        deps=[f"fault_injection-{bench}" for bench in BENCHES],
+    ),
+    *[
+        Step(
+            name=f"throughput-report-{bench}",
+            cmd=[
+                "python3", "scripts/parse-results.py", "--format", "evaluation", "--bench", bench,
+                *[arg for system in ["vanilla", "orthrus", "rbv"]
+                  for arg in ["--log", f"{system}=results/{bench}-throughput-client-{system}.log"]],
+                "-o", f"results/{bench}-throughput-report.txt",
+            ],  # fmt: skip
+            inputs=["scripts/parse-results.py", *INGEST, f"results/{bench}-throughput-client-*.log"],
+            outputs=[f"results/{bench}-throughput-report.txt"],
+        )
+        for bench in ["memcached", "masstree"]
+    ],
+    Step(
+        name="throughput",
+        cmd=["python3", "scripts/throughput.py"],
+        inputs=[
+            "scripts/throughput.py",
+            *INGEST,
+            "results/*-throughput-client-*.log",
+            "results/lsmtree-throughput-report.txt",
+            "results/phoenix-throughput-report.txt",
+        ],
+        outputs=["results/img/throughput.png", "results/img/throughput.pdf"],
+    ),
+    Step(
+        name="tail-latency",
+        cmd=["python3", "scripts/tail-latency.py"],
+        inputs=["scripts/tail-latency.py", *INGEST, "results/*-latency_vs_pXX-*.log"],
+        outputs=["results/img/tail-latency.png", "results/img/tail-latency.pdf"],
+    ),
+    Step(
+        name="validation-latency",
+        cmd=["python3", "scripts/validation-latency.py"],
+        inputs=[
+            "scripts/validation-latency.py",
+            *INGEST,
+            "results/*-validation_latency-*.cdf",
+            "results/*-validation_latency-*.hlog",
+        ],
+        outputs=["results/img/validation-cdf.png", "results/img/validation-cdf.pdf"],
+    ),
+]
+
+
+class HashCache:
+    """content hashes of files, reused while their size and mtime are unchanged"""
+
+    def __init__(self, entries: Dict[str, list]):
+        self.entries = entries
+
+    def file(self, path: Path) -> str:
+        stat = path.stat()
+        rel = str(path.relative_to(ROOT))
+        cached = self.entries.get(rel)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                h.update(chunk)
+        self.entries[rel] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+
+def expand(pattern: str) -> List[Path]:
+    if glob.has_magic(pattern):
+        return sorted(Path(p) for p in glob.glob(str(ROOT / pattern), recursive=True) if Path(p).is_file())
+    path = ROOT / pattern
+    if not path.exists():
+        raise FileNotFoundError(pattern)
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file())
+    return [path]
+
+
+def step_key(step: Step, hashes: HashCache) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([step.cmd, step.outputs]).encode())
+    for pattern in step.inputs:
+        for path in expand(pattern):
+            h.update(str(path.relative_to(ROOT)).encode())
+            h.update(hashes.file(path).encode())
+    return h.hexdigest()
+
+
+def outputs_exist(step: Step):
+    return all((ROOT / out).exists() for out in step.outputs)
+
+
+def execute(step: Step):
+    """runs in a worker process, returns (exit code, output, seconds)"""
+    start = time.monotonic()
+    for out in step.outputs:
+        (ROOT / out).parent.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.run(step.cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return proc.returncode, proc.stdout, time.monotonic() - start
+
+
+def select(steps: Dict[str, Step], targets: List[str]) -> List[str]:
+    """targets (step names or outputs) and their dependencies"""
+    by_output = {out: step.name for step in steps.values() for out in step.outputs}
+    selected, stack = set(), []
+    for target in targets:
+        name = target if target in steps else by_output.get(target)
+        if name is None:
+            raise Exception(f"unknown step or output: {target}")
+        stack.append(name)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(steps[name].deps)
+    return [name for name in steps if name in selected]
+
+
+def load_state():
+    if STATE.exists():
+        with open(STATE, "r", encoding="utf8") as f:
+            return json.load(f)
+    return {"files": {}, "steps": {}}
+
+
+def save_state(state):
+    STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, STATE)
+
+
+def run(names: List[str], steps: Dict[str, Step], jobs: int, force: bool, dry_run: bool):
+    state = load_state()
+    hashes = HashCache(state["files"])
+    pending = list(names)
+    done, failed = set(), set()
+    futures = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or futures:
+            for name in list(pending):
+                step = steps[name]
+                if any(dep in failed for dep in step.deps if dep in names):
+                    pending.remove(name)
+                    failed.add(name)
+                    print(f"[skip] {name}: a dependency failed", flush=True)
+                    continue
+                if not all(dep in done for dep in step.deps if dep in names):
+                    continue
+                pending.remove(name)
+                try:
+                    key = step_key(step, hashes)
+                except FileNotFoundError as e:
+                    failed.add(name)
+                    print(f"[fail] {name}: missing input {e}", flush=True)
+                    continue
+                if not force and state["steps"].get(name) == key and outputs_exist(step):
+                    done.add(name)
+                    print(f"[up to date] {name}", flush=True)
+                    continue
+                if dry_run:
+                    done.add(name)
+                    print(f"[stale] {name}", flush=True)
+                    continue
+                print(f"[run] {name}", flush=True)
+                futures[pool.submit(execute, step)] = (name, key)
+            if not futures:
+                continue
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = futures.pop(future)
+                code, output, seconds = future.result()
+                if code == 0:
+                    done.add(name)
+                    state["steps"][name] = key
+                    print(f"[done] {name} ({seconds:.1f}s)", flush=True)
+                else:
+                    failed.add(name)
+                    state["steps"].pop(name, None)
+                    print(f"[fail] {name} (exit {code})\n{output}", flush=True)
+            save_state(state)
+    save_state(state)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate stale results and figures")
+    parser.add_argument("targets", nargs="*", help="steps or outputs (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="parallel steps")
+    parser.add_argument("-f", "--force", action="store_true", help="run the selected steps even if up to date")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only report stale steps")
+    parser.add_argument("--list", action="store_true", help="list steps and their outputs")
+    args = parser.parse_args()
+
+    steps = {step.name: step for step in STEPS}
+    if args.list:
+        for step in STEPS:
+            print(f"{step.name:<28} {' '.join(step.outputs)}")
+        return
+    names = select(steps, args.targets or list(steps))
+    failed = run(names, steps, max(args.jobs, 1), args.force, args.dry_run)
+    if failed:
+        print("failed: " + " ".join(sorted(failed)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Parallel experiment scheduler
+
+Each run of an experiment (one system of one benchmark, or one point of a
+sweep) is a `Job`: a few processes started one after another, with the number
+of cores, ports and memory they need. Jobs are packed onto disjoint cpusets
+of the host, preferably within one NUMA node and without sharing SMT siblings
+with other jobs, and run at the same time. Ports are allocated without
+collisions. Every job runs in its own directory under temp/jobs/, so files
+written to the working directory (client.log, *.cdf, memory status logs) do
+not clash, and its output is captured in temp/jobs/<job>/run.log.
+
+Outputs are collected once all jobs are done, in job order; outputs of several
+jobs with the same destination (e.g. the points of a sweep) are concatenated.
+
+Usage:
+    python3 scripts/scheduler.py --plan memcached-throughput --plan masstree-memory
+    python3 scripts/scheduler.py --all --dry-run
+"""
+
+import os
+import sys
+import glob
+import time
+import shlex
+import shutil
+import socket
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+JOBS_DIR = ROOT / "temp" / "jobs"
+# linked into the directory of every job, commands use the same relative paths as the just recipes
+SHARED = ["build", "datasets", "sampling.config"]
+PORT_RANGE = (20000, 30000)
+LOG = "@log"
+
+
+@dataclass
+class Proc:
+    cmd: str  # ports of the job are substituted by name, e.g. {port}
+    cpus: int = 0  # dedicated cores, 0 shares the cores of the previous processes
+    delay: float = 1.0  # seconds to wait before starting it
+    quiet: bool = False  # discard its output
+    env: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Job:
+    name: str
+    procs: List[Proc]
+    ports: Dict[str, int] = field(default_factory=dict)  # name -> number of consecutive ports
+    mem_gb: float = 0
+    # file (or glob) in the job directory -> destination, relative to the repository;
+    # LOG is the output of the job, preceded by `header`
+    outputs: Dict[str, str] = field(default_factory=dict)
+    header: Optional[str] = None
+    env: Dict[str, str] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+    @property
+    def cpus(self):
+        return sum(p.cpus for p in self.procs)
+
+    @property
+    def dir(self) -> Path:
+        return JOBS_DIR / self.name
+
+
+def read_cpulist(text: str) -> List[int]:
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def format_cpulist(cpus: List[int]) -> str:
+    ranges, cpus = [], sorted(cpus)
+    for cpu in cpus:
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{lo}-{hi}" if lo != hi else f"{lo}" for lo, hi in ranges)
+
+
+class Topology:
+    """NUMA nodes of the host, as lists of physical cores (lists of SMT siblings)"""
+
+    def __init__(self, reserved: List[int], smt: bool = False):
+        allowed = os.sched_getaffinity(0) - set(reserved)
+        nodes = sorted(glob.glob("/sys/devices/system/node/node[0-9]*"))
+        self.nodes: Dict[int, List[List[int]]] = {}
+        self.mem_gb: Dict[int, float] = {}
+        for node in nodes or [None]:
+            nid = int(node.rsplit("node", 1)[1]) if node else 0
+            if node:
+                cpus = read_cpulist(Path(node, "cpulist").read_text())
+                self.mem_gb[nid] = node_mem_gb(Path(node, "meminfo"))
+            else:
+                cpus = sorted(allowed)
+                self.mem_gb[nid] = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+            cores, seen = [], set()
+            for cpu in cpus:
+                if cpu in seen or cpu not in allowed:
+                    continue
+                siblings = [cpu] if smt else [c for c in smt_siblings(cpu) if c in allowed]
+                seen.update(siblings)
+                cores.append(siblings)
+            if cores:
+                self.nodes[nid] = cores
+
+    @property
+    def ncores(self):
+        return sum(len(cores) for cores in self.nodes.values())
+
+
+def smt_siblings(cpu: int) -> List[int]:
+    path = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+    return read_cpulist(path.read_text()) if path.exists() else [cpu]
+
+
+def node_mem_gb(path: Path) -> float:
+    for line in path.read_text().splitlines():
+        # Node 0 MemTotal:       263846552 kB
+        tokens = line.split()
+        if tokens[2] == "MemTotal:":
+            return int(tokens[3]) / 2**20
+    return 0.0
+
+
+class CpuAllocator:
+    def __init__(self, topo: Topology):
+        self.topo = topo
+        self.free = {nid: list(cores) for nid, cores in topo.nodes.items()}
+        self.mem_free = dict(topo.mem_gb)
+        # memory taken from each node, per allocation
+        self.charged: Dict[tuple, Dict[int, float]] = {}
+
+    def alloc(self, ncores: int, mem_gb: float):
+        """
+        Returns [(node, core)] or None. A job runs within one node (the fullest
+        node it fits in), only jobs larger than any node, in cores or in memory,
+        span the emptiest nodes, with at least one core on each.
+        """
+        fits = [nid for nid, cores in self.free.items() if len(cores) >= ncores and self.mem_free[nid] >= mem_gb]
+        if fits:
+            nid = min(fits, key=lambda n: len(self.free[n]))
+            cores = self.free[nid][:ncores]
+            del self.free[nid][:ncores]
+            self.mem_free[nid] -= mem_gb
+            taken = [(nid, c) for c in cores]
+            self.charged[self.key(taken)] = {nid: mem_gb}
+            return taken
+        if ncores <= max(len(cores) for cores in self.topo.nodes.values()) and mem_gb <= max(self.topo.mem_gb.values()):
+            return None
+        span = []
+        for nid in sorted(self.free, key=lambda n: (-len(self.free[n]), -self.mem_free[n])):
+            if not self.free[nid]:
+                break
+            span.append(nid)
+            if sum(len(self.free[n]) for n in span) >= ncores and sum(self.mem_free[n] for n in span) >= mem_gb:
+                break
+        if len(span) > ncores or sum(len(self.free[n]) for n in span) < ncores or sum(self.mem_free[n] for n in span) < mem_gb:
+            return None
+        # a core on every node of the span, the rest from the emptiest ones
+        counts, rest = {}, ncores - len(span)
+        for nid in span:
+            counts[nid] = 1 + min(rest, len(self.free[nid]) - 1)
+            rest -= counts[nid] - 1
+        taken = []
+        for nid in span:
+            taken.extend((nid, c) for c in self.free[nid][: counts[nid]])
+            del self.free[nid][: counts[nid]]
+        charges, rest = {}, mem_gb
+        for nid in sorted(span, key=lambda n: -self.mem_free[n]):
+            charges[nid] = min(rest, self.mem_free[nid])
+            self.mem_free[nid] -= charges[nid]
+            rest -= charges[nid]
+        self.charged[self.key(taken)] = charges
+        return taken
+
+    @staticmethod
+    def key(taken):
+        return tuple((nid, tuple(core)) for nid, core in taken)
+
+    def release(self, taken):
+        for nid, core in taken:
+            self.free[nid].append(core)
+            self.free[nid].sort()
+        for nid, charge in self.charged.pop(self.key(taken)).items():
+            self.mem_free[nid] += charge
+
+
+class PortAllocator:
+    def __init__(self, lo=PORT_RANGE[0], hi=PORT_RANGE[1]):
+        self.lo, self.hi = lo, hi
+        self.next = lo
+        self.used = set()
+
+    @staticmethod
+    def available(port: int):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind(("0.0.0.0", port))
+                return True
+            except OSError:
+                return False
+
+    def alloc(self, span: int) -> int:
+        """base of `span` consecutive ports, neither used by other jobs nor bound on the host"""
+        for _ in range(self.hi - self.lo):
+            base = self.next
+            self.next = base + 1 if base + span < self.hi else self.lo
+            ports = range(base, base + span)
+            if not self.used.intersection(ports) and all(map(self.available, ports)):
+                self.used.update(ports)
+                self.next = base + span if base + 2 * span <= self.hi else self.lo
+                return base
+        raise Exception("no free ports")
+
+    def release(self, base: int, span: int):
+        self.used.difference_update(range(base, base + span))
+
+
+@dataclass
+class Placement:
+    job: Job
+    cores: list  # [(node, [cpu...])]
+    ports: Dict[str, int]
+
+    def cpus_of(self, index: int) -> List[int]:
+        """cpus of the `index`th process, a process without cores shares those of the job"""
+        start = sum(p.cpus for p in self.job.procs[:index])
+        cores = self.cores[start : start + self.job.procs[index].cpus] or self.cores
+        return sorted(cpu for _, siblings in cores for cpu in siblings[:1])
+
+    def describe(self):
+        parts = []
+        for i, proc in enumerate(self.job.procs):
+            parts.append(f"{proc.cmd.split()[0].rsplit('/', 1)[-1]}@{format_cpulist(self.cpus_of(i))}")
+        nodes = sorted({nid for nid, _ in self.cores})
+        ports = " ".join(f"{k}={v}" for k, v in self.ports.items())
+        return f"{self.job.name}: node {','.join(map(str, nodes))} {' '.join(parts)} {ports}".rstrip()
+
+
+def prepare_dir(job: Job):
+    shutil.rmtree(job.dir, ignore_errors=True)
+    job.dir.mkdir(parents=True)
+    for name in SHARED:
+        if (ROOT / name).exists():
+            (job.dir / name).symlink_to(ROOT / name)
+
+
+def run_job(placement: Placement, numa_bind: bool) -> bool:
+    job = placement.job
+    prepare_dir(job)
+    env = {**os.environ, **job.env}
+    nodes = sorted({nid for nid, _ in placement.cores})
+    procs = []
+    ok = True
+    with open(job.dir / "run.log", "w", encoding="utf8") as log:
+        if job.header is not None:
+            print(job.header, file=log, flush=True)
+        try:
+            for i, proc in enumerate(job.procs):
+                time.sleep(proc.delay)
+                cmd = proc.cmd.format(**placement.ports)
+                cpus = placement.cpus_of(i)
+                argv = ["taskset", "-c", format_cpulist(cpus)] + shlex.split(cmd)
+                if numa_bind and len(nodes) == 1:
+                    argv = ["numactl", f"--membind={nodes[0]}"] + argv
+                print(f"Executing {cmd}", file=log, flush=True)
+                out = subprocess.DEVNULL if proc.quiet else log
+                procs.append(
+                    subprocess.Popen(argv, cwd=job.dir, env={**env, **proc.env}, stdout=out, stderr=subprocess.STDOUT)
+                )
+            deadline = None if job.timeout is None else time.monotonic() + job.timeout
+            for p in procs:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                ok &= p.wait(timeout=timeout) == 0
+        except subprocess.TimeoutExpired:
+            print(f"timeout after {job.timeout}s", file=log, flush=True)
+            ok = False
+        finally:
+            for p in procs:
+                if p.poll() is None:
+                    p.kill()
+                    p.wait()
+    return ok
+
+
+class Scheduler:
+    def __init__(self, topo: Topology, numa_bind: bool = False, verbose: bool = True):
+        self.topo = topo
+        self.verbose = verbose
+        self.cpus = CpuAllocator(topo)
+        self.ports = PortAllocator()
+        self.numa_bind = numa_bind and shutil.which("numactl") is not None
+        self.lock = threading.Condition()
+        self.results: Dict[str, bool] = {}
+        self.placements: Dict[str, Placement] = {}
+
+    def place(self, job: Job) -> Optional[Placement]:
+        cores = self.cpus.alloc(max(job.cpus, 1), job.mem_gb)
+        if cores is None:
+            return None
+        ports = {name: self.ports.alloc(span) for name, span in job.ports.items()}
+        return Placement(job, cores, ports)
+
+    def release(self, placement: Placement):
+        self.cpus.release(placement.cores)
+        for name, span in placement.job.ports.items():
+            self.ports.release(placement.ports[name], span)
+
+    def worker(self, placement: Placement):
+        start = time.monotonic()
+        ok = False
+        try:
+            ok = run_job(placement, self.numa_bind)
+        except Exception as e:
+            print(f"[error] {placement.job.name}: {e!r}", flush=True)
+        finally:
+            # or `run` waits forever for the cores of the job
+            with self.lock:
+                self.release(placement)
+                self.results[placement.job.name] = ok
+                status = "done" if ok else "FAILED"
+                if self.verbose or not ok:
+                    print(f"[{status}] {placement.job.name} ({time.monotonic() - start:.0f}s)", flush=True)
+                self.lock.notify_all()
+
+    def run(self, jobs: List[Job], dry_run: bool = False):
+        for job in jobs:
+            # placed on an idle host, or never
+            if CpuAllocator(self.topo).alloc(max(job.cpus, 1), job.mem_gb) is None:
+                raise Exception(f"job {job.name} needs {job.cpus} cores / {job.mem_gb} GiB, more than the host can place")
+        # largest first packs better, the order of outputs is kept by `collect`
+        pending = sorted(jobs, key=lambda j: (-j.cpus, -j.mem_gb))
+        threads = []
+        with self.lock:
+            while pending:
+                for job in list(pending):
+                    placement = self.place(job)
+                    if placement is None:
+                        continue
+                    pending.remove(job)
+                    if self.verbose or dry_run:
+                        print(placement.describe(), flush=True)
+                    if dry_run:
+                        continue
+                    self.placements[job.name] = placement
+                    t = threading.Thread(target=self.worker, args=(placement,), daemon=True)
+                    t.start()
+                    threads.append(t)
+                if dry_run:
+                    # the next wave, once all running jobs are done
+                    print("----", flush=True)
+                    self.cpus = CpuAllocator(self.topo)
+                    self.ports = PortAllocator()
+                elif pending:
+                    self.lock.wait()
+        for t in threads:
+            t.join()
+        return self.results
+
+
+def collect(jobs: List[Job], results: Dict[str, bool]):
+    """copy outputs of finished jobs in job order, concatenating the shared destinations"""
+    written = set()
+    for job in jobs:
+        if not results.get(job.name):
+            continue
+        for src, dst in job.outputs.items():
+            files = [job.dir / "run.log"] if src == LOG else sorted(job.dir.glob(src))
+            for path in files:
+                target = ROOT / dst
+                if dst.endswith("/"):
+                    target = target / path.name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                mode = "ab" if target in written else "wb"
+                written.add(target)
+                with open(path, "rb") as fin, open(target, mode) as fout:
+                    shutil.copyfileobj(fin, fout)
+
+
+def main():
+    from experiments import PLANS
+
+    parser = argparse.ArgumentParser(description="Run experiments in parallel on disjoint cpusets")
+    parser.add_argument("--plan", action="append", default=[], choices=sorted(PLANS), help="experiment to run")
+    parser.add_argument("--all", action="store_true", help="run all experiments")
+    parser.add_argument("--reserve", default="0", help="cpus left to the system, e.g. 0 or 0-1")
+    parser.add_argument("--smt", action="store_true", help="give SMT siblings of a core to different jobs")
+    parser.add_argument("--numa-bind", action="store_true", help="bind memory of single-node jobs with numactl")
+    parser.add_argument("--dry-run", action="store_true", help="print the placement of jobs only")
+    args = parser.parse_args()
+
+    plans = sorted(PLANS) if args.all else args.plan
+    if not plans:
+        parser.error("no experiment, use --plan or --all")
+    jobs = [job for plan in plans for job in PLANS[plan]()]
+    topo = Topology(read_cpulist(args.reserve), smt=args.smt)
+    print(f"{len(jobs)} jobs on {topo.ncores} cores, {len(topo.nodes)} nodes", flush=True)
+
+    start = time.monotonic()
+    results = Scheduler(topo, args.numa_bind).run(jobs, args.dry_run)
+    if args.dry_run:
+        return
+    collect(jobs, results)
+    failed = [name for name, ok in results.items() if not ok]
+    print(f"{len(results) - len(failed)}/{len(results)} jobs done in {time.monotonic() - start:.0f}s", flush=True)
+    if failed:
+        print("failed: " + " ".join(failed), file=sys.stderr)
+        print(f"logs: {JOBS_DIR}/<job>/run.log", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
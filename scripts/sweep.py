@@ -0,0 +1,262 @@
+"""
+Adaptive latency-vs-load sweep
+
+Instead of a fixed grid of offered loads, the sweep of a (benchmark, system)
+  1. finds the saturation knee by bisection, a load is sustained while the
+     achieved throughput keeps up with the offered one;
+  2. measures points densely around the knee;
+  3. bisects the maximum load meeting each latency SLO (e.g. p99 <= 500us).
+A point is repeated until its latency percentiles converge (the standard error
+of the median of trials falls under --tol) instead of a fixed number of times.
+Runs are jobs of scripts/scheduler.py, the sweeps of all systems run at the
+same time on disjoint cpusets.
+
+Example:
+    python3 scripts/sweep.py --bench memcached --system vanilla --system orthrus --slo p99=500
+"""
+
+import sys
+import json
+import math
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ingest import parse
+from scheduler import Job, Scheduler, Topology, read_cpulist
+from experiments import memcached_job, masstree_job, lsmtree_job
+
+# fractions of the knee measured in step 2
+AROUND_KNEE = [0.5, 0.7, 0.8, 0.9, 0.95, 1.0, 1.05, 1.1]
+METRICS = {"p90": "lat_p90_us", "p95": "lat_p95_us", "p99": "lat_p99_us", "avg": "lat_avg_us"}
+
+
+@dataclass
+class Target:
+    fmt: str  # log format of the client output
+    output: str  # the client output, in the job directory
+    loads: Tuple[float, float]  # default search range of the load argument
+    job: Callable[[str, str, float], Job]  # (job name, system, load)
+    offered: Callable[[float], float] = lambda load: load  # requests per second offered at a load
+
+
+TARGETS: Dict[str, Target] = {
+    # the client offers rps to each of its 3 groups
+    "memcached": Target(
+        fmt="evaluation",
+        output="client.log",
+        loads=(10000, 200000),
+        job=lambda name, system, load: memcached_job(
+            name, system, client_args=f"client.log 3 32 24 19 {int(load)}", delay=1.0
+        ),
+        offered=lambda load: load * 3,
+    ),
+    "masstree": Target(
+        fmt="evaluation",
+        output="client.log",
+        loads=(100000, 20000000),
+        job=lambda name, system, load: masstree_job(name, system, args=f"4 {int(load)}", delay=1.0),
+    ),
+    "lsmtree": Target(
+        fmt="lsmtree",
+        output="run.log",
+        loads=(1000, 400000),
+        job=lambda name, system, load: lsmtree_job(
+            name,
+            f"./build/ae/lsmtree/latency/lsmtree_socket_latency_pXX_{system}",
+            f"./build/ae/lsmtree/latency/lsmtree_socket_latency_pXX_client --throughput {int(load)}",
+            system,
+        ),
+    ),
+}
+
+
+@dataclass
+class Point:
+    load: float
+    offered: float
+    trials: List[Dict[str, float]] = field(default_factory=list)
+
+    def estimate(self, key: str):
+        return float(np.median([t[key] for t in self.trials]))
+
+    def stderr(self, key: str):
+        values = np.array([t[key] for t in self.trials])
+        if len(values) < 2:
+            return math.inf
+        # standard error of the median, ~1.25 times that of the mean
+        return float(1.253 * values.std(ddof=1) / math.sqrt(len(values)))
+
+    def sustained(self, ratio: float):
+        return self.estimate("throughput") >= ratio * self.offered
+
+    def to_dict(self):
+        d = {"load": self.load, "offered": self.offered, "trials": len(self.trials)}
+        d.update({key: self.estimate(key) for key in self.trials[0]})
+        return d
+
+
+class Sweep:
+    def __init__(self, bench: str, system: str, sched: Scheduler, args):
+        self.bench, self.system = bench, system
+        self.target = TARGETS[bench]
+        self.sched = sched
+        self.args = args
+        self.points: Dict[int, Point] = {}
+        self.keys = ["throughput"] + sorted({METRICS[metric] for metric, _ in args.slo})
+        self.njobs = 0
+
+    def log(self, msg: str):
+        print(f"[{self.bench}/{self.system}] {msg}", flush=True)
+
+    def run_trials(self, point: Point, n: int):
+        jobs = []
+        for _ in range(n):
+            self.njobs += 1
+            name = f"sweep-{self.bench}-{self.system}-{int(point.load)}-{self.njobs}"
+            jobs.append(self.target.job(name, self.system, point.load))
+        results = self.sched.run(jobs)
+        for job in jobs:
+            if not results.get(job.name):
+                raise Exception(f"job {job.name} failed, see {job.dir}/run.log")
+            table = parse(self.target.fmt, job.dir / self.target.output, self.bench, self.system)
+            if len(table) == 0:
+                raise Exception(f"no result in {job.dir / self.target.output}")
+            row = table.data[-1]
+            point.trials.append({key: float(row[key]) for key in self.keys})
+
+    def converged(self, point: Point):
+        if len(point.trials) < self.args.min_trials:
+            return False
+        return all(point.stderr(key) <= self.args.tol * point.estimate(key) for key in self.keys[1:])
+
+    def measure(self, load: float, converge: bool = True) -> Point:
+        load = float(int(load))
+        point = self.points.setdefault(int(load), Point(load, self.target.offered(load)))
+        if not point.trials:
+            self.run_trials(point, 1 if not converge else min(self.args.parallel, self.args.max_trials))
+        while converge and not self.converged(point) and len(point.trials) < self.args.max_trials:
+            self.run_trials(point, min(self.args.parallel, self.args.max_trials - len(point.trials)))
+        summary = " ".join(f"{key}={point.estimate(key):.1f}" for key in self.keys)
+        self.log(f"load {int(load)}: {summary} ({len(point.trials)} trials)")
+        return point
+
+    def bisect(self, lo: float, hi: float, ok: Callable[[Point], bool], converge: bool):
+        """largest load in [lo, hi] with ok(point), assuming ok(lo) and not ok(hi)"""
+        while hi / lo > 1 + self.args.resolution:
+            mid = math.sqrt(lo * hi)
+            if ok(self.measure(mid, converge)):
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def knee(self) -> float:
+        lo, hi = self.args.loads or self.target.loads
+        sustained = lambda p: p.sustained(self.args.sustain)
+        if not sustained(self.measure(lo, converge=False)):
+            self.log(f"not sustained at the lowest load {lo}")
+            return lo
+        if sustained(self.measure(hi, converge=False)):
+            self.log(f"sustained at the highest load {hi}")
+            return hi
+        return self.bisect(lo, hi, sustained, converge=False)
+
+    def max_under_slo(self, metric: str, bound: float) -> Optional[Point]:
+        key = METRICS[metric]
+        ok = lambda p: p.sustained(self.args.sustain) and p.estimate(key) <= bound
+        measured = [p for _, p in sorted(self.points.items()) if len(p.trials) >= self.args.min_trials]
+        passing = [p for p in measured if ok(p)]
+        lo = passing[-1] if passing else self.measure((self.args.loads or self.target.loads)[0])
+        if not ok(lo):
+            return None
+        failing = [p for p in measured if p.load > lo.load and not ok(p)]
+        if not failing:
+            return lo
+        load = self.bisect(lo.load, failing[0].load, ok, converge=True)
+        return self.points[int(load)]
+
+    def run(self):
+        knee = self.knee()
+        self.log(f"knee at load {int(knee)}")
+        lo, hi = self.args.loads or self.target.loads
+        for fraction in AROUND_KNEE:
+            self.measure(min(max(knee * fraction, lo), hi))
+        self.result = {"knee": knee, "slo": {}}
+        for metric, bound in self.args.slo:
+            point = self.max_under_slo(metric, bound)
+            self.result["slo"][f"{metric}<={bound:g}us"] = point.to_dict() if point else None
+            if point:
+                throughput = point.estimate("throughput")
+                self.log(f"max load with {metric} <= {bound:g}us: {int(point.load)}, {throughput:.0f} req/s")
+            else:
+                self.log(f"{metric} <= {bound:g}us is never met")
+        self.result["points"] = [p.to_dict() for _, p in sorted(self.points.items())]
+        return self.result
+
+
+def parse_slo(text: str):
+    metric, _, bound = text.partition("=")
+    if metric not in METRICS or not bound:
+        raise argparse.ArgumentTypeError(f"invalid SLO {text}, expected e.g. p99=500 (us)")
+    return metric, float(bound)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maximum load under latency SLOs, by adaptive search")
+    parser.add_argument("--bench", required=True, choices=sorted(TARGETS))
+    parser.add_argument("--system", action="append", help="default: vanilla and orthrus")
+    parser.add_argument("--slo", action="append", type=parse_slo, help="e.g. p99=500, in us (default: p99=1000)")
+    parser.add_argument("--loads", type=float, nargs=2, help="search range of the load argument of the client")
+    parser.add_argument("--sustain", type=float, default=0.95, help="achieved / offered throughput of a sustained load")
+    parser.add_argument("--resolution", type=float, default=0.05, help="relative precision of the searched loads")
+    parser.add_argument("--tol", type=float, default=0.05, help="relative standard error of converged percentiles")
+    parser.add_argument("--min-trials", type=int, default=3)
+    parser.add_argument("--max-trials", type=int, default=10)
+    parser.add_argument("--parallel", type=int, default=1, help="trials of a point run at the same time")
+    parser.add_argument("--reserve", default="0", help="cpus left to the system")
+    parser.add_argument("-o", "--output", help="write all points and results as JSON")
+    args = parser.parse_args()
+    args.system = args.system or ["vanilla", "orthrus"]
+    args.slo = args.slo or [("p99", 1000.0)]
+
+    sched = Scheduler(Topology(read_cpulist(args.reserve)), verbose=False)
+    sweeps = [Sweep(args.bench, system, sched, args) for system in args.system]
+    errors = []
+
+    def run(sweep: Sweep):
+        try:
+            sweep.run()
+        except Exception as e:
+            errors.append(e)
+            sweep.log(f"failed: {e}")
+
+    threads = [threading.Thread(target=run, args=(sweep,)) for sweep in sweeps]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        sys.exit(1)
+
+    print(f"\n=== {args.bench}: max load under SLO (req/s) ===")
+    print(f"{'slo':<16}" + "".join(f"{s.system:>14}" for s in sweeps))
+    for slo in sweeps[0].result["slo"]:
+        cells = [s.result["slo"][slo] for s in sweeps]
+        print(f"{slo:<16}" + "".join(f"{c['throughput'] if c else float('nan'):>14.0f}" for c in cells))
+        base = cells[0]
+        for sweep, cell in zip(sweeps[1:], cells[1:]):
+            if base and cell:
+                print(f"  {sweep.system} / {sweeps[0].system}: {cell['throughput'] / base['throughput']:.3f}")
+    print(f"{'knee (load)':<16}" + "".join(f"{s.result['knee']:>14.0f}" for s in sweeps))
+    print(f"runs: {sum(s.njobs for s in sweeps)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            json.dump({s.system: s.result for s in sweeps}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
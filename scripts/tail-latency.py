@@ -1,34 +1,34 @@
 import os
-import json
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 
+from ingest import parse
+
 mpl.rcParams["font.sans-serif"] = "Times New Roman"
 mpl.rcParams["font.family"] = "serif"
 mpl.rcParams["pdf.fonttype"] = 42
 mpl.rcParams["ps.fonttype"] = 42
 
 
-def parse_json(file_path):
+def parse_log(fmt, bench, file_path):
     print(f"parsing {file_path}")
-    with open(os.path.join("results", file_path), "r", encoding="ascii") as f:
-        json_data = json.load(f)
-    json_data = list(filter(lambda x: "throughput" in x and "latency_req" in x and "p95" in x["latency_req"], json_data))
-    all_data = np.array([(t["throughput"], t["latency_req"]["p95"]) for t in json_data])
+    table = parse(fmt, os.path.join("results", file_path), bench)
+    valid = ~np.isnan(table["throughput"]) & ~np.isnan(table["lat_p95_us"])
+    all_data = np.array([table["throughput"][valid], table["lat_p95_us"][valid]]).T.reshape(-1, 2)
     all_data = np.sort(all_data, axis=0)
     throughput = all_data[:, 0]
     latency = all_data[:, 1]
     return throughput, latency
 
 
-memcached_throughput_scee, memcached_latency_scee = parse_json("memcached-latency_vs_pXX-orthrus.json")
-memcached_throughput_raw, memcached_latency_raw = parse_json("memcached-latency_vs_pXX-vanilla.json")
-memcached_throughput_rbv, memcached_latency_rbv = parse_json("memcached-latency_vs_pXX-rbv.json")
+memcached_throughput_scee, memcached_latency_scee = parse_log("evaluation", "memcached", "memcached-latency_vs_pXX-orthrus.log")
+memcached_throughput_raw, memcached_latency_raw = parse_log("evaluation", "memcached", "memcached-latency_vs_pXX-vanilla.log")
+memcached_throughput_rbv, memcached_latency_rbv = parse_log("evaluation", "memcached", "memcached-latency_vs_pXX-rbv.log")
 
-lsmtree_throughput_scee, lsmtree_latency_scee = parse_json("lsmtree-latency_vs_pXX-orthrus.json")
-lsmtree_throughput_raw, lsmtree_latency_raw = parse_json("lsmtree-latency_vs_pXX-vanilla.json")
-lsmtree_throughput_rbv, lsmtree_latency_rbv = parse_json("lsmtree-latency_vs_pXX-rbv.json")
+lsmtree_throughput_scee, lsmtree_latency_scee = parse_log("lsmtree", "lsmtree", "lsmtree-latency_vs_pXX-orthrus.log")
+lsmtree_throughput_raw, lsmtree_latency_raw = parse_log("lsmtree", "lsmtree", "lsmtree-latency_vs_pXX-vanilla.log")
+lsmtree_throughput_rbv, lsmtree_latency_rbv = parse_log("lsmtree", "lsmtree", "lsmtree-latency_vs_pXX-rbv.log")
 
 data = {
     "Memcached": {
@@ -135,5 +135,5 @@ leg = fig.legend(loc="lower center", bbox_to_anchor=(0.5, -0.03), ncol=4, fontsi
 fig.subplots_adjust(top=0.85, bottom=0.4, left=0.2, right=0.8)
 fig.subplots_adjust(wspace=0.5)
 
-plt.savefig("tail-latency.png")
-plt.savefig("tail-latency.pdf")
+plt.savefig("results/img/tail-latency.png")
+plt.savefig("results/img/tail-latency.pdf")
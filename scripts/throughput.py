@@ -6,7 +6,8 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.ticker import ScalarFormatter
-import json
+
+from ingest import parse, parse_all
 
 RESULTS_DIR = "results/"
 
@@ -16,31 +17,27 @@ mpl.rcParams["pdf.fonttype"] = 42
 mpl.rcParams["ps.fonttype"] = 42
 
 
-def parse_throughput(filename: str):
-    with open(filename, "r") as f:
-        data = json.load(f)
-    return {
-        "Vanilla": float(data["vanilla"]["throughput"]) / 1000,
-        "Orthrus": float(data["orthrus"]["throughput"]) / 1000,
-        "RBV": float(data["rbv"]["throughput"]) / 1000,
-    }
+# figure system name -> system name in logs
+SYSTEM_NAMES = {"Vanilla": "vanilla", "Orthrus": "orthrus", "RBV": "rbv"}
+
+
+def client_logs(bench: str):
+    return {name: f"{RESULTS_DIR}{bench}-throughput-client-{name}.log" for name in SYSTEM_NAMES.values()}
+
+
+def parse_throughput(table):
+    return {system: table.value("throughput", system=name) / 1000 for system, name in SYSTEM_NAMES.items()}
 
 
-def parse_duration(filename: str):
-    with open(filename, "r") as f:
-        data = json.load(f)
-    return {
-        "Vanilla": float(data["vanilla"]["duration"]) / 1000,
-        "Orthrus": float(data["orthrus"]["duration"]) / 1000,
-        "RBV": float(data["rbv"]["duration"]) / 1000,
-    }
+def parse_duration(table):
+    return {system: table.value("duration_ms", system=name) / 1000 for system, name in SYSTEM_NAMES.items()}
 
 
 data = {
-    "Memcached": parse_throughput(RESULTS_DIR + "memcached-throughput-report.txt.json"),
-    "Masstree": parse_throughput(RESULTS_DIR + "masstree-throughput-report.txt.json"),
-    "LSMTree": parse_throughput(RESULTS_DIR + "lsmtree-throughput-report.txt.json"),
-    "Phoenix": parse_duration(RESULTS_DIR + "phoenix-throughput-report.txt.json"),
+    "Memcached": parse_throughput(parse_all("evaluation", client_logs("memcached"), "memcached")),
+    "Masstree": parse_throughput(parse_all("evaluation", client_logs("masstree"), "masstree")),
+    "LSMTree": parse_throughput(parse("lsmtree", RESULTS_DIR + "lsmtree-throughput-report.txt", "lsmtree")),
+    "Phoenix": parse_duration(parse("phoenix", RESULTS_DIR + "phoenix-throughput-report.txt", "phoenix")),
 }
 
 
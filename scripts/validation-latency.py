@@ -1,8 +1,11 @@
 import os
+import glob
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 
+from ingest import hdr
+
 mpl.rcParams["font.sans-serif"] = "Times New Roman"
 mpl.rcParams["font.family"] = "serif"
 mpl.rcParams["pdf.fonttype"] = 42
@@ -10,6 +13,11 @@ mpl.rcParams["ps.fonttype"] = 42
 
 
 def parse_cdf(filename):
+    # prefer the HDR logs, repeated runs (<name>-<run>.hlog) are merged exactly
+    stem = os.path.join("results", os.path.splitext(filename)[0])
+    hlogs = sorted(glob.glob(stem + ".hlog") + glob.glob(stem + "-*.hlog"))
+    if hlogs:
+        return hdr.load(*hlogs).cdf()
     with open(os.path.join("results", filename)) as f:
         lines = f.readlines()[2:-3]
         tokens = [l.split() for l in lines]
@@ -121,5 +129,5 @@ leg = fig.legend(loc="lower center", bbox_to_anchor=(0.6, -0.08), ncol=4, fontsi
 fig.subplots_adjust(top=0.85, bottom=0.3, left=0.12, right=0.98)
 fig.subplots_adjust(hspace=0.25, wspace=0.25)
 
-plt.savefig("validation-cdf.png")
-plt.savefig("validation-cdf.pdf")
+plt.savefig("results/img/validation-cdf.png")
+plt.savefig("results/img/validation-cdf.pdf")